@@ -19,6 +19,8 @@ from app.models.user import User
 from app.models.schedule import Group, Tutor, Auditory, Lesson
 from app.models.homework import Homework
 from app.models.group_chat import GroupChat
+from app.models.outbox import ScheduleChangeOutbox
+from app.models.change_log import ScheduleChangeLog
 # This is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -0,0 +1,32 @@
+"""Add schedule fingerprint to groups
+
+Revision ID: a1c3e5f7b9d2
+Revises: c046f19aaba9
+Create Date: 2026-10-17 10:12:31.418204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'c046f19aaba9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('groups', sa.Column('schedule_fingerprint', sa.String(length=64), nullable=True))
+    op.add_column('groups', sa.Column('schedule_synced_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('groups', sa.Column('schedule_checked_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('groups', 'schedule_checked_at')
+    op.drop_column('groups', 'schedule_synced_at')
+    op.drop_column('groups', 'schedule_fingerprint')
@@ -0,0 +1,35 @@
+"""Add last_active_at to users
+
+Revision ID: b7d2f4a6c8e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-17 12:40:08.512337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4a6c8e1'
+down_revision: Union[str, Sequence[str], None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('last_active_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_users_last_active_at'), 'users', ['last_active_at'], unique=False)
+    # Существующих пользователей с группой считаем активными на момент миграции,
+    # чтобы их группы не выпали из горячей синхронизации до первого захода
+    op.execute(
+        "UPDATE users SET last_active_at = now() WHERE is_blocked = false AND group_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_last_active_at'), table_name='users')
+    op.drop_column('users', 'last_active_at')
@@ -0,0 +1,36 @@
+"""Add schedule change outbox
+
+Revision ID: c4e8a2d6f0b3
+Revises: b7d2f4a6c8e1
+Create Date: 2026-10-17 15:02:44.907615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d6f0b3'
+down_revision: Union[str, Sequence[str], None] = 'b7d2f4a6c8e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('schedule_change_outbox',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('idempotency_key', sa.String(length=32), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('schedule_change_outbox')
@@ -0,0 +1,28 @@
+"""Add schedule version to groups
+
+Revision ID: d5f9b3e7a1c4
+Revises: c4e8a2d6f0b3
+Create Date: 2026-10-17 18:41:09.271530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f9b3e7a1c4'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2d6f0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('groups', sa.Column('schedule_version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('groups', 'schedule_version')
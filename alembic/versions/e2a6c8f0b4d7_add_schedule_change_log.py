@@ -0,0 +1,40 @@
+"""Add schedule change log
+
+Revision ID: e2a6c8f0b4d7
+Revises: d5f9b3e7a1c4
+Create Date: 2026-10-17 20:13:52.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a6c8f0b4d7'
+down_revision: Union[str, Sequence[str], None] = 'd5f9b3e7a1c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('schedule_change_log',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('source_id', sa.BigInteger(), nullable=False),
+    sa.Column('change_type', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_schedule_change_log_group_id_version', 'schedule_change_log', ['group_id', 'version'], unique=False)
+    op.create_index(op.f('ix_schedule_change_log_created_at'), 'schedule_change_log', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_schedule_change_log_created_at'), table_name='schedule_change_log')
+    op.drop_index('ix_schedule_change_log_group_id_version', table_name='schedule_change_log')
+    op.drop_table('schedule_change_log')
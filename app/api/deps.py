@@ -1,5 +1,6 @@
 # app/api/deps.py
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
@@ -8,11 +9,13 @@ from app.core.config import settings
 from app.db.session import get_db
 from app.crud import crud_user
 from app.models.user import User
+from app.services.user_activity import user_activity
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("Notifier")
 
 # Создаем экземпляр HTTPBearer. Он будет искать заголовок Authorization.
 bearer_scheme = HTTPBearer()
+optional_bearer_scheme = HTTPBearer(auto_error=False)
 
 async def get_current_user(
     db: AsyncSession = Depends(get_db), 
@@ -28,8 +31,11 @@ async def get_current_user(
             detail="Invalid authentication scheme",
         )
     
-    token = credentials.credentials
-    token_data = security.decode_access_token(token)
+    return await _get_active_user_by_token(db, credentials.credentials)
+
+
+async def _get_active_user_by_token(db: AsyncSession, token: str, scope: Optional[str] = None) -> User:
+    token_data = security.decode_access_token(token, scope=scope)
     
     user = await crud_user.get_user_by_telegram_id(db, telegram_id=int(token_data.telegram_id))
     
@@ -38,10 +44,29 @@ async def get_current_user(
     
     if user.is_blocked:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is blocked")
-        
+
+    # Запись в БД происходит пачкой в фоне, здесь только отметка в памяти
+    user_activity.touch(user.telegram_id)
     return user
 
 
+async def get_current_user_for_stream(
+    stream_token: Optional[str] = Query(None, description="Токен из POST /schedule/my/events/token"),
+    db: AsyncSession = Depends(get_db),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer_scheme),
+) -> User:
+    """
+    Как get_current_user, но вместо заголовка можно передать параметр stream_token:
+    браузерный EventSource не умеет отправлять заголовок Authorization. Обычный токен
+    доступа в URL не принимается - он попал бы в логи прокси и сервера.
+    """
+    if credentials is not None and credentials.scheme == "Bearer":
+        return await _get_active_user_by_token(db, credentials.credentials)
+    if stream_token:
+        return await _get_active_user_by_token(db, stream_token, scope=security.STREAM_TOKEN_SCOPE)
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authenticated")
+
+
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
@@ -1,9 +1,10 @@
 # app/api/v1/endpoints/admin.py
 import logging
+from datetime import date
 from fastapi import APIRouter, Depends, Query, HTTPException, status
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from app.core.queue import push_broadcast_to_queue
 from app.core.queue import push_message_to_chat_queue # Новая функция для Redis
 from app import schemas, models
@@ -13,6 +14,9 @@ from app.db.session import get_db
 from app.schemas import group_chat
 from app.crud import crud_chat
 from app.core.queue import push_control_command
+from app.core.metrics import read_metrics
+from app.core.job_lock import read_job_stats
+from app.core.sync_jobs import create_sync_job, read_sync_job, list_sync_jobs
 
 from app.worker import scheduler, run_hot_schedule_sync, run_dict_sync
 
@@ -28,6 +32,20 @@ class ChatMessage(BaseModel):
 class BroadcastMessage(BaseModel):
     message: str
 
+class SyncGroupsRequest(BaseModel):
+    group_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+class SyncTutorGroupsRequest(BaseModel):
+    tutor_ids: List[int] = Field(..., min_length=1, max_length=200)
+
+class SyncDateWindowRequest(BaseModel):
+    date_from: date
+    date_to: date
+    group_ids: Optional[List[int]] = Field(None, max_length=1000)  # None - все группы
+
+# Окно разовой синхронизации по датам - не больше семестра с запасом
+MAX_SYNC_WINDOW_DAYS = 200
+
 # --- Эндпоинты для управления пользователями ---
 
 @router.get(
@@ -131,6 +149,120 @@ async def trigger_dict_sync(admin: models.user.User = Depends(deps.get_current_a
     except Exception as e:
         # logger.error(f"Error triggering dict sync: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+async def _queue_sync_job(command: str, params: Dict[str, Any]) -> Dict[str, str]:
+    job_id = await create_sync_job(command, params)
+    await push_control_command(command, {**params, "job_id": job_id})
+    return {"job_id": job_id, "message": f"Task '{command}' has been queued for the worker."}
+
+
+@router.post(
+    "/system/sync/groups",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="[Admin] Sync schedule of selected groups"
+)
+async def trigger_groups_sync(
+    sync_in: SyncGroupsRequest,
+    admin: models.user.User = Depends(deps.get_current_admin_user)
+):
+    """
+    [Admin] Синхронизировать расписание только указанных групп, например после жалобы.
+    Возвращает job_id, прогресс доступен через /system/sync/jobs/{job_id}.
+    """
+    return await _queue_sync_job("sync_groups", {"group_ids": sorted(set(sync_in.group_ids))})
+
+
+@router.post(
+    "/system/sync/tutors",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="[Admin] Sync schedule of tutors' groups"
+)
+async def trigger_tutor_groups_sync(
+    sync_in: SyncTutorGroupsRequest,
+    admin: models.user.User = Depends(deps.get_current_admin_user)
+):
+    """
+    [Admin] Синхронизировать расписание всех групп, у которых есть занятия у указанных преподавателей.
+    """
+    return await _queue_sync_job("sync_tutor_groups", {"tutor_ids": sorted(set(sync_in.tutor_ids))})
+
+
+@router.post(
+    "/system/sync/window",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="[Admin] Sync schedule for a date window"
+)
+async def trigger_date_window_sync(
+    sync_in: SyncDateWindowRequest,
+    admin: models.user.User = Depends(deps.get_current_admin_user)
+):
+    """
+    [Admin] Пересинхронизировать занятия в окне дат (включительно) для всех или указанных групп,
+    в том числе даты вне обычного окна синхронизации.
+    """
+    if sync_in.date_to < sync_in.date_from:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_to must not be before date_from.")
+    if (sync_in.date_to - sync_in.date_from).days > MAX_SYNC_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date window must not exceed {MAX_SYNC_WINDOW_DAYS} days."
+        )
+    params = {"date_from": sync_in.date_from.isoformat(), "date_to": sync_in.date_to.isoformat()}
+    if sync_in.group_ids:
+        params["group_ids"] = sorted(set(sync_in.group_ids))
+    return await _queue_sync_job("sync_date_window", params)
+
+
+@router.get(
+    "/system/sync/jobs",
+    summary="[Admin] List recent targeted sync jobs"
+)
+async def get_sync_jobs(
+    limit: int = Query(20, ge=1, le=200),
+    admin: models.user.User = Depends(deps.get_current_admin_user)
+):
+    """[Admin] Последние разовые синхронизации и их прогресс, новые первыми."""
+    return await list_sync_jobs(limit=limit)
+
+
+@router.get(
+    "/system/sync/jobs/{job_id}",
+    summary="[Admin] Get progress of a targeted sync job"
+)
+async def get_sync_job(job_id: str, admin: models.user.User = Depends(deps.get_current_admin_user)):
+    """
+    [Admin] Статус (queued, running, done, failed, skipped) и прогресс разовой синхронизации:
+    обработано групп, найдено изменений, группы с ошибками.
+    """
+    job = await read_sync_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sync job not found")
+    return job
+
+
+@router.get(
+    "/system/metrics",
+    summary="[Admin] Get worker sync metrics"
+)
+async def get_worker_metrics(admin: models.user.User = Depends(deps.get_current_admin_user)):
+    """
+    [Admin] Последние метрики воркера, например счетчики diff синхронизации справочников.
+    """
+    return await read_metrics()
+
+
+@router.get(
+    "/system/jobs",
+    summary="[Admin] Get worker job runs and skipped runs"
+)
+async def get_worker_jobs(admin: models.user.User = Depends(deps.get_current_admin_user)):
+    """
+    [Admin] Счетчики запусков задач воркера, где они сейчас выполняются
+    и последние запуски, пропущенные из-за уже идущего.
+    """
+    return await read_job_stats()
+
+
 @router.post(
     "/system/broadcast", 
     status_code=status.HTTP_202_ACCEPTED,
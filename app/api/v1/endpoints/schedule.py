@@ -1,30 +1,39 @@
 # app/api/v1/endpoints/schedule.py
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import hashlib
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import Callable, List, Optional
 from collections import defaultdict
 from app.schemas import schedule
+from app.schemas.token import Token
 from app import schemas, models
 from app.api import deps
+from app.core import security
 from app.crud import crud_schedule
+from app.services import schedule_reader
+from app.services.schedule_delta import get_schedule_changes
+from app.services.schedule_events import schedule_event_stream
 from app.db.session import get_db
 
 router = APIRouter()
 
 def filter_lessons_by_preferences(
-    lessons: list[models.schedule.Lesson],
+    lessons: list[dict],
     user: models.user.User
-) -> list[models.schedule.Lesson]:
+) -> list[dict]:
     """
     Главная функция фильтрации. Сначала по подгруппе, затем по преподавателям.
+    Работает с занятиями в формате ответа API (см. schedule_snapshots).
     """
     # 1. Фильтрация по подгруппе
     if user.subgroup_number:
         user_subgroup_str_part = f"/{user.subgroup_number}"
         lessons = [
             lesson for lesson in lessons
-            if not lesson.subgroup_name or user_subgroup_str_part in lesson.subgroup_name
+            if not lesson["subgroup_name"] or user_subgroup_str_part in lesson["subgroup_name"]
         ]
     
     # 2. Фильтрация по выбранным преподавателям для элективов
@@ -36,7 +45,7 @@ def filter_lessons_by_preferences(
     # Группируем занятия по номеру пары (time_slot), чтобы найти элективы
     lessons_by_slot = defaultdict(list)
     for lesson in lessons:
-        lessons_by_slot[lesson.time_slot].append(lesson)
+        lessons_by_slot[lesson["time_slot"]].append(lesson)
 
     final_lessons = []
     for time_slot, slot_lessons in lessons_by_slot.items():
@@ -47,7 +56,7 @@ def filter_lessons_by_preferences(
         
         # Если в слоте несколько занятий (электив), ищем предпочтение
         # Используем НАЗВАНИЕ ПРЕДМЕТА как ключ. У всех вариантов оно будет одинаковое.
-        subject_name_key = slot_lessons[0].subject_name
+        subject_name_key = slot_lessons[0]["subject_name"]
         
         preferred_tutor_id = preferred_tutors.get(subject_name_key)
         
@@ -55,7 +64,7 @@ def filter_lessons_by_preferences(
             # Ищем занятие с выбранным преподавателем
             found_preferred = False
             for lesson in slot_lessons:
-                if lesson.tutor_id == preferred_tutor_id:
+                if lesson["tutor"]["id"] == preferred_tutor_id:
                     final_lessons.append(lesson)
                     found_preferred = True
                     break
@@ -67,29 +76,126 @@ def filter_lessons_by_preferences(
             # Если для этого электива выбор не сделан, показываем все варианты
             final_lessons.extend(slot_lessons)
             
-    return sorted(final_lessons, key=lambda l: l.time_slot)
+    return sorted(final_lessons, key=lambda l: l["time_slot"])
+
+
+def _make_etag(*parts: str) -> str:
+    return '"' + hashlib.sha256(":".join(parts).encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _etag_response(
+    request: Request, etag: str, version: Optional[int], build_body: Callable[[], bytes]
+) -> Response:
+    """
+    304 без тела, если клиент прислал тот же ETag, иначе готовый JSON.
+    Тело собирается только при 200: у большинства повторных запросов вся работа -
+    чтение хэшей из снимка и их сравнение.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if version is not None:
+        headers["X-Schedule-Version"] = str(version)
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=build_body(), media_type="application/json", headers=headers)
+
+
+def _day_json(day: date, lessons: bytes) -> bytes:
+    return b'{"date":"%s","lessons":%s}' % (day.isoformat().encode(), lessons)
 
 
 @router.get("/my/day", response_model=schedule.DaySchedule)
 async def get_my_schedule_for_day(
     target_date: date,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(deps.get_current_user),
 ):
     """
     Получение личного расписания на указанный день.
     Учитывает группу, подгруппу и выбранных преподавателей.
+    Поддерживает If-None-Match: ETag зависит от дня в снимке расписания и настроек фильтрации.
     """
     if not current_user.group_id:
         raise HTTPException(status_code=404, detail="User has no group assigned")
 
-    all_lessons_for_group = await crud_schedule.get_schedule_for_group_by_date(
-        db, group_id=current_user.group_id, target_date=target_date
-    )
-    
-    filtered_lessons = filter_lessons_by_preferences(all_lessons_for_group, current_user)
+    snapshot = await schedule_reader.get_group_schedule_days(current_user.group_id, [target_date])
+    snapshot_day = snapshot.days[target_date]
+    preferred_tutors = current_user.settings.get("preferred_tutors", {})
+    preferences = json.dumps([current_user.subgroup_number, preferred_tutors], sort_keys=True)
 
-    return {"date": target_date, "lessons": filtered_lessons}
+    def build_body() -> bytes:
+        lessons = snapshot_day.lessons
+        if current_user.subgroup_number or preferred_tutors:
+            filtered_lessons = filter_lessons_by_preferences(json.loads(lessons), current_user)
+            lessons = json.dumps(filtered_lessons, ensure_ascii=False, separators=(",", ":")).encode()
+        return _day_json(target_date, lessons)
+
+    return _etag_response(request, _make_etag(snapshot_day.etag, preferences), snapshot.version, build_body)
+
+
+@router.get("/my/changes", response_model=schedule.ScheduleChanges)
+async def get_my_schedule_changes(
+    since: int = Query(..., ge=0, description="Версия расписания, которая уже есть у клиента"),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(deps.get_current_user),
+):
+    """
+    Изменения расписания группы пользователя после версии `since`.
+    Версию отдают заголовок X-Schedule-Version ответов /my/day и /search?group_id=
+    и поле `version` этого ответа. Занятия - всей группы, без фильтрации по подгруппе и элективам.
+    Если `full_refresh`, дельты нет и расписание нужно загрузить заново.
+    """
+    if not current_user.group_id:
+        raise HTTPException(status_code=404, detail="User has no group assigned")
+
+    changes = await get_schedule_changes(db, group_id=current_user.group_id, since_version=since)
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return changes
+
+
+@router.post("/my/events/token", response_model=Token)
+async def create_my_schedule_events_token(
+    current_user: models.user.User = Depends(deps.get_current_user),
+):
+    """
+    Короткоживущий токен для /my/events?stream_token=... Он годится только для потока
+    событий и только для подключения: при переподключении нужно запросить новый.
+    """
+    return {"access_token": security.create_stream_token(current_user.telegram_id), "token_type": "bearer"}
+
+
+@router.get("/my/events", response_class=StreamingResponse)
+async def stream_my_schedule_events(
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(deps.get_current_user_for_stream),
+):
+    """
+    Server-Sent Events: версия расписания группы пользователя сразу после подключения
+    и каждая новая версия после синхронизации (event: schedule, id - версия).
+    event: resync - обновления могли потеряться, нужно сверить версию через /my/changes.
+    EventSource не отправляет заголовки, поэтому токен передается параметром stream_token
+    (см. POST /my/events/token).
+    """
+    if not current_user.group_id:
+        raise HTTPException(status_code=404, detail="User has no group assigned")
+
+    # Сессия нужна была только для авторизации: соединение с БД не должно жить, пока открыт поток
+    await db.close()
+    return StreamingResponse(
+        schedule_event_stream(current_user.group_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get(
@@ -155,6 +261,7 @@ async def get_my_electives(
 )
 async def search_schedule(
     target_date: date,
+    request: Request,
     group_id: Optional[int] = Query(None, description="ID группы для поиска"),
     tutor_id: Optional[int] = Query(None, description="ID преподавателя для поиска"),
     auditory_id: Optional[int] = Query(None, description="ID аудитории для поиска"),
@@ -166,6 +273,7 @@ async def search_schedule(
     
     Необходимо указать **только один** из параметров: `group_id`, `tutor_id` или `auditory_id`.
     `target_date` - любая дата в пределах нужной недели.
+    Для группы неделя отдается из снимка расписания с ETag (поддерживается If-None-Match).
     """
     # Проверяем, что передан ровно один поисковый параметр
     search_params = [group_id, tutor_id, auditory_id]
@@ -179,19 +287,24 @@ async def search_schedule(
     start_of_week = target_date - timedelta(days=target_date.weekday())
     end_of_week = start_of_week + timedelta(days=6)
     
-    lessons_db = []
     if group_id:
-        lessons_db = await crud_schedule.get_schedule_for_group_for_period(
-            db, group_id=group_id, start_date=start_of_week, end_date=end_of_week
-        )
-    elif tutor_id:
-        lessons_db = await crud_schedule.get_schedule_for_tutor_for_period(
-            db, tutor_id=tutor_id, start_date=start_of_week, end_date=end_of_week
-        )
+        week = [start_of_week + timedelta(days=i) for i in range(7)]
+        snapshot = await schedule_reader.get_group_schedule_days(group_id, week)
+
+        def build_body() -> bytes:
+            # Пустые дни в ответ не попадают
+            return b"[" + b",".join(
+                _day_json(day, snapshot.days[day].lessons) for day in week if snapshot.days[day].lessons != b"[]"
+            ) + b"]"
+
+        etag = _make_etag(*(snapshot.days[day].etag for day in week))
+        return _etag_response(request, etag, snapshot.version, build_body)
+
+    lessons_db = []
+    if tutor_id:
+        lessons_db = await schedule_reader.get_tutor_schedule_for_period(tutor_id, start_of_week, end_of_week)
     elif auditory_id:
-        lessons_db = await crud_schedule.get_schedule_for_auditory_for_period(
-            db, auditory_id=auditory_id, start_date=start_of_week, end_date=end_of_week
-        )
+        lessons_db = await schedule_reader.get_auditory_schedule_for_period(auditory_id, start_of_week, end_of_week)
         
     # Группируем занятия по дням (эта логика остается прежней)
     schedule_by_day = defaultdict(list)
@@ -10,6 +10,7 @@ import logging
 from app.core.config import settings
 from .commands import get_private_chat_commands, get_group_chat_commands
 from .handlers import setup_handlers
+from .middlewares import UserActivityMiddleware
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("Notifier")
@@ -26,6 +27,10 @@ dp = Dispatcher()
 # Подключаем все наши хендлеры (из app/bot/handlers)
 setup_handlers(dp)
 
+# Отмечаем активность пользователей (пишется в БД пачками, см. app/services/user_activity.py)
+dp.message.outer_middleware(UserActivityMiddleware())
+dp.callback_query.outer_middleware(UserActivityMiddleware())
+
 
 # --- Логика, выполняемая при старте/остановке FastAPI ---
 
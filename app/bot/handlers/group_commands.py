@@ -16,6 +16,7 @@ from app.bot.utils import (
 
 from app.db.session import AsyncSessionLocal
 from app.crud import crud_chat, crud_schedule
+from app.services import schedule_reader
 from app.models.schedule import Lesson
 
 router = Router()
@@ -63,9 +64,7 @@ async def get_schedule_and_reply(message: types.Message, start_date: date, end_d
                 "Этот чат не привязан к учебной группе. Администратор может сделать это командой `/setgroup [название]`."
             )
 
-        lessons_db = await crud_schedule.get_schedule_for_group_for_period(
-            session, group_id=chat.linked_group_id, start_date=start_date, end_date=end_date
-        )
+        lessons_db = await schedule_reader.get_group_schedule_for_period(chat.linked_group_id, start_date, end_date)
         
         if not lessons_db:
             if start_date == end_date:
@@ -19,6 +19,7 @@ from app.bot.utils import (
 
 from app.db.session import AsyncSessionLocal
 from app.crud import crud_user, crud_schedule, crud_chat
+from app.services import schedule_reader
 from app.models.schedule import Lesson
 from app.models.user import User
 
@@ -133,7 +134,7 @@ async def get_schedule_and_reply_for_day(message: types.Message, target_date: da
         if not user or not user.group_id:
             return await message.answer("Ваш профиль не настроен. Пожалуйста, укажите вашу группу в Mini App.", reply_markup=get_mini_app_keyboard())
 
-        lessons = await crud_schedule.get_schedule_for_group_by_date(session, group_id=user.group_id, target_date=target_date)
+        lessons = await schedule_reader.get_group_schedule_for_date(user.group_id, target_date)
         filtered_lessons = filter_lessons_by_user_preferences(lessons, user)
         response_text = await format_schedule_for_user(filtered_lessons)
         
@@ -195,9 +196,7 @@ async def get_my_schedule_week(message: types.Message):
 
         today = date.today()
         start_of_week, end_of_week = get_week_dates(today)
-        lessons_db = await crud_schedule.get_schedule_for_group_for_period(
-            session, group_id=user.group_id, start_date=start_of_week, end_date=end_of_week
-        )
+        lessons_db = await schedule_reader.get_group_schedule_for_period(user.group_id, start_of_week, end_of_week)
         
         # --- НАЧАЛО ИЗМЕНЕНИЙ ---
         # Применяем ВСЕ персональные фильтры (подгруппа + элективы)
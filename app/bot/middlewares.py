@@ -0,0 +1,23 @@
+# app/bot/middlewares.py
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.services.user_activity import user_activity
+
+
+class UserActivityMiddleware(BaseMiddleware):
+    """Отмечает активность пользователя на каждое сообщение и нажатие кнопки."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = getattr(event, "from_user", None)
+        if from_user is not None and not from_user.is_bot:
+            user_activity.touch(from_user.id)
+        return await handler(event, data)
@@ -3,10 +3,11 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 from collections import defaultdict
 from datetime import date, timedelta, datetime
 import redis.asyncio as redis
+from sqlalchemy.exc import SQLAlchemyError
 from aiogram import Bot
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramAPIError
@@ -15,15 +16,65 @@ from app.bot.handlers.personal_commands import filter_lessons_by_user_preference
 from app.core.config import settings
 from app.db.session import AsyncSessionLocal
 from app.crud.crud_user import get_users_by_group_id, get_all_active_users
+from app.crud.crud_schedule import get_tutor_and_auditory_names
 from app.schemas.notifications import ScheduleChange
-from app.core.queue import SCHEDULE_CHANGES_QUEUE, BROADCAST_QUEUE, CHAT_MESSAGES_QUEUE, REMINDERS_QUEUE
+from app.core.queue import (
+    SCHEDULE_CHANGES_QUEUE, BROADCAST_QUEUE, CHAT_MESSAGES_QUEUE, REMINDERS_QUEUE,
+    push_changes_for_retry, requeue_due_changes,
+)
+from app.core.resilience import backoff_delay
+
+# Ключи уже доставленных изменений расписания (см. drop_delivered_changes)
+DELIVERED_CHANGE_KEY_PREFIX = "delivered_change:"
 
 # Настраиваем логгер
 logger = logging.getLogger("Notifier")
 
 # --- Функции-помощники для форматирования сообщений ---
 
-def format_grouped_changes(changes: List[ScheduleChange]) -> str:
+def format_changed_fields(
+    change: ScheduleChange, tutor_names: Dict[int, str], auditory_names: Dict[int, str]
+) -> str:
+    """Описание изменившихся полей занятия: "ауд. 101 -> 205, время: 2 -> 3 пара"."""
+    b, a = change.lesson_before, change.lesson_after
+    details = []
+    for name in change.changed_fields:
+        if name == "date":
+            details.append(f"дата: {b.date} -> {a.date}")
+        elif name == "time_slot":
+            details.append(f"время: {b.time_slot} -> {a.time_slot} пара")
+        elif name == "lesson_type":
+            details.append(f"тип: {b.lesson_type} -> {a.lesson_type}")
+        elif name == "subgroup_name":
+            details.append(f"подгруппа: {b.subgroup_name or 'вся группа'} -> {a.subgroup_name or 'вся группа'}")
+        elif name == "tutor_id":
+            details.append(
+                f"преподаватель: {tutor_names.get(b.tutor_id, '?')} -> {tutor_names.get(a.tutor_id, '?')}"
+            )
+        elif name == "auditory_id":
+            details.append(
+                f"ауд. {auditory_names.get(b.auditory_id, '?')} -> {auditory_names.get(a.auditory_id, '?')}"
+            )
+    return ", ".join(details)
+
+
+def changed_name_ids(changes: List[ScheduleChange]) -> tuple[set[int], set[int]]:
+    """ID преподавателей и аудиторий, чьи имена нужны format_changed_fields для этих изменений."""
+    tutor_ids, auditory_ids = set(), set()
+    for change in changes:
+        for lesson in (change.lesson_before, change.lesson_after):
+            if lesson and "tutor_id" in change.changed_fields:
+                tutor_ids.add(lesson.tutor_id)
+            if lesson and "auditory_id" in change.changed_fields:
+                auditory_ids.add(lesson.auditory_id)
+    return tutor_ids - {None}, auditory_ids - {None}
+
+
+def format_grouped_changes(
+    changes: List[ScheduleChange],
+    tutor_names: Optional[Dict[int, str]] = None,
+    auditory_names: Optional[Dict[int, str]] = None,
+) -> str:
     """Форматирует сгруппированный список изменений в одно красивое сообщение."""
     today = date.today()
     tomorrow = today + timedelta(days=1)
@@ -45,7 +96,13 @@ def format_grouped_changes(changes: List[ScheduleChange]) -> str:
             change_line = f"❌ Отмена пары в {l_info.time_slot}: {l_info.subject_name}"
         elif change.change_type == "UPDATED":
             b, a = change.lesson_before, change.lesson_after
-            change_line = f"✏️ Изменена пара в {b.time_slot}: {b.subject_name} -> {a.subject_name}"
+            if "subject_name" in change.changed_fields or not change.changed_fields:
+                change_line = f"✏️ Изменена пара в {b.time_slot}: {b.subject_name} -> {a.subject_name}"
+            else:
+                change_line = f"✏️ {a.subject_name} ({b.time_slot} пара)"
+            details = format_changed_fields(change, tutor_names or {}, auditory_names or {})
+            if details:
+                change_line += f": {details}"
 
         if lesson_date == today:
             parts["today"].append(change_line)
@@ -68,27 +125,86 @@ def format_grouped_changes(changes: List[ScheduleChange]) -> str:
 
 # --- Обработчики задач из очереди ---
 
-async def handle_schedule_changes(bot: Bot, all_changes: List[ScheduleChange]):
-    """Обрабатывает пачку изменений, группирует их по группам и рассылает."""
+async def handle_schedule_changes(bot: Bot, all_changes: List[ScheduleChange], redis_client=None):
+    """
+    Обрабатывает пачку изменений, группирует их по группам и рассылает.
+    С redis_client изменения группы отмечаются доставленными после рассылки, а при
+    ошибке рассылки возвращаются в очередь с задержкой (см. _retry_changes).
+    """
     changes_by_group = defaultdict(list)
     for change in all_changes:
         changes_by_group[change.group_id].append(change)
-        
-    for group_id, group_changes in changes_by_group.items():
-        message = format_grouped_changes(group_changes)
-        
+    tutor_ids, auditory_ids = changed_name_ids(all_changes)
+
+    # Имена преподавателей и аудиторий - одним запросом на всю пачку изменений.
+    # Пачка уже снята с очереди: без имен уведомление все равно уходит, со строками "?"
+    try:
         async with AsyncSessionLocal() as session:
-            users_to_notify = await get_users_by_group_id(session, group_id=group_id)
-        if not users_to_notify: continue
-
-        logger.info(f"Notifying {len(users_to_notify)} users in group {group_id} about {len(group_changes)} changes.")
-        for user in users_to_notify:
-            if user.settings and user.settings.get("notifications_enabled", False):
-                try:
-                    await bot.send_message(user.telegram_id, message, parse_mode=ParseMode.MARKDOWN)
-                    await asyncio.sleep(0.1)
-                except TelegramAPIError as e:
-                    logger.error(f"Failed to send schedule update to user {user.telegram_id}: {e}")
+            tutor_names, auditory_names = await get_tutor_and_auditory_names(
+                session, tutor_ids=tutor_ids, auditory_ids=auditory_ids
+            )
+    except (SQLAlchemyError, OSError) as e:
+        logger.warning(f"Failed to load tutor and auditory names for schedule changes: {e}")
+        tutor_names, auditory_names = {}, {}
+
+    for group_id, group_changes in changes_by_group.items():
+        try:
+            await _notify_group(bot, group_id, group_changes, tutor_names, auditory_names)
+        except (SQLAlchemyError, redis.RedisError, OSError) as e:
+            # Сбой инфраструктуры: изменения вернутся в очередь и будут разосланы повторно
+            logger.error(f"Failed to notify group {group_id} about schedule changes: {e}")
+            if redis_client is not None:
+                await _retry_changes(group_id, group_changes)
+            continue
+        if redis_client is not None:
+            await mark_changes_delivered(redis_client, group_changes)
+
+
+async def _retry_changes(group_id: int, group_changes: List[ScheduleChange]):
+    """
+    Откладывает повтор рассылки с экспоненциальной задержкой, чтобы затяжной сбой
+    не превращался в горячий цикл; после NOTIFY_RETRY_MAX_ATTEMPTS попыток изменения отбрасываются.
+    """
+    attempts = max(change.delivery_attempts for change in group_changes) + 1
+    if attempts >= settings.NOTIFY_RETRY_MAX_ATTEMPTS:
+        logger.error(
+            f"Giving up on {len(group_changes)} schedule changes of group {group_id} after {attempts} attempts."
+        )
+        return
+    delay = backoff_delay(attempts, settings.NOTIFY_RETRY_BACKOFF_SECONDS, settings.NOTIFY_RETRY_BACKOFF_MAX_SECONDS)
+    try:
+        await push_changes_for_retry(
+            [change.model_copy(update={"delivery_attempts": attempts}).model_dump_json() for change in group_changes],
+            delay,
+        )
+    except redis.RedisError as e:
+        logger.error(f"Failed to requeue {len(group_changes)} schedule changes of group {group_id}: {e}")
+        return
+    logger.info(f"Retrying {len(group_changes)} schedule changes of group {group_id} in {delay:.0f}s.")
+
+
+async def _notify_group(
+    bot: Bot,
+    group_id: int,
+    group_changes: List[ScheduleChange],
+    tutor_names: Dict[int, str],
+    auditory_names: Dict[int, str],
+):
+    message = format_grouped_changes(group_changes, tutor_names, auditory_names)
+
+    async with AsyncSessionLocal() as session:
+        users_to_notify = await get_users_by_group_id(session, group_id=group_id)
+    if not users_to_notify: return
+
+    logger.info(f"Notifying {len(users_to_notify)} users in group {group_id} about {len(group_changes)} changes.")
+    for user in users_to_notify:
+        if user.settings and user.settings.get("notifications_enabled", False):
+            try:
+                await bot.send_message(user.telegram_id, message, parse_mode=ParseMode.MARKDOWN)
+                await asyncio.sleep(0.1)
+            except TelegramAPIError as e:
+                # Ошибка одного пользователя (заблокировал бота и т.п.) не повод повторять рассылку всей группе
+                logger.error(f"Failed to send schedule update to user {user.telegram_id}: {e}")
 
 async def handle_broadcast(bot: Bot, task: Dict):
     """Обрабатывает задачу на широковещательную рассылку и отправляет отчет."""
@@ -134,6 +250,40 @@ async def handle_chat_message(bot: Bot, task: Dict):
         logger.error(f"Failed to send message to chat {chat_id}: {e}")
         if admin_id: await bot.send_message(admin_id, f"❌ Не удалось отправить сообщение в чат `{chat_id}`.\nПричина: `{e}`", parse_mode="Markdown")
 
+def _delivered_key(change: ScheduleChange) -> str:
+    return f"{DELIVERED_CHANGE_KEY_PREFIX}{change.idempotency_key}"
+
+
+async def drop_delivered_changes(redis_client, changes: List[ScheduleChange]) -> List[ScheduleChange]:
+    """
+    Отбрасывает изменения, которые уже были доставлены (см. mark_changes_delivered).
+    Ключ только проверяется: отмечается он после отправки, поэтому доставка
+    "хотя бы раз" - если воркер упадет посреди рассылки, повтор изменения не отбросится.
+    """
+    keyed = [change for change in changes if change.idempotency_key]
+    if not keyed:
+        return changes
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for change in keyed:
+            pipe.exists(_delivered_key(change))
+        delivered = await pipe.execute()
+    fresh = [change for change in changes if not change.idempotency_key]
+    fresh.extend(change for change, is_delivered in zip(keyed, delivered) if not is_delivered)
+    if len(fresh) < len(changes):
+        logger.info(f"Dropped {len(changes) - len(fresh)} already delivered schedule changes.")
+    return fresh
+
+
+async def mark_changes_delivered(redis_client, changes: List[ScheduleChange]):
+    """Запоминает ключи изменений, рассылка которых завершена, на NOTIFY_DEDUP_TTL_SECONDS."""
+    keyed = [change for change in changes if change.idempotency_key]
+    if not keyed:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for change in keyed:
+            pipe.set(_delivered_key(change), 1, ex=settings.NOTIFY_DEDUP_TTL_SECONDS)
+        await pipe.execute()
+
 # --- Основной цикл обработки очередей ---
 async def handle_lesson_reminder(bot: Bot, task: Dict):
     """Обрабатывает задачу на напоминание о занятии."""
@@ -167,8 +317,6 @@ async def handle_lesson_reminder(bot: Bot, task: Dict):
             except TelegramAPIError as e:
                 logger.warning(f"Failed to send reminder to user {user.telegram_id}: {e}")
 
-# --- Основной цикл обработки очередей ---
-
 async def process_queues(bot: Bot):
     """Бесконечный цикл, который слушает все очереди Redis и распределяет задачи."""
     redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -177,12 +325,15 @@ async def process_queues(bot: Bot):
     
     while True:
         try:
-            # Сначала пытаемся выгрести пачку изменений расписания
+            # Сначала пытаемся выгрести пачку изменений расписания (с наступившими повторами)
+            await requeue_due_changes()
             tasks_json = await redis_client.lpop(SCHEDULE_CHANGES_QUEUE, 100)
             if tasks_json:
-                all_changes = [ScheduleChange.model_validate_json(task) for task in tasks_json]
+                all_changes = await drop_delivered_changes(
+                    redis_client, [ScheduleChange.model_validate_json(task) for task in tasks_json]
+                )
                 if all_changes:
-                    asyncio.create_task(handle_schedule_changes(bot, all_changes))
+                    asyncio.create_task(handle_schedule_changes(bot, all_changes, redis_client))
 
             # Затем с таймаутом слушаем остальные очереди "по-одному"
             result = await redis_client.blpop([BROADCAST_QUEUE, CHAT_MESSAGES_QUEUE, REMINDERS_QUEUE], timeout=1)
@@ -0,0 +1,72 @@
+# app/core/coalesce.py
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.metrics import publish_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RequestCoalescer:
+    """
+    Single-flight внутри процесса: одновременные вызовы с одинаковым ключом ждут
+    одно выполнение, а не запускают N одинаковых запросов к БД.
+
+    Выполнение идет отдельной задачей: отмена одного из ждущих (клиент закрыл
+    соединение) не отменяет его для остальных. Результат общий для всех ждущих,
+    поэтому изменять его нельзя - только копировать.
+    """
+
+    def __init__(self, name: str, publish_every: float = 60.0):
+        self.name = name
+        self.publish_every = publish_every
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self._last_published = time.monotonic()
+        self._publish_task = None
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.create_task(factory(), name=f"Coalesced:{self.name}")
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        self._maybe_publish()
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Если все ждущие отменились, ошибку никто не прочитает - не даем asyncio ругаться на это
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> Dict[str, Any]:
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+    def _maybe_publish(self):
+        now = time.monotonic()
+        if now - self._last_published < self.publish_every:
+            return
+        self._last_published = now
+        self._publish_task = asyncio.create_task(
+            publish_metrics(f"request_coalescing:{self.name}:{PROCESS_ID}", self.snapshot())
+        )
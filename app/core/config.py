@@ -1,4 +1,6 @@
 # app/core/config.py
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -25,5 +27,88 @@ class Settings(BaseSettings):
     MINI_APP_URL: str
     
     LESSON_START_TIMES: str
+
+    # Синхронизация расписания
+    SYNC_FETCH_CONCURRENCY: int = 8  # Сколько запросов к API ОмГУ выполняется параллельно
+    SYNC_BATCH_SIZE: int = 20  # Сколько групп пишется в БД одной транзакцией
+    SYNC_LESSON_WRITER: str = "copy"  # "copy" (COPY во временную таблицу) или "values" (INSERT ... VALUES)
+    SYNC_PARSE_IN_PROCESS_POOL: bool = False  # Разбор ответов ОмГУ и diff в отдельных процессах
+    SYNC_PROCESS_POOL_WORKERS: int = 2
+    SYNC_JOB_TTL_SECONDS: int = 7 * 24 * 3600  # Сколько хранится прогресс разовых синхронизаций из админки
+    # Окно синхронизации [сегодня - PAST; сегодня + FUTURE]: занятия вне окна "заморожены" -
+    # синхронизация их не сравнивает, не перезаписывает и не удаляет.
+    # FUTURE=None - без верхней границы. С границей занятия, попадающие в окно по мере
+    # его сдвига, приходят как новые (и о них уведомляют), поэтому граница должна быть дальше конца семестра.
+    SYNC_WINDOW_PAST_DAYS: int = 7
+    SYNC_WINDOW_FUTURE_DAYS: Optional[int] = None
+
+    # Адаптивный планировщик синхронизации расписания
+    SYNC_ADAPTIVE_TICK_SECONDS: int = 60  # Как часто планировщик забирает группы, которым пора обновиться
+    SYNC_MIN_INTERVAL_SECONDS: float = 5 * 60.0
+    SYNC_BASE_INTERVAL_SECONDS: float = 60 * 60.0  # Интервал для группы с одним пользователем без изменений
+    SYNC_MAX_INTERVAL_SECONDS: float = 12 * 3600.0
+    SYNC_SCHEDULER_REFRESH_SECONDS: float = 15 * 60.0  # Как часто перечитывать группы и пользователей из БД
+    SYNC_MAX_GROUPS_PER_TICK: int = 60
+    SYNC_CHANGE_RATE_ALPHA: float = 0.3  # Вес последней синхронизации в оценке частоты изменений
+
+    # Шардирование синхронизации между несколькими процессами воркера
+    SYNC_SHARDING_ENABLED: bool = False
+    SYNC_SHARD_COUNT: int = 32  # Больше шардов - ровнее распределение между воркерами
+    SYNC_SHARD_LEASE_TTL_SECONDS: float = 30.0  # Через столько шарды упавшего воркера переходят другим
+    WORKER_RUN_BOT: bool = True  # Поллинг бота - только в одном воркере; дополнительным ставим False
+
+    # Outbox изменений расписания
+    OUTBOX_RELAY_BATCH_SIZE: int = 1000
+    OUTBOX_RELAY_POLL_SECONDS: float = 2.0
+    NOTIFY_DEDUP_TTL_SECONDS: int = 7 * 24 * 3600  # Сколько помнить ключи уже доставленных изменений
+    NOTIFY_RETRY_MAX_ATTEMPTS: int = 5  # После стольких неудачных рассылок изменения отбрасываются
+    NOTIFY_RETRY_BACKOFF_SECONDS: float = 15.0
+    NOTIFY_RETRY_BACKOFF_MAX_SECONDS: float = 600.0
+
+    # Распределенные блокировки задач воркера
+    JOB_LOCK_TTL_SECONDS: float = 60.0  # Продлевается, пока задача работает; истекает, если воркер упал
+
+    # Активность пользователей и горячие группы
+    USER_ACTIVITY_FLUSH_SECONDS: float = 30.0  # Как часто пачка обращений пишется в БД и Redis
+    USER_ACTIVITY_TOUCH_INTERVAL_SECONDS: float = 5 * 60.0  # Чаще одного раза за интервал last_active_at не обновляется
+    HOT_GROUP_WINDOW_DAYS: int = 14  # Группа горячая, если кто-то из нее заходил за это окно
+
+    # HTTP-клиент API ОмГУ
+    OMSU_TIMEOUT: float = 15.0
+    OMSU_CONNECT_TIMEOUT: float = 5.0
+    OMSU_MAX_CONNECTIONS: int = 16
+    OMSU_MAX_KEEPALIVE_CONNECTIONS: int = 8
+    OMSU_HTTP2: bool = False  # Требует установленного пакета h2
+    OMSU_RETRIES: int = 3  # Повторы после первой попытки
+    OMSU_BACKOFF_BASE_SECONDS: float = 0.5
+    OMSU_BACKOFF_MAX_SECONDS: float = 10.0
+    OMSU_RATE_LIMIT_PER_SECOND: float = 10.0
+    OMSU_RATE_LIMIT_BURST: int = 10
+    OMSU_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Ошибок подряд до размыкания автомата
+    OMSU_CIRCUIT_RECOVERY_SECONDS: float = 60.0
+
+    # Дисковый кэш ответов API ОмГУ
+    OMSU_CACHE_ENABLED: bool = True
+    OMSU_CACHE_DIR: str = ".cache/omsu"
+    OMSU_CACHE_FRESH_SECONDS: float = 300.0  # Моложе - разовые чтения (не синхронизация) берут из кэша без запроса
+    OMSU_CACHE_MAX_STALE_SECONDS: float = 7 * 24 * 3600.0  # Старше - не отдаем даже при недоступности ОмГУ
+    OMSU_CACHE_REVALIDATE_DELAY_SECONDS: float = 30.0
+
+    # Кэш расписаний групп по дням в Redis (инвалидируется синхронизацией)
+    SCHEDULE_CACHE_ENABLED: bool = True
+    SCHEDULE_CACHE_TTL_SECONDS: int = 6 * 3600
+
+    # Снимки расписаний групп для API (ETag/304): пишутся синхронизацией при изменениях
+    SCHEDULE_SNAPSHOT_ENABLED: bool = True
+    SCHEDULE_SNAPSHOT_WEEKS: int = 4  # Текущая неделя и следующие
+    SCHEDULE_SNAPSHOT_TTL_SECONDS: int = 8 * 24 * 3600  # Снимок неизменившейся группы пересобирается по запросу
+
+    # Журнал изменений для /schedule/my/changes
+    SCHEDULE_CHANGE_LOG_RETENTION_DAYS: int = 30  # Клиенты с версией старше получают full_refresh
+    SCHEDULE_DELTA_MAX_CHANGES: int = 2000  # Больше изменений - клиенту дешевле перезагрузить расписание
+
+    # Push новых версий расписания открытым Mini App (SSE)
+    SCHEDULE_EVENTS_PING_SECONDS: float = 20.0  # Комментарий-пинг в тишине, чтобы прокси не закрывали соединение
+    SCHEDULE_EVENTS_TOKEN_EXPIRE_SECONDS: int = 60  # Токен потока в URL попадает в логи, поэтому живет только до подключения
 settings = Settings()
 
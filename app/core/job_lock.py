@@ -0,0 +1,228 @@
+# app/core/job_lock.py
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.queue import redis_client
+
+logger = logging.getLogger(__name__)
+
+JOB_LOCK_KEY = "job_lock:{name}"
+JOB_STATS_KEY = "job_stats:{name}"  # hash: счетчики запусков и пропусков задачи
+JOB_NAMES_KEY = "job_names"
+JOB_SKIPPED_RUNS_KEY = "job_skipped_runs"  # список последних пропущенных запусков (JSON)
+MAX_SKIPPED_RUNS = 200
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Продление, освобождение и перевод в "отработала недавно" - только для своего токена
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_HOLD_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[1] .. '|done', 'PX', ARGV[2])
+end
+return 0
+"""
+_renew_script = redis_client.register_script(_RENEW_LUA)
+_release_script = redis_client.register_script(_RELEASE_LUA)
+_hold_script = redis_client.register_script(_HOLD_LUA)
+
+
+class JobLock:
+    """
+    Распределенная блокировка задачи в Redis (SET NX PX) с продлением, пока задача
+    работает. Значение - токен владельца "<воркер>|<uuid>", поэтому по нему видно,
+    кто держит блокировку, а чужая блокировка не может быть снята или продлена.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None):
+        self.name = name
+        self.key = JOB_LOCK_KEY.format(name=name)
+        self.ttl_ms = int((ttl or settings.JOB_LOCK_TTL_SECONDS) * 1000)
+        self.token = f"{WORKER_ID}|{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        return bool(await redis_client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    async def holder(self) -> Optional[str]:
+        return await redis_client.get(self.key)
+
+    async def keep_alive(self):
+        """Продлевает блокировку каждые ttl/3, пока задача не завершится."""
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            try:
+                if not await _renew_script(keys=[self.key], args=[self.token, self.ttl_ms]):
+                    logger.warning(f"Job '{self.name}' lost its lock; another run may start concurrently.")
+                    return
+            except redis.RedisError as e:
+                logger.warning(f"Failed to renew lock of job '{self.name}': {e}")
+
+    async def release(self, hold_for: Optional[float] = None):
+        """Снимает блокировку или, если задан hold_for, оставляет ее еще на столько секунд."""
+        if hold_for:
+            await _hold_script(keys=[self.key], args=[self.token, int(hold_for * 1000)])
+        else:
+            await _release_script(keys=[self.key], args=[self.token])
+
+
+async def running_jobs(prefix: str) -> List[str]:
+    """
+    Имена задач с префиксом prefix, которые сейчас выполняются (блокировка взята и не
+    в состоянии "отработала недавно"). Если Redis недоступен, считаем, что таких нет.
+    """
+    try:
+        keys = [key async for key in redis_client.scan_iter(match=JOB_LOCK_KEY.format(name=f"{prefix}*"), count=1000)]
+        holders = await redis_client.mget(keys) if keys else []
+    except redis.RedisError as e:
+        logger.warning(f"Failed to list running jobs '{prefix}*': {e}")
+        return []
+    return [
+        key[len(JOB_LOCK_KEY.format(name="")):]
+        for key, holder in zip(keys, holders)
+        if holder is not None and not holder.endswith("|done")
+    ]
+
+
+async def _record_run(name: str, status: str, duration: float):
+    stats_key = JOB_STATS_KEY.format(name=name)
+    try:
+        async with redis_client.pipeline() as pipe:
+            pipe.sadd(JOB_NAMES_KEY, name)
+            pipe.hincrby(stats_key, "runs" if status == "success" else "failed", 1)
+            pipe.hset(stats_key, mapping={
+                "last_status": status, "last_duration_seconds": round(duration, 3),
+                "last_finished_at": datetime.now(timezone.utc).isoformat(), "last_worker": WORKER_ID,
+            })
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to record run of job '{name}': {e}")
+
+
+async def _record_skip(name: str, holder: Optional[str]):
+    # Токен с суффиксом "|done" - задача только что отработала (hold_for), иначе она еще идет
+    reason = "recently_finished" if holder and holder.endswith("|done") else "overlap"
+    record = {
+        "job": name, "reason": reason, "worker": WORKER_ID,
+        "holder": holder.split("|", 1)[0] if holder else None,
+        "skipped_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        async with redis_client.pipeline() as pipe:
+            pipe.sadd(JOB_NAMES_KEY, name)
+            pipe.hincrby(JOB_STATS_KEY.format(name=name), "skipped", 1)
+            pipe.hset(JOB_STATS_KEY.format(name=name), "last_skipped_at", record["skipped_at"])
+            pipe.lpush(JOB_SKIPPED_RUNS_KEY, json.dumps(record))
+            pipe.ltrim(JOB_SKIPPED_RUNS_KEY, 0, MAX_SKIPPED_RUNS - 1)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to record skipped run of job '{name}': {e}")
+    logger.info(f"Job '{name}' skipped ({reason}): lock is held by {record['holder']}.")
+
+
+def single_flight(
+    name: Optional[str] = None,
+    *,
+    hold_for: Optional[float] = None,
+    wait: float = 0,
+    ttl: Optional[float] = None,
+):
+    """
+    Декоратор задачи воркера: одновременно во всех процессах выполняется не больше
+    одного запуска. Запуск, пришедший во время выполнения (cron, ручной запуск из
+    админки, второй воркер), не ставится в очередь, а сливается с текущим: он
+    пропускается и записывается в JOB_SKIPPED_RUNS_KEY.
+
+    hold_for - сколько секунд после завершения еще не пускать новые запуски. Нужно
+    периодическим задачам, которые запускаются во всех воркерах одновременно: без
+    этого воркер с отстающими часами выполнил бы задачу второй раз сразу после первого.
+
+    wait - сколько секунд ждать освобождения блокировки, прежде чем пропустить запуск.
+    Для разовых запусков, которые нельзя просто потерять до следующего срабатывания.
+
+    Если Redis недоступен, задача выполняется без блокировки: в одном воркере это
+    безопасно, а остановить синхронизацию из-за Redis было бы хуже.
+    """
+    def decorator(func):
+        job_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            lock = JobLock(job_name, ttl)
+            try:
+                acquired = await lock.acquire()
+                deadline = time.monotonic() + wait
+                while not acquired and time.monotonic() < deadline:
+                    await asyncio.sleep(1)
+                    acquired = await lock.acquire()
+            except redis.RedisError as e:
+                logger.warning(f"Job lock for '{job_name}' is unavailable ({e}); running without it.")
+                return await func(*args, **kwargs)
+
+            if not acquired:
+                try:
+                    holder = await lock.holder()
+                except redis.RedisError:
+                    holder = None
+                await _record_skip(job_name, holder)
+                return None
+
+            keep_alive = asyncio.create_task(lock.keep_alive())
+            started_at = time.monotonic()
+            status = "failed"
+            try:
+                result = await func(*args, **kwargs)
+                status = "success"
+                return result
+            finally:
+                keep_alive.cancel()
+                await _record_run(job_name, status, time.monotonic() - started_at)
+                try:
+                    await lock.release(hold_for=hold_for)
+                except redis.RedisError as e:
+                    logger.warning(f"Failed to release lock of job '{job_name}': {e}")
+
+        return wrapper
+    return decorator
+
+
+async def read_job_stats(skipped_limit: int = 50) -> Dict[str, Any]:
+    """Счетчики по всем задачам и последние пропущенные запуски - для админки."""
+    names = sorted(await redis_client.smembers(JOB_NAMES_KEY))
+    async with redis_client.pipeline() as pipe:
+        for job_name in names:
+            pipe.hgetall(JOB_STATS_KEY.format(name=job_name))
+            pipe.get(JOB_LOCK_KEY.format(name=job_name))
+        pipe.lrange(JOB_SKIPPED_RUNS_KEY, 0, skipped_limit - 1)
+        results = await pipe.execute()
+
+    jobs: Dict[str, Any] = {}
+    for i, job_name in enumerate(names):
+        stats, holder = results[2 * i], results[2 * i + 1]
+        jobs[job_name] = {
+            **stats,
+            "running_on": holder.split("|", 1)[0] if holder and not holder.endswith("|done") else None,
+        }
+    skipped: List[Dict[str, Any]] = [json.loads(raw) for raw in results[-1]]
+    return {"jobs": jobs, "skipped_runs": skipped}
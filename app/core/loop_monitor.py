@@ -0,0 +1,72 @@
+# app/core/loop_monitor.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core.metrics import publish_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """
+    Меряет задержку цикла событий: каждые `interval` секунд засыпает и смотрит,
+    насколько позже запланированного проснулся. Задержка - время, на которое
+    цикл был занят чужим синхронным кодом (разбор JSON, хэши, pydantic), то есть
+    на столько же опаздывали ответы бота и остальные задачи процесса.
+    """
+
+    def __init__(self, name: str, interval: float = 0.25, window: int = 2400, publish_every: float = 60.0):
+        self.name = name
+        self.interval = interval
+        self.publish_every = publish_every
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, lag: float):
+        self._samples.append(lag)
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self._samples:
+            return {"samples": 0}
+        ordered = sorted(self._samples)
+
+        def percentile(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 1)
+
+        return {
+            "samples": len(ordered),
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(ordered[-1] * 1000, 1),
+            "over_100ms": sum(1 for lag in ordered if lag > 0.1),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_published = loop.time()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.record(lag)
+            if lag > 1.0:
+                logger.warning(f"Event loop of '{self.name}' was blocked for {lag:.2f}s")
+            if loop.time() - last_published >= self.publish_every:
+                last_published = loop.time()
+                await publish_metrics(f"event_loop_lag:{self.name}", self.snapshot())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"LoopLagMonitor:{self.name}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
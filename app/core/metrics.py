@@ -0,0 +1,31 @@
+# app/core/metrics.py
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.core.queue import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Хэш Redis, в который воркер складывает свои метрики, чтобы их мог прочитать API-процесс
+WORKER_METRICS_KEY = "worker_metrics"
+
+
+async def publish_metrics(name: str, payload: Dict[str, Any]):
+    """Сохраняет снимок метрик `name` (с отметкой времени) для чтения из админки."""
+    snapshot = {"updated_at": datetime.now(timezone.utc).isoformat(), **payload}
+    try:
+        await redis_client.hset(WORKER_METRICS_KEY, name, json.dumps(snapshot, default=str))
+    except Exception as e:
+        # Метрики не должны ломать основную работу воркера
+        logger.warning(f"Failed to publish metrics '{name}': {e}")
+
+
+async def read_metrics(name: Optional[str] = None) -> Dict[str, Any]:
+    """Возвращает метрики `name` или все опубликованные метрики, если имя не задано."""
+    if name is not None:
+        raw = await redis_client.hget(WORKER_METRICS_KEY, name)
+        return json.loads(raw) if raw else {}
+    raw_all = await redis_client.hgetall(WORKER_METRICS_KEY)
+    return {key: json.loads(value) for key, value in raw_all.items()}
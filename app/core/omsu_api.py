@@ -1,6 +1,18 @@
 # app/core/omsu_api.py
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
 import httpx
-from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.resilience import TokenBucket, CircuitBreaker, CircuitOpenError, backoff_delay
+from app.core.omsu_cache import OmsuResponseCache, CachedResponse
+
+logger = logging.getLogger(__name__)
 
 # Константы для URL
 BASE_URL = "https://eservice.omsu.ru/schedule/backend/"
@@ -8,22 +20,301 @@ GROUPS_URL = f"{BASE_URL}dict/groups"
 TUTORS_URL = f"{BASE_URL}dict/tutors"
 AUDITORIES_URL = f"{BASE_URL}dict/auditories"
 SCHEDULE_URL = f"{BASE_URL}schedule/group/"
+DICTIONARY_URLS = {"groups": GROUPS_URL, "tutors": TUTORS_URL, "auditories": AUDITORIES_URL}
+
+# Ответы, после которых имеет смысл повторить запрос
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RawPayload:
+    """
+    Неразобранное тело ответа ОмГУ с отпечатком - для разбора в другом процессе.
+    `response` задан, только если тело пришло из сети: такой ответ попадает в дисковый
+    кэш после проверки (см. OmsuApi.confirm_payload), тела из кэша уже проверены.
+    """
+    __slots__ = ("url", "body", "fingerprint", "response")
+
+    def __init__(self, url: str, body: bytes, response: Optional[httpx.Response] = None):
+        self.url = url
+        self.body = body
+        self.fingerprint = hashlib.sha256(body).hexdigest()
+        self.response = response
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
 
 class OmsuApi:
-    """Асинхронный клиент для API ОмГУ."""
+    """
+    Асинхронный клиент для API ОмГУ.
+    Пул соединений с keep-alive, повторы с джиттером, ограничение частоты
+    запросов и автомат защиты, который перестает дергать ОмГУ, пока оно лежит.
+    Последние удачные ответы хранятся на диске и отдаются, когда ОмГУ недоступен.
+    """
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+        http2 = settings.OMSU_HTTP2 and _http2_available()
+        if settings.OMSU_HTTP2 and not http2:
+            logger.warning("OMSU_HTTP2 is enabled, but the 'h2' package is not installed. Using HTTP/1.1.")
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OMSU_TIMEOUT, connect=settings.OMSU_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.OMSU_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OMSU_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+            http2=http2,
+        )
+        self.rate_limiter = TokenBucket(settings.OMSU_RATE_LIMIT_PER_SECOND, settings.OMSU_RATE_LIMIT_BURST)
+        self.circuit_breaker = CircuitBreaker(
+            "omsu", settings.OMSU_CIRCUIT_FAILURE_THRESHOLD, settings.OMSU_CIRCUIT_RECOVERY_SECONDS
+        )
+        self.counters: Counter = Counter()
+        # url -> {"etag", "last_modified", "digest"} последней успешной загрузки справочника
+        self._dictionary_validators: Dict[str, Dict[str, Optional[str]]] = {}
+        # Дисковый кэш последних удачных ответов (stale-while-revalidate)
+        self.cache = OmsuResponseCache(settings.OMSU_CACHE_DIR) if settings.OMSU_CACHE_ENABLED else None
+        self._revalidating: set[str] = set()
+        self._background_tasks: set[asyncio.Task] = set()
 
-    async def _get_data(self, url: str) -> Optional[List[Dict[str, Any]]]:
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики клиента: запросы, попытки, повторы, ошибки, ожидание лимита и состояние автомата."""
+        return {
+            **self.counters,
+            "rate_limit_wait_seconds": round(self.counters["rate_limit_wait_ms"] / 1000, 3),
+            "circuit_state": self.circuit_breaker.state,
+            "circuit_opened": self.circuit_breaker.times_opened,
+        }
+
+    async def _request(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        GET с повторами. Повторяются сетевые ошибки, таймауты, 429 и 5xx.
+        Ответ 304 на условный запрос возвращается как есть.
+        Бросает CircuitOpenError, httpx.HTTPStatusError или httpx.RequestError.
+        """
+        self.counters["requests"] += 1
+        attempts = max(1, settings.OMSU_RETRIES + 1)
+        for attempt in range(attempts):
+            if not self.circuit_breaker.allow_request():
+                self.counters["circuit_rejected"] += 1
+                raise CircuitOpenError(f"OMSU circuit is open, skipping {url}")
+            # Пробный запрос half-open автомата: если он оборвется, пробу нужно вернуть
+            probe = self.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+
+            try:
+                waited = await self.rate_limiter.acquire()
+                self.counters["rate_limit_wait_ms"] += int(waited * 1000)
+                self.counters["attempts"] += 1
+                response = await self.client.get(url, headers=headers)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+            except (httpx.HTTPStatusError, httpx.RequestError) as e:
+                self.counters["attempt_failures"] += 1
+                self.circuit_breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                delay = backoff_delay(attempt, settings.OMSU_BACKOFF_BASE_SECONDS, settings.OMSU_BACKOFF_MAX_SECONDS)
+                logger.info(f"OMSU request {url} failed ({e!r}), retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                if probe:
+                    self.circuit_breaker.release_probe()
+                raise
+
+            self.circuit_breaker.record_success()
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+
+    def _parse_body(self, url: str, body: bytes) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """Разбирает тело ответа ОмГУ. Возвращает данные и SHA-256 отпечаток сырых байт. Бросает ValueError."""
+        json_response = json.loads(body)
+        if not isinstance(json_response, dict):
+            raise ValueError(f"unexpected OMSU payload type {type(json_response).__name__}")
+        if json_response.get("success"):
+            return json_response.get("data"), hashlib.sha256(body).hexdigest()
+        self.counters["unsuccessful_payloads"] += 1
+        logger.warning(f"OMSU returned success=false for {url}")
+        return None, None
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _remember(self, url: str, response: httpx.Response):
+        """Сохраняет удачный ответ в дисковый кэш в фоне."""
+        if self.cache is not None:
+            self._spawn(self.cache.put(
+                url, response.content,
+                etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+            ))
+
+    async def _get_cached(self, url: str) -> Optional[CachedResponse]:
+        return await self.cache.get(url) if self.cache is not None else None
+
+    def _serve_stale(
+        self, url: str, cached: Optional[CachedResponse]
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """При недоступности ОмГУ отдает последний удачный ответ из кэша и перепроверяет его в фоне."""
+        if cached is None or cached.age > settings.OMSU_CACHE_MAX_STALE_SECONDS:
+            return None, None
         try:
-            response = await self.client.get(url)
-            response.raise_for_status()
-            json_response = response.json()
-            if json_response.get("success"):
-                return json_response.get("data")
-            return None
+            data, fingerprint = self._parse_body(url, cached.body)
+        except ValueError:
+            return None, None
+        if data is not None:
+            self.counters["cache_stale_served"] += 1
+            logger.info(f"OMSU is unavailable, serving {url} from cache ({cached.age / 60:.0f} min old)")
+            if url not in self._revalidating:
+                self._revalidating.add(url)
+                self._spawn(self._revalidate(url))
+        return data, fingerprint
+
+    async def _revalidate(self, url: str):
+        """Фоновая перепроверка устаревшей записи кэша после паузы."""
+        try:
+            await asyncio.sleep(settings.OMSU_CACHE_REVALIDATE_DELAY_SECONDS)
+            response = await self._request(url)
+            data, _ = self._parse_body(url, response.content)
+            if data is not None:
+                self.counters["cache_revalidated"] += 1
+                self._remember(url, response)
+        except (CircuitOpenError, httpx.HTTPStatusError, httpx.RequestError, ValueError) as e:
+            logger.info(f"Background revalidation of {url} failed: {e!r}")
+        finally:
+            self._revalidating.discard(url)
+
+    async def _get_data_with_fingerprint(
+        self, url: str, use_fresh_cache: bool = False
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """
+        Возвращает данные ответа и SHA-256 отпечаток его тела (сырых байт).
+        При ошибке ОмГУ отдается последняя удачная (устаревшая) запись дискового кэша.
+        С use_fresh_cache свежая запись кэша отдается без запроса к ОмГУ - только для
+        разовых чтений: синхронизация должна видеть текущий ответ ОмГУ.
+        """
+        cached = await self._get_cached(url) if use_fresh_cache else None
+        if cached is not None and cached.age < settings.OMSU_CACHE_FRESH_SECONDS:
+            try:
+                data, fingerprint = self._parse_body(url, cached.body)
+                if data is not None:
+                    self.counters["cache_fresh_hits"] += 1
+                    return data, fingerprint
+            except ValueError:
+                pass
+
+        try:
+            response = await self._request(url)
+            data, fingerprint = self._parse_body(url, response.content)
+            if data is not None:
+                self.counters["successes"] += 1
+                self._remember(url, response)
+                return data, fingerprint
+            return None, None
+        except CircuitOpenError:
+            pass
         except (httpx.HTTPStatusError, httpx.RequestError, ValueError) as e:
+            self.counters["failures"] += 1
+            logger.warning(f"OMSU request {url} failed: {e!r}")
+        if cached is None:
+            cached = await self._get_cached(url)
+        return self._serve_stale(url, cached)
+
+    async def _get_raw_payload(self, url: str) -> Optional[RawPayload]:
+        """
+        То же, что _get_data_with_fingerprint (без свежего кэша), но без разбора JSON:
+        тело из сети возвращается непроверенным, и вызывающий обязан вызвать confirm_payload.
+        """
+        try:
+            response = await self._request(url)
+            return RawPayload(url, response.content, response)
+        except CircuitOpenError:
+            pass
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            self.counters["failures"] += 1
+            logger.warning(f"OMSU request {url} failed: {e!r}")
+
+        cached = await self._get_cached(url)
+        if cached is None or cached.age > settings.OMSU_CACHE_MAX_STALE_SECONDS:
             return None
+        self.counters["cache_stale_served"] += 1
+        logger.info(f"OMSU is unavailable, serving {url} from cache ({cached.age / 60:.0f} min old)")
+        if url not in self._revalidating:
+            self._revalidating.add(url)
+            self._spawn(self._revalidate(url))
+        return RawPayload(url, cached.body)
+
+    def confirm_payload(self, payload: RawPayload, valid: bool):
+        """Итог разбора тела из _get_raw_payload: удачный ответ из сети сохраняется в кэш."""
+        if payload.response is None:
+            return
+        if valid:
+            self.counters["successes"] += 1
+            self._remember(payload.url, payload.response)
+        else:
+            self.counters["unsuccessful_payloads"] += 1
+            logger.warning(f"OMSU returned an unusable payload for {payload.url}")
+
+    async def _get_data(self, url: str) -> Optional[List[Dict[str, Any]]]:
+        data, _ = await self._get_data_with_fingerprint(url, use_fresh_cache=True)
+        return data
+
+    async def get_dictionary_if_modified(self, name: str) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """
+        Условная загрузка справочника `name` ("groups", "tutors", "auditories").
+        Возвращает (data, not_modified). Использует ETag/Last-Modified, если ОмГУ
+        их отдает, а иначе сравнивает SHA-256 тела с прошлой успешной загрузкой.
+        При ошибке отдает устаревшую запись дискового кэша или (None, False).
+        """
+        url = DICTIONARY_URLS[name]
+        validators = self._dictionary_validators.get(url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        try:
+            response = await self._request(url, headers=headers)
+            if response.status_code == 304:
+                self.counters["not_modified"] += 1
+                return None, True
+
+            digest = hashlib.sha256(response.content).hexdigest()
+            self._dictionary_validators[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "digest": digest,
+            }
+            if validators.get("digest") == digest:
+                self.counters["not_modified"] += 1
+                return None, True
+
+            data, _ = self._parse_body(url, response.content)
+            if data is not None:
+                self.counters["successes"] += 1
+                self._remember(url, response)
+                return data, False
+            self._dictionary_validators.pop(url, None)
+            return None, False
+        except CircuitOpenError:
+            pass
+        except (httpx.HTTPStatusError, httpx.RequestError, ValueError) as e:
+            self._dictionary_validators.pop(url, None)
+            self.counters["failures"] += 1
+            logger.warning(f"OMSU request {url} failed: {e!r}")
+        data, _ = self._serve_stale(url, await self._get_cached(url))
+        return data, False
+
+    def reset_dictionary_validators(self):
+        """Забывает ETag/Last-Modified/отпечатки, чтобы следующая загрузка справочников была полной."""
+        self._dictionary_validators.clear()
 
     async def get_groups(self) -> Optional[List[Dict[str, Any]]]:
         return await self._get_data(GROUPS_URL)
@@ -37,7 +328,18 @@ class OmsuApi:
     async def get_schedule_for_group(self, group_id: int) -> Optional[List[Dict[str, Any]]]:
         return await self._get_data(f"{SCHEDULE_URL}{group_id}")
 
+    async def get_schedule_for_group_with_fingerprint(
+        self, group_id: int
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        return await self._get_data_with_fingerprint(f"{SCHEDULE_URL}{group_id}")
+
+    async def get_schedule_payload_for_group(self, group_id: int) -> Optional[RawPayload]:
+        return await self._get_raw_payload(f"{SCHEDULE_URL}{group_id}")
+
     async def close(self):
+        for task in list(self._background_tasks):
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
         await self.client.aclose()
 
-api_client = OmsuApi()
\ No newline at end of file
+api_client = OmsuApi()
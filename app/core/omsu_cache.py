@@ -0,0 +1,90 @@
+# app/core/omsu_cache.py
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Последний удачный ответ ОмГУ, сохраненный на диске."""
+    __slots__ = ("body", "stored_at", "etag", "last_modified")
+
+    def __init__(self, body: bytes, stored_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.body = body
+        self.stored_at = stored_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+
+class OmsuResponseCache:
+    """
+    Постоянный кэш ответов API ОмГУ: по одному сжатому gzip файлу на URL
+    с телом ответа, временем сохранения и валидаторами (ETag/Last-Modified).
+    Работа с диском вынесена в пул потоков, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json.gz"
+
+    def _read(self, url: str) -> Optional[CachedResponse]:
+        path = self._path(url)
+        try:
+            with gzip.open(path, "rb") as f:
+                record = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Corrupted OMSU cache entry {path}: {e}")
+            return None
+        return CachedResponse(
+            body=record["body"].encode("utf-8"), stored_at=record["stored_at"],
+            etag=record.get("etag"), last_modified=record.get("last_modified"),
+        )
+
+    def _write(self, url: str, entry: CachedResponse):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        record = {
+            "url": url, "stored_at": entry.stored_at, "etag": entry.etag,
+            "last_modified": entry.last_modified, "body": entry.body.decode("utf-8"),
+        }
+        # Пишем во временный файл и атомарно подменяем, чтобы читатель не увидел половину файла.
+        # Файл свой у каждой записи: один URL могут одновременно писать несколько потоков
+        # (фоновая перепроверка и синхронизация), и общий файл остался бы перемешанным.
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=path.name, suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+            try:
+                with gzip.GzipFile(fileobj=tmp, mode="wb", compresslevel=6) as f:
+                    f.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        return await asyncio.to_thread(self._read, url)
+
+    async def put(
+        self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ):
+        entry = CachedResponse(body=body, stored_at=time.time(), etag=etag, last_modified=last_modified)
+        try:
+            await asyncio.to_thread(self._write, url, entry)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to write OMSU cache entry for {url}: {e}")
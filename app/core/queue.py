@@ -1,7 +1,8 @@
 # app/core/queue.py
 import redis.asyncio as redis
 import json
-from typing import List
+import time
+from typing import Dict, List, Optional
 from app.models.schedule import Lesson
 from app.schemas.notifications import ScheduleChange
 from app.core.config import settings
@@ -9,10 +10,14 @@ from app.core.config import settings
 redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True) # <-- Используем
 
 SCHEDULE_CHANGES_QUEUE = "schedule_changes_queue"
+# Отложенный повтор рассылки изменений: sorted set JSON изменения -> время, когда его вернуть в очередь
+SCHEDULE_CHANGES_RETRY_KEY = "schedule_changes_retry"
 BROADCAST_QUEUE = "broadcast_queue" # <-- Новая очередь
 CHAT_MESSAGES_QUEUE = "chat_messages_queue"
 REMINDERS_QUEUE = "reminders_queue"
 CONTROL_QUEUE = "control_queue"
+# Pub/sub, а не очередь: новые версии расписаний групп для открытых Mini App (SSE в API)
+SCHEDULE_UPDATES_CHANNEL = "schedule_updates"
 
 async def push_changes_to_queue(changes: List[ScheduleChange]):
     """Сериализует и добавляет изменения расписания в очередь Redis."""
@@ -22,6 +27,38 @@ async def push_changes_to_queue(changes: List[ScheduleChange]):
         await pipe.execute()
 
 
+async def push_serialized_changes_to_queue(payloads: List[str]):
+    """Добавляет уже сериализованные изменения расписания (JSON) одной командой."""
+    if payloads:
+        await redis_client.rpush(SCHEDULE_CHANGES_QUEUE, *payloads)
+
+
+# Переносит наступившие повторы в очередь изменений атомарно: два notifier не возьмут один повтор дважды
+_REQUEUE_DUE_CHANGES_LUA = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('rpush', KEYS[2], unpack(due))
+    redis.call('zrem', KEYS[1], unpack(due))
+end
+return #due
+"""
+_requeue_due_changes = redis_client.register_script(_REQUEUE_DUE_CHANGES_LUA)
+
+
+async def push_changes_for_retry(payloads: List[str], delay: float):
+    """Откладывает сериализованные изменения расписания: в очередь они вернутся через delay секунд."""
+    if payloads:
+        due_at = time.time() + delay
+        await redis_client.zadd(SCHEDULE_CHANGES_RETRY_KEY, {payload: due_at for payload in payloads})
+
+
+async def requeue_due_changes(limit: int = 1000) -> int:
+    """Возвращает в очередь изменения, время повтора которых наступило. Возвращает их количество."""
+    return await _requeue_due_changes(
+        keys=[SCHEDULE_CHANGES_RETRY_KEY, SCHEDULE_CHANGES_QUEUE], args=[time.time(), limit]
+    )
+
+
 async def push_broadcast_to_queue(message: str, admin_id: int):
     """Добавляет задачу на широковещательную рассылку в очередь Redis."""
     task = {
@@ -60,7 +97,15 @@ async def push_reminders_to_queue(lessons: List[Lesson]):
 
 
 
-async def push_control_command(command: str):
-    """Добавляет управляющую команду в очередь."""
-    task = {"type": "control", "command": command}
-    await redis_client.rpush(CONTROL_QUEUE, json.dumps(task))
\ No newline at end of file
+async def push_control_command(command: str, params: Optional[dict] = None):
+    """Добавляет управляющую команду (с параметрами, если они нужны) в очередь."""
+    task = {"type": "control", "command": command, "params": params or {}}
+    await redis_client.rpush(CONTROL_QUEUE, json.dumps(task))
+
+
+async def publish_schedule_versions(versions: Dict[int, int]):
+    """Публикует новые версии расписания групп ({group_id: version}) одним сообщением."""
+    if versions:
+        await redis_client.publish(
+            SCHEDULE_UPDATES_CHANNEL, json.dumps({str(group_id): version for group_id, version in versions.items()})
+        )
@@ -0,0 +1,109 @@
+# app/core/resilience.py
+
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонен без обращения к сервису: автомат разомкнут."""
+
+
+class TokenBucket:
+    """
+    Асинхронный ограничитель частоты запросов "ведро токенов":
+    в среднем `rate` запросов в секунду, пачками не больше `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> float:
+        """Ждет свободный токен. Возвращает, сколько секунд пришлось ждать."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты: после `failure_threshold` ошибок подряд размыкается и
+    `recovery_timeout` секунд отклоняет запросы сразу. Затем пропускает один
+    пробный запрос (half-open): успех замыкает автомат, ошибка снова размыкает.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit '{self.name}' closed: service recovered.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """
+        Возвращает пробу, если пробный запрос оборвался без результата (отмена корутины,
+        непредвиденная ошибка): иначе автомат навсегда останется half-open и будет отклонять все.
+        """
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"Circuit '{self.name}' opened after {self.consecutive_failures} consecutive failures. "
+                    f"Failing fast for {self.recovery_timeout:.0f}s."
+                )
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером для попытки `attempt` (с нуля)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,179 @@
+# app/core/schedule_cache.py
+import json
+import logging
+import zlib
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.models.schedule import Auditory, Group, Lesson, Tutor
+
+logger = logging.getLogger(__name__)
+
+# Расписание группы на один день: zlib(JSON) со списком занятий вместе с преподавателем,
+# аудиторией и группой. Пустой день тоже кэшируется - пустым значением.
+SCHEDULE_DAY_KEY = "schedule_day:{group_id}:{date}"
+_SCHEDULE_DAY_PATTERN = "schedule_day:*"
+# Периоды длиннее читаются из БД напрямую: ключей было бы слишком много
+MAX_CACHED_PERIOD_DAYS = 31
+# Поколения кэша: группы (растет при каждой инвалидации ее дней) и всего кэша (invalidate_all).
+# Читатель запоминает их до чтения БД и кладет дни в кэш, только если поколения не сменились:
+# иначе расписание, прочитанное до коммита синхронизации, легло бы в кэш уже после ее инвалидации.
+GROUP_GENERATION_KEY = "schedule_day_gen:{group_id}"
+GLOBAL_GENERATION_KEY = "schedule_day_gen"
+
+# Значения бинарные (сжатые), поэтому отдельный клиент без decode_responses
+cache_client = redis.from_url(settings.REDIS_URL)
+
+# KEYS: поколение группы, общее поколение, ключи дней; ARGV: ожидаемые поколения, TTL, значения дней
+_STORE_DAYS_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] or (redis.call('GET', KEYS[2]) or '') ~= ARGV[2] then
+    return 0
+end
+for i = 3, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[i + 1], 'EX', ARGV[3])
+end
+return 1
+"""
+_store_days = cache_client.register_script(_STORE_DAYS_SCRIPT)
+
+# Поколение - пара (группы, общее); пустая строка - ключа поколения нет
+CacheGeneration = Tuple[str, str]
+
+
+def _day_key(group_id: int, day: date) -> str:
+    return SCHEDULE_DAY_KEY.format(group_id=group_id, date=day.isoformat())
+
+
+def _generation_key(group_id: int) -> str:
+    return GROUP_GENERATION_KEY.format(group_id=group_id)
+
+
+def _lesson_to_dict(lesson: Lesson) -> Dict[str, Any]:
+    return {
+        "source_id": lesson.source_id, "lesson_id": lesson.lesson_id, "date": lesson.date.isoformat(),
+        "time_slot": lesson.time_slot, "subgroup_name": lesson.subgroup_name,
+        "subject_name": lesson.subject_name, "lesson_type": lesson.lesson_type,
+        "group_id": lesson.group_id, "tutor_id": lesson.tutor_id, "auditory_id": lesson.auditory_id,
+        "group": {"id": lesson.group.id, "name": lesson.group.name},
+        "tutor": {"id": lesson.tutor.id, "name": lesson.tutor.name},
+        "auditory": {"id": lesson.auditory.id, "name": lesson.auditory.name, "building": lesson.auditory.building},
+    }
+
+
+def _shared(instances: Dict[int, Any], model, data: Dict[str, Any]):
+    instance = instances.get(data["id"])
+    if instance is None:
+        instance = instances[data["id"]] = model(**data)
+    return instance
+
+
+def _lessons_from_dicts(items: List[Dict[str, Any]]) -> List[Lesson]:
+    """
+    Восстанавливает занятия как несвязанные с сессией объекты Lesson, чтобы вызывающему
+    коду (схемы pydantic, бот) было все равно, пришли они из кэша или из БД. Один
+    преподаватель/аудитория - один объект, как в identity map сессии.
+    """
+    tutors: Dict[int, Tutor] = {}
+    auditories: Dict[int, Auditory] = {}
+    groups: Dict[int, Group] = {}
+    lessons = []
+    for item in items:
+        tutor = _shared(tutors, Tutor, item.pop("tutor"))
+        auditory = _shared(auditories, Auditory, item.pop("auditory"))
+        group = _shared(groups, Group, item.pop("group"))
+        item["date"] = date.fromisoformat(item["date"])
+        lessons.append(Lesson(**item, tutor=tutor, auditory=auditory, group=group))
+    return lessons
+
+
+def _encode(lessons: List[Lesson]) -> bytes:
+    if not lessons:
+        return b""
+    return zlib.compress(json.dumps([_lesson_to_dict(lesson) for lesson in lessons]).encode("utf-8"))
+
+
+def _decode(raw: bytes) -> List[Lesson]:
+    if not raw:
+        return []
+    return _lessons_from_dicts(json.loads(zlib.decompress(raw)))
+
+
+async def get_cached_days(group_id: int, days: List[date]) -> Dict[date, List[Lesson]]:
+    """Расписание группы по дням из кэша; дней, которых нет в кэше, в результате нет."""
+    if not settings.SCHEDULE_CACHE_ENABLED or not days:
+        return {}
+    try:
+        values = await cache_client.mget([_day_key(group_id, day) for day in days])
+    except redis.RedisError as e:
+        logger.warning(f"Schedule cache is unavailable, reading from DB: {e}")
+        return {}
+    return {day: _decode(raw) for day, raw in zip(days, values) if raw is not None}
+
+
+async def get_generation(group_id: int) -> Optional[CacheGeneration]:
+    """Текущее поколение кэша группы; читается до загрузки дней из БД (см. store_days). None - Redis недоступен."""
+    if not settings.SCHEDULE_CACHE_ENABLED:
+        return None
+    try:
+        group_gen, global_gen = await cache_client.mget([_generation_key(group_id), GLOBAL_GENERATION_KEY])
+    except redis.RedisError as e:
+        logger.warning(f"Schedule cache is unavailable, reading from DB: {e}")
+        return None
+    return (group_gen or b"").decode(), (global_gen or b"").decode()
+
+
+async def store_days(group_id: int, lessons_by_day: Dict[date, List[Lesson]], generation: Optional[CacheGeneration]):
+    """
+    Кладет дни, прочитанные из БД, в кэш, если с `generation` (get_generation до чтения)
+    дни группы не инвалидировались. Иначе они могли быть прочитаны до коммита синхронизации.
+    """
+    if not settings.SCHEDULE_CACHE_ENABLED or not lessons_by_day or generation is None:
+        return
+    keys = [_generation_key(group_id), GLOBAL_GENERATION_KEY]
+    args: List[Any] = [*generation, settings.SCHEDULE_CACHE_TTL_SECONDS]
+    for day, lessons in lessons_by_day.items():
+        keys.append(_day_key(group_id, day))
+        args.append(_encode(lessons))
+    try:
+        if not await _store_days(keys=keys, args=args):
+            logger.info(f"Schedule of group {group_id} changed while it was read, not caching it.")
+    except redis.RedisError as e:
+        logger.warning(f"Failed to store schedule of group {group_id} in cache: {e}")
+
+
+async def invalidate_group_days(group_days: Iterable[Tuple[int, date]]):
+    """Удаляет из кэша расписания указанных (группа, дата) - вызывается после записи синхронизации."""
+    group_days = set(group_days)
+    keys = [_day_key(group_id, day) for group_id, day in group_days]
+    if not keys:
+        return
+    try:
+        async with cache_client.pipeline(transaction=True) as pipe:
+            # Поколение поднимается вместе с удалением: читатель, начавший до коммита, не положит старые дни
+            for group_id in {group_id for group_id, _ in group_days}:
+                pipe.incr(_generation_key(group_id))
+                pipe.expire(_generation_key(group_id), 2 * settings.SCHEDULE_CACHE_TTL_SECONDS)
+            pipe.unlink(*keys)
+            await pipe.execute()
+    except redis.RedisError as e:
+        # Устаревшее расписание проживет не дольше SCHEDULE_CACHE_TTL_SECONDS
+        logger.warning(f"Failed to invalidate {len(keys)} cached schedule days: {e}")
+
+
+async def invalidate_all():
+    """Сбрасывает весь кэш расписаний, например после изменения имен в справочниках."""
+    try:
+        await cache_client.incr(GLOBAL_GENERATION_KEY)
+        batch = []
+        async for key in cache_client.scan_iter(match=_SCHEDULE_DAY_PATTERN, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                await cache_client.unlink(*batch)
+                batch = []
+        if batch:
+            await cache_client.unlink(*batch)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to flush schedule cache: {e}")
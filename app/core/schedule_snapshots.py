@@ -0,0 +1,120 @@
+# app/core/schedule_snapshots.py
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.schedule_cache import cache_client
+
+logger = logging.getLogger(__name__)
+
+# Снимок расписания группы на ближайшие недели - hash с полями:
+#   version, start, end - версия расписания группы (Group.schedule_version) и диапазон дней;
+#   day:{date} - JSON-массив занятий дня в формате ответа API (schemas.schedule.Lesson);
+#   etag:{date} - хэш day:{date}.
+# Снимок неизменяем: новая версия заменяет hash целиком одной Lua-командой.
+SNAPSHOT_KEY = "schedule_snapshot:{group_id}"
+_SNAPSHOT_PATTERN = "schedule_snapshot:*"
+
+# Запись пропускается, если в Redis уже лежит снимок более новой версии: сборка,
+# прочитавшая БД до коммита синхронизации, не должна затереть свежий снимок.
+# Снимок той же версии заменяется (сдвиг диапазона, переименования в справочниках).
+_WRITE_SNAPSHOT_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'version')
+if current and tonumber(current) > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'version', ARGV[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+_write_snapshot = cache_client.register_script(_WRITE_SNAPSHOT_SCRIPT)
+
+
+@dataclass(frozen=True)
+class SnapshotDay:
+    etag: str
+    lessons: bytes  # JSON-массив занятий, готовый для тела ответа
+
+
+@dataclass
+class GroupSnapshot:
+    group_id: int
+    version: Optional[int]  # None - собран из БД на лету, не из снимка
+    start: date
+    end: date
+    days: Dict[date, SnapshotDay]
+
+    def slice(self, days: List[date]) -> "GroupSnapshot":
+        return GroupSnapshot(self.group_id, self.version, self.start, self.end, {day: self.days[day] for day in days})
+
+
+def _snapshot_key(group_id: int) -> str:
+    return SNAPSHOT_KEY.format(group_id=group_id)
+
+
+async def write_snapshot(snapshot: GroupSnapshot) -> bool:
+    """
+    Сохраняет снимок. False - в Redis уже есть снимок новее, этот устарел.
+    Ошибки Redis только логируются (True): снимок собран из БД и годится для ответа.
+    """
+    fields: List[object] = ["start", snapshot.start.isoformat(), "end", snapshot.end.isoformat()]
+    for day, snapshot_day in snapshot.days.items():
+        fields += [f"etag:{day.isoformat()}", snapshot_day.etag, f"day:{day.isoformat()}", snapshot_day.lessons]
+    try:
+        return bool(await _write_snapshot(
+            keys=[_snapshot_key(snapshot.group_id)],
+            args=[snapshot.version, settings.SCHEDULE_SNAPSHOT_TTL_SECONDS, *fields],
+        ))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to store schedule snapshot of group {snapshot.group_id}: {e}")
+        return True
+
+
+async def read_snapshot_days(group_id: int, days: List[date]) -> Optional[GroupSnapshot]:
+    """
+    Дни из снимка группы. None - снимка нет, Redis недоступен или хотя бы
+    один из дней не входит в диапазон снимка.
+    """
+    if not settings.SCHEDULE_SNAPSHOT_ENABLED or not days:
+        return None
+    fields = ["version", "start", "end"]
+    for day in days:
+        fields += [f"etag:{day.isoformat()}", f"day:{day.isoformat()}"]
+    try:
+        values = await cache_client.hmget(_snapshot_key(group_id), fields)
+    except redis.RedisError as e:
+        logger.warning(f"Schedule snapshots are unavailable: {e}")
+        return None
+
+    version, start, end = values[:3]
+    if version is None:
+        return None
+    snapshot_days = {}
+    for i, day in enumerate(days):
+        etag, lessons = values[3 + 2 * i], values[4 + 2 * i]
+        if etag is None or lessons is None:
+            return None
+        snapshot_days[day] = SnapshotDay(etag=etag.decode(), lessons=lessons)
+    return GroupSnapshot(
+        group_id, int(version), date.fromisoformat(start.decode()), date.fromisoformat(end.decode()), snapshot_days
+    )
+
+
+async def delete_all_snapshots():
+    """Удаляет все снимки (они пересоберутся по запросу), например после изменения справочников."""
+    try:
+        batch = []
+        async for key in cache_client.scan_iter(match=_SNAPSHOT_PATTERN, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                await cache_client.unlink(*batch)
+                batch = []
+        if batch:
+            await cache_client.unlink(*batch)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to delete schedule snapshots: {e}")
@@ -13,6 +13,9 @@ from pydantic import BaseModel, Field
 
 from app.core.config import settings
 
+# Токен с этим scope подходит только для потока событий расписания, но не для остального API
+STREAM_TOKEN_SCOPE = "schedule_events"
+
 class InitDataUser(BaseModel):
     id: int
     first_name: str
@@ -36,6 +39,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_stream_token(telegram_id: int) -> str:
+    """Короткоживущий токен только для SSE /schedule/my/events: его можно передать в URL."""
+    return create_access_token(
+        data={"sub": str(telegram_id), "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=settings.SCHEDULE_EVENTS_TOKEN_EXPIRE_SECONDS),
+    )
+
 def validate_init_data(init_data: str, bot_token: str, expiration_hours: int = 1) -> Optional[Dict]:
     try:
         parsed_data = dict(parse_qsl(init_data))
@@ -72,11 +82,12 @@ def validate_init_data(init_data: str, bot_token: str, expiration_hours: int = 1
 
     return parsed_data
 
-def decode_access_token(token: str) -> TokenData:
+def decode_access_token(token: str, scope: Optional[str] = None) -> TokenData:
+    """Проверяет JWT. scope - ожидаемая область токена; токены доступа к API без области."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         telegram_id: str = payload.get("sub")
-        if telegram_id is None:
+        if telegram_id is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Could not validate credentials")
         token_data = TokenData(telegram_id=telegram_id)
     except JWTError:
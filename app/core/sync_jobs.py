@@ -0,0 +1,78 @@
+# app/core/sync_jobs.py
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.queue import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Разовые синхронизации, запущенные из админки: прогресс каждой - hash в Redis
+SYNC_JOB_KEY = "sync_job:{job_id}"
+SYNC_JOBS_KEY = "sync_jobs"  # ID последних задач, новые в начале
+MAX_LISTED_JOBS = 200
+# Поля hash, которые хранятся как JSON
+_JSON_FIELDS = ("params", "failed_group_ids")
+
+
+async def create_sync_job(command: str, params: Dict[str, Any]) -> str:
+    """Регистрирует задачу в статусе queued и возвращает ее ID."""
+    job_id = uuid.uuid4().hex[:12]
+    key = SYNC_JOB_KEY.format(job_id=job_id)
+    async with redis_client.pipeline() as pipe:
+        pipe.hset(key, mapping={
+            "job_id": job_id, "command": command, "status": "queued",
+            "params": json.dumps(params, default=str),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        pipe.expire(key, settings.SYNC_JOB_TTL_SECONDS)
+        pipe.lpush(SYNC_JOBS_KEY, job_id)
+        pipe.ltrim(SYNC_JOBS_KEY, 0, MAX_LISTED_JOBS - 1)
+        await pipe.execute()
+    return job_id
+
+
+async def update_sync_job(job_id: str, **fields: Any):
+    """Обновляет поля задачи. Ошибки Redis только логируются: прогресс не должен ломать синхронизацию."""
+    mapping = {
+        name: json.dumps(value, default=str) if name in _JSON_FIELDS else str(value)
+        for name, value in fields.items() if value is not None
+    }
+    if not mapping:
+        return
+    key = SYNC_JOB_KEY.format(job_id=job_id)
+    try:
+        async with redis_client.pipeline() as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, settings.SYNC_JOB_TTL_SECONDS)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to update sync job {job_id}: {e}")
+
+
+def _decode_job(raw: Dict[str, str]) -> Dict[str, Any]:
+    job: Dict[str, Any] = dict(raw)
+    for name in _JSON_FIELDS:
+        if name in job:
+            job[name] = json.loads(job[name])
+    return job
+
+
+async def read_sync_job(job_id: str) -> Optional[Dict[str, Any]]:
+    raw = await redis_client.hgetall(SYNC_JOB_KEY.format(job_id=job_id))
+    return _decode_job(raw) if raw else None
+
+
+async def list_sync_jobs(limit: int = 20) -> List[Dict[str, Any]]:
+    """Последние задачи, новые первыми. Задачи с истекшим TTL пропускаются."""
+    job_ids = await redis_client.lrange(SYNC_JOBS_KEY, 0, limit - 1)
+    async with redis_client.pipeline() as pipe:
+        for job_id in job_ids:
+            pipe.hgetall(SYNC_JOB_KEY.format(job_id=job_id))
+        results = await pipe.execute()
+    return [_decode_job(raw) for raw in results if raw]
@@ -0,0 +1,48 @@
+# app/crud/crud_change_log.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.change_log import ScheduleChangeLog
+
+
+async def add_change_log_entries(db: AsyncSession, *, entries: List[Dict[str, Any]]):
+    """
+    Добавляет строки журнала (group_id, version, source_id, change_type) одним
+    запросом, без коммита: вызывается в транзакции записи занятий.
+    """
+    if not entries:
+        return
+    await db.execute(insert(ScheduleChangeLog), entries)
+
+
+async def get_change_log_since(
+    db: AsyncSession, *, group_id: int, since_version: int, until_version: int
+) -> list[tuple[int, str]]:
+    """(source_id, change_type) группы с версий (since_version; until_version] в порядке записи."""
+    stmt = (
+        select(ScheduleChangeLog.source_id, ScheduleChangeLog.change_type)
+        .where(
+            ScheduleChangeLog.group_id == group_id,
+            ScheduleChangeLog.version > since_version,
+            ScheduleChangeLog.version <= until_version,
+        )
+        .order_by(ScheduleChangeLog.version, ScheduleChangeLog.id)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def get_min_logged_version(db: AsyncSession, *, group_id: int) -> Optional[int]:
+    """Самая старая версия группы, которая еще есть в журнале; None - журнал группы пуст."""
+    result = await db.execute(
+        select(func.min(ScheduleChangeLog.version)).where(ScheduleChangeLog.group_id == group_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def delete_change_log_before(db: AsyncSession, *, before: datetime) -> int:
+    result = await db.execute(delete(ScheduleChangeLog).where(ScheduleChangeLog.created_at < before))
+    return result.rowcount
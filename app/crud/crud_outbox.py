@@ -0,0 +1,42 @@
+# app/crud/crud_outbox.py
+from typing import List
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.outbox import ScheduleChangeOutbox
+from app.schemas.notifications import ScheduleChange
+
+
+async def add_schedule_changes(db: AsyncSession, *, changes: List[ScheduleChange]):
+    """
+    Добавляет изменения в outbox одним запросом, без коммита: вызывается в транзакции
+    записи занятий. Изменение с уже ожидающим отправки ключом не дублируется.
+    """
+    if not changes:
+        return
+    stmt = insert(ScheduleChangeOutbox).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    await db.execute(stmt, [
+        {"idempotency_key": change.idempotency_key, "group_id": change.group_id, "payload": change.model_dump_json()}
+        for change in changes
+    ])
+
+
+async def lock_outbox_batch(db: AsyncSession, *, limit: int) -> list[tuple[int, str]]:
+    """
+    Забирает и блокирует до `limit` самых старых записей (id, payload). SKIP LOCKED
+    позволяет нескольким ретрансляторам работать параллельно, не мешая друг другу.
+    """
+    stmt = (
+        select(ScheduleChangeOutbox.id, ScheduleChangeOutbox.payload)
+        .order_by(ScheduleChangeOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def delete_outbox_rows(db: AsyncSession, *, ids: List[int]):
+    await db.execute(delete(ScheduleChangeOutbox).where(ScheduleChangeOutbox.id.in_(ids)))
@@ -6,11 +6,20 @@ from sqlalchemy.orm import selectinload
 from datetime import date, timedelta
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.schedule import Group, Lesson, Tutor
-from sqlalchemy import distinct
+from app.models.schedule import Auditory, Group, Lesson, Tutor
+from sqlalchemy import distinct, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from app.models.user import User
+from app.core import schedule_cache
 from datetime import datetime, timedelta
 
+# TODO: В идеале, время начала пар (08:45, 10:30) должно храниться в БД или конфиге.
+# Пока захардкодим их здесь.
+LESSON_START_TIMES = {
+    1: "08:45", 2: "10:30", 3: "12:45", 4: "14:30",
+    5: "16:15", 6: "18:00", 7: "19:45", 8: "21:30"
+}
+
 
 async def get_all_groups_ids(db: AsyncSession) -> list[int]:
     """Возвравращает список ID всех групп из БД."""
@@ -18,51 +27,108 @@ async def get_all_groups_ids(db: AsyncSession) -> list[int]:
     return result.scalars().all()
 
 
+async def get_existing_group_ids(db: AsyncSession, *, group_ids: list[int]) -> list[int]:
+    """Оставляет из group_ids только группы, которые есть в БД."""
+    result = await db.execute(select(Group.id).where(Group.id.in_(group_ids)))
+    return result.scalars().all()
+
+
+async def get_group_ids_for_tutors(db: AsyncSession, *, tutor_ids: list[int], from_date: date) -> list[int]:
+    """Группы, у которых начиная с from_date есть занятия у преподавателей tutor_ids."""
+    stmt = (
+        select(distinct(Lesson.group_id))
+        .where(Lesson.tutor_id.in_(tutor_ids), Lesson.date >= from_date)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+
 async def get_schedule_for_group_by_date(
     db: AsyncSession, *, group_id: int, target_date: date
 ) -> list[Lesson]:
     """
     Получает расписание для группы на конкретную дату.
-    Использует жадную загрузку для связанных данных.
+    Читает через кэш Redis (см. get_schedule_for_group_for_period).
     """
+    return await get_schedule_for_group_for_period(
+        db, group_id=group_id, start_date=target_date, end_date=target_date
+    )
+
+
+async def _load_schedule_for_group_for_period(
+    db: AsyncSession, *, group_id: int, start_date: date, end_date: date
+) -> list[Lesson]:
+    """Получает расписание для группы за период из БД с жадной загрузкой."""
     stmt = (
         select(Lesson)
-        .where(Lesson.group_id == group_id, Lesson.date == target_date)
+        .where(
+            Lesson.group_id == group_id,
+            Lesson.date >= start_date,
+            Lesson.date <= end_date
+        )
         .options(
-            # Добавляем жадную загрузку ВСЕХ необходимых полей
-            selectinload(Lesson.group),
-            selectinload(Lesson.tutor), 
+            selectinload(Lesson.group), # <-- Проверяем наличие
+            selectinload(Lesson.tutor),
             selectinload(Lesson.auditory)
         )
-        .order_by(Lesson.time_slot)
+        .order_by(Lesson.date, Lesson.time_slot)
     )
     result = await db.execute(stmt)
     return result.scalars().all()
 
-# --- Убедимся, что и другие функции исправлены ---
+
 async def get_schedule_for_group_for_period(
     db: AsyncSession, *, group_id: int, start_date: date, end_date: date
 ) -> list[Lesson]:
-    """Получает расписание для группы за период с жадной загрузкой."""
+    """
+    Получает расписание для группы за период. Дни берутся из кэша Redis, а
+    недостающие читаются из БД одним запросом и кладутся в кэш. Занятия из кэша -
+    объекты Lesson вне сессии, с уже заполненными group, tutor и auditory.
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    if not days or len(days) > schedule_cache.MAX_CACHED_PERIOD_DAYS:
+        return await _load_schedule_for_group_for_period(
+            db, group_id=group_id, start_date=start_date, end_date=end_date
+        )
+
+    lessons_by_day = await schedule_cache.get_cached_days(group_id, days)
+    missing_days = [day for day in days if day not in lessons_by_day]
+    if missing_days:
+        # Поколение читается до БД: если синхронизация закоммитит группу раньше записи в кэш, записи не будет
+        generation = await schedule_cache.get_generation(group_id)
+        loaded = {day: [] for day in missing_days}
+        for lesson in await _load_schedule_for_group_for_period(
+            db, group_id=group_id, start_date=missing_days[0], end_date=missing_days[-1]
+        ):
+            if lesson.date in loaded:
+                loaded[lesson.date].append(lesson)
+        await schedule_cache.store_days(group_id, loaded, generation)
+        lessons_by_day.update(loaded)
+    return [lesson for day in days for lesson in sorted(lessons_by_day[day], key=lambda l: l.time_slot)]
+
+
+async def get_schedule_for_groups_for_period(
+    db: AsyncSession, *, group_ids: list[int], start_date: date, end_date: date
+) -> list[Lesson]:
+    """Расписание нескольких групп за период из БД (без кэша) - для сборки снимков."""
     stmt = (
         select(Lesson)
         .where(
-            Lesson.group_id == group_id,
+            Lesson.group_id.in_(group_ids),
             Lesson.date >= start_date,
             Lesson.date <= end_date
         )
         .options(
-            selectinload(Lesson.group), # <-- Проверяем наличие
+            selectinload(Lesson.group),
             selectinload(Lesson.tutor),
             selectinload(Lesson.auditory)
         )
-        .order_by(Lesson.date, Lesson.time_slot)
+        .order_by(Lesson.group_id, Lesson.date, Lesson.time_slot)
     )
     result = await db.execute(stmt)
     return result.scalars().all()
 
 
-
 async def get_schedule_for_group_for_week(
     db: AsyncSession, *, group_id: int, target_date: date
 ) -> list[Lesson]:
@@ -148,6 +214,82 @@ async def get_lessons_for_group(db: AsyncSession, *, group_id: int) -> List[Less
     return result.scalars().all()
 
 
+# Колонки выборки для diff синхронизации; порядок совпадает с DB_ROW_FIELDS в schedule_diff
+_LESSON_DIFF_COLUMNS = (
+    Lesson.source_id, Lesson.content_hash, Lesson.date, Lesson.time_slot, Lesson.subject_name,
+    Lesson.lesson_type, Lesson.subgroup_name, Lesson.tutor_id, Lesson.auditory_id, Lesson.lesson_id,
+)
+
+
+async def get_lesson_diff_rows_for_groups(
+    db: AsyncSession, *, group_ids: list[int], from_date: Optional[date] = None, to_date: Optional[date] = None
+) -> dict[int, dict[int, tuple]]:
+    """
+    Легкая выборка для сравнения расписания при синхронизации одним запросом
+    (group_id = ANY(...)) для целой пачки групп: кортежи (source_id, content_hash, date,
+    time_slot, subject_name, lesson_type, subgroup_name, tutor_id, auditory_id, lesson_id)
+    без создания ORM-объектов Lesson. Границы from_date/to_date включительные.
+    Возвращает group_id -> {source_id -> кортеж}.
+    """
+    stmt = select(Lesson.group_id, *_LESSON_DIFF_COLUMNS).where(
+        Lesson.group_id == any_(bindparam("group_ids", group_ids, type_=ARRAY(Integer)))
+    )
+    if from_date is not None:
+        stmt = stmt.where(Lesson.date >= from_date)
+    if to_date is not None:
+        stmt = stmt.where(Lesson.date <= to_date)
+    result = await db.execute(stmt)
+    state: dict[int, dict[int, tuple]] = {group_id: {} for group_id in group_ids}
+    for group_id, *row in result:
+        state[group_id][row[0]] = tuple(row)
+    return state
+
+
+async def get_tutor_and_auditory_names(
+    db: AsyncSession, *, tutor_ids: set[int], auditory_ids: set[int]
+) -> tuple[dict[int, str], dict[int, str]]:
+    """Имена преподавателей и аудиторий по ID - для текста уведомлений об изменениях."""
+    tutor_names: dict[int, str] = {}
+    auditory_names: dict[int, str] = {}
+    if tutor_ids:
+        result = await db.execute(select(Tutor.id, Tutor.name).where(Tutor.id.in_(tutor_ids)))
+        tutor_names = {tutor_id: name for tutor_id, name in result}
+    if auditory_ids:
+        result = await db.execute(select(Auditory.id, Auditory.name).where(Auditory.id.in_(auditory_ids)))
+        auditory_names = {auditory_id: name for auditory_id, name in result}
+    return tutor_names, auditory_names
+
+
+async def get_group_schedule_fingerprints(db: AsyncSession, *, group_ids: list[int]) -> dict[int, Optional[str]]:
+    """
+    Возвращает отпечатки последних примененных ответов API для списка групп.
+    """
+    stmt = select(Group.id, Group.schedule_fingerprint).where(Group.id.in_(group_ids))
+    result = await db.execute(stmt)
+    return {group_id: fingerprint for group_id, fingerprint in result}
+
+
+async def get_group_schedule_versions(db: AsyncSession, *, group_ids: list[int]) -> dict[int, int]:
+    """Текущие версии расписания групп (Group.schedule_version); несуществующих групп в ответе нет."""
+    stmt = select(Group.id, Group.schedule_version).where(Group.id.in_(group_ids))
+    result = await db.execute(stmt)
+    return {group_id: version for group_id, version in result}
+
+
+async def get_lessons_by_source_ids(db: AsyncSession, *, source_ids: list[int]) -> list[Lesson]:
+    """Занятия по source_id с группой, преподавателем и аудиторией; удаленных в ответе нет."""
+    stmt = (
+        select(Lesson)
+        .where(Lesson.source_id.in_(source_ids))
+        .options(
+            selectinload(Lesson.group),
+            selectinload(Lesson.tutor),
+            selectinload(Lesson.auditory)
+        )
+        .order_by(Lesson.date, Lesson.time_slot)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
 
 
 async def get_lesson_by_source_id(db: AsyncSession, *, source_id: int) -> Optional[Lesson]:
@@ -228,25 +370,66 @@ async def get_active_user_group_ids(db: AsyncSession) -> list[int]:
     result = await db.execute(stmt)
     return result.scalars().all()
 
+async def get_active_user_counts_by_group(
+    db: AsyncSession, *, active_since: Optional[datetime] = None
+) -> dict[int, int]:
+    """
+    Возвращает количество активных (не заблокированных) пользователей по группам.
+    Если задан active_since, учитываются только пользователи, заходившие после него.
+    """
+    stmt = (
+        select(User.group_id, func.count())
+        .where(User.group_id != None, User.is_blocked == False)
+        .group_by(User.group_id)
+    )
+    if active_since is not None:
+        stmt = stmt.where(User.last_active_at >= active_since)
+    result = await db.execute(stmt)
+    return {group_id: count for group_id, count in result}
+
+
+async def get_group_last_activity(db: AsyncSession, *, active_since: datetime) -> dict[int, datetime]:
+    """
+    Для групп, в которых кто-то заходил после active_since, возвращает
+    время последнего захода: group_id -> max(last_active_at).
+    """
+    stmt = (
+        select(User.group_id, func.max(User.last_active_at))
+        .where(User.group_id != None, User.is_blocked == False, User.last_active_at >= active_since)
+        .group_by(User.group_id)
+    )
+    result = await db.execute(stmt)
+    return {group_id: last_active_at for group_id, last_active_at in result}
+
+
+async def get_next_lesson_slots(db: AsyncSession, *, from_date: date, to_date: date) -> dict[int, tuple[date, int]]:
+    """
+    Для каждой группы находит ближайшее занятие в диапазоне дат: group_id -> (дата, номер пары).
+    """
+    stmt = (
+        select(Lesson.group_id, Lesson.date, func.min(Lesson.time_slot))
+        .where(Lesson.date >= from_date, Lesson.date <= to_date)
+        .group_by(Lesson.group_id, Lesson.date)
+        .order_by(Lesson.date)
+    )
+    result = await db.execute(stmt)
+    next_slots: dict[int, tuple[date, int]] = {}
+    for group_id, lesson_date, time_slot in result:
+        next_slots.setdefault(group_id, (lesson_date, time_slot))
+    return next_slots
+
 async def get_lessons_starting_soon(db: AsyncSession, interval_minutes: int) -> list[Lesson]:
     """
     Находит все занятия, которые начнутся в заданном временном интервале от текущего момента.
     Например, interval_minutes=30 найдет занятия, начинающиеся через 29-30 минут.
     """
-    # TODO: В идеале, время начала пар (08:45, 10:30) должно храниться в БД или конфиге.
-    # Пока захардкодим их здесь.
-    lesson_start_times = {
-        1: "08:45", 2: "10:30", 3: "12:45", 4: "14:30",
-        5: "16:15", 6: "18:00", 7: "19:45", 8: "21:30"
-    }
-
     now = datetime.now()
     # Ищем занятия, которые начнутся через `interval_minutes`
     target_time = now + timedelta(minutes=interval_minutes)
     
     # Находим, какой номер пары соответствует этому времени
     target_slot = 0
-    for slot, time_str in lesson_start_times.items():
+    for slot, time_str in LESSON_START_TIMES.items():
         h, m = map(int, time_str.split(':'))
         if target_time.hour == h and target_time.minute == m:
             target_slot = slot
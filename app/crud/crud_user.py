@@ -1,11 +1,12 @@
 # app/crud/crud_user.py
 from typing import Optional
-from sqlalchemy import String, func, select, or_
+from sqlalchemy import String, func, select, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from app.schemas.user import UserCreate
 from sqlalchemy import func
 from sqlalchemy.sql.expression import cast
+from datetime import datetime
 
 async def get_user_by_telegram_id(db: AsyncSession, *, telegram_id: int) -> User | None:
     """
@@ -91,4 +92,20 @@ async def set_user_group(db: AsyncSession, user_id: int, group_id: int) -> Optio
         user.group_id = group_id
         await db.commit()
         await db.refresh(user)
-    return user
\ No newline at end of file
+    return user
+
+
+async def touch_users_last_active(db: AsyncSession, *, telegram_ids: list[int], active_at: datetime) -> list[int]:
+    """
+    Одним запросом обновляет last_active_at у незаблокированных пользователей.
+    Возвращает ID групп обновленных пользователей (без коммита).
+    """
+    stmt = (
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids), User.is_blocked == False)
+        .values(last_active_at=active_at)
+        .returning(User.group_id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    return [group_id for group_id in result.scalars().all() if group_id is not None]
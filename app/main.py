@@ -12,6 +12,8 @@ from app.api.v1.api import api_router
 # Импортируем компоненты системы, необходимые для API
 from app.core.omsu_api import api_client
 from app.core.config import settings
+from app.services.user_activity import user_activity
+from app.services.schedule_events import schedule_event_hub
 
 # Импортируем компоненты бота, необходимые для API
 from app.bot.bot import bot, dp, setup_bot_commands
@@ -33,6 +35,8 @@ async def lifespan(app: FastAPI):
     
     # --- ДЕЙСТВИЯ ПРИ СТАРТЕ ---
     logger.info("API process starting up...")
+    user_activity.start()
+    schedule_event_hub.start()
 
     # Удаляем старый вебхук (на случай, если он был) и устанавливаем команды
     # await bot.delete_webhook(drop_pending_updates=True)
@@ -58,6 +62,10 @@ async def lifespan(app: FastAPI):
     #     except asyncio.CancelledError:
     #         logger.info("Polling task has been successfully cancelled.")
     
+    await schedule_event_hub.stop()
+    # Дописываем накопленную активность пользователей
+    await user_activity.stop()
+
     # Закрываем сессии, используемые в API
     await bot.session.close()
     await api_client.close()
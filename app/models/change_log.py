@@ -0,0 +1,23 @@
+# app/models/change_log.py
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ScheduleChangeLog(Base):
+    """
+    Журнал записей занятий по версиям расписания группы (Group.schedule_version):
+    каждая запись синхронизации, поднявшая версию, оставляет здесь строку на каждое
+    записанное или удаленное занятие. По нему API отдает изменения с версии клиента.
+    Старые строки удаляет задача очистки (SCHEDULE_CHANGE_LOG_RETENTION_DAYS).
+    """
+    __tablename__ = "schedule_change_log"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    group_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False)
+    source_id = Column(BigInteger, nullable=False)
+    change_type = Column(String(10), nullable=False)  # "NEW", "UPDATED", "CANCELLED"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (Index("ix_schedule_change_log_group_id_version", "group_id", "version"),)
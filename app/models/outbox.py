@@ -0,0 +1,19 @@
+# app/models/outbox.py
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ScheduleChangeOutbox(Base):
+    """
+    Изменения расписания, ожидающие отправки в Redis. Пишутся в той же транзакции,
+    что и занятия, и удаляются ретранслятором (app/services/outbox_relay.py) после отправки.
+    """
+    __tablename__ = "schedule_change_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # Детерминированный ключ изменения: по нему notifier отбрасывает повторные доставки
+    idempotency_key = Column(String(32), nullable=False, unique=True)
+    group_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # ScheduleChange в JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -11,6 +11,15 @@ class Group(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     real_group_id = Column(Integer, nullable=True)
 
+    # Отпечаток последнего применённого ответа /schedule/group/{id} и время синхронизации.
+    # schedule_synced_at - когда ответ был полностью записан в lessons,
+    # schedule_checked_at - когда API в последний раз вернул тот же ответ.
+    schedule_fingerprint = Column(String(64), nullable=True)
+    schedule_synced_at = Column(DateTime(timezone=True), nullable=True)
+    schedule_checked_at = Column(DateTime(timezone=True), nullable=True)
+    # Растет на 1 при каждой записи, изменившей занятия группы; им помечаются снимки расписания
+    schedule_version = Column(BigInteger, nullable=False, server_default="0")
+
 class Tutor(Base):
     __tablename__ = "tutors"
     id = Column(Integer, primary_key=True, index=True, autoincrement=False)
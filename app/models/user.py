@@ -1,5 +1,5 @@
 # app/models/user.py
-from sqlalchemy import Boolean, Column, BigInteger, String, Integer, JSON
+from sqlalchemy import Boolean, Column, BigInteger, String, Integer, JSON, DateTime
 from app.db.base import Base
 
 class User(Base):
@@ -17,3 +17,5 @@ class User(Base):
             '{"notifications_enabled": true, "reminders_enabled": true, "reminder_time": 15, "preferred_tutors": {}}'
         )
     is_blocked = Column(Boolean, server_default="false", nullable=False)
+    # Время последнего обращения к боту или Mini App; обновляется пачками (см. app/services/user_activity.py)
+    last_active_at = Column(DateTime(timezone=True), nullable=True, index=True)
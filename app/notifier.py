@@ -3,7 +3,7 @@
 import asyncio
 import json
 import logging
-from typing import Dict
+from typing import Dict, Optional
 
 import redis.asyncio as redis
 from aiogram import Bot
@@ -12,6 +12,8 @@ from app.core.config import settings
 from app.core.config import settings
 from app.db.session import AsyncSessionLocal
 from app.crud.crud_user import get_users_by_group_id, get_all_active_users
+from app.crud.crud_schedule import get_tutor_and_auditory_names
+from app.bot.notifier import changed_name_ids, format_grouped_changes
 from app.schemas.notifications import ScheduleChange
 
 # Настройка логирования
@@ -25,49 +27,30 @@ BROADCAST_QUEUE = "broadcast_queue"
 
 # --- Функции-помощники ---
 
-def format_change_message(change: ScheduleChange) -> str:
-    """Форматирует красивое и информативное сообщение для пользователя."""
-    if change.change_type == "NEW":
-        l = change.lesson_after
-        return f"✅ **Новое занятие**\n\n**Дата:** {l.date}\n**Пара:** {l.time_slot}\n**Предмет:** {l.subject_name}"
-    
-    if change.change_type == "CANCELLED":
-        l = change.lesson_before
-        return f"❌ **Отмена занятия**\n\n**Дата:** {l.date}\n**Пара:** {l.time_slot}\n**Предмет:** {l.subject_name}"
-        
-    if change.change_type == "UPDATED":
-        b = change.lesson_before
-        a = change.lesson_after
-        # Собираем строку с изменениями, показывая только то, что изменилось
-        details = []
-        if b.subject_name != a.subject_name:
-            details.append(f"Предмет: ~{b.subject_name}~ -> **{a.subject_name}**")
-        if b.date != a.date:
-            details.append(f"Дата: ~{b.date}~ -> **{a.date}**")
-        if b.time_slot != a.time_slot:
-            details.append(f"Пара: ~{b.time_slot}~ -> **{a.time_slot}**")
-        
-        details_str = "\n".join(details)
-        if not details_str: # Если изменилось что-то неочевидное (аудитория, преподаватель), но в LessonInfo этого нет
-            details_str = f"Обновлена информация о занятии '{a.subject_name}'"
-
-        return f"✏️ **Изменение в расписании**\n\n{details_str}"
-        
-    return "В вашем расписании произошли изменения. Пожалуйста, проверьте."
+def format_change_message(
+    change: ScheduleChange,
+    tutor_names: Optional[Dict[int, str]] = None,
+    auditory_names: Optional[Dict[int, str]] = None,
+) -> str:
+    """Сообщение об одном изменении - в том же виде, что и рассылка бота (app.bot.notifier)."""
+    return format_grouped_changes([change], tutor_names, auditory_names)
 
 # --- Обработчики задач из очереди ---
 
 async def handle_schedule_change(bot: Bot, change: ScheduleChange):
     """Обрабатывает задачу на уведомление об изменении в расписании."""
-    message = format_change_message(change)
-    
+    tutor_ids, auditory_ids = changed_name_ids([change])
     async with AsyncSessionLocal() as session:
+        tutor_names, auditory_names = await get_tutor_and_auditory_names(
+            session, tutor_ids=tutor_ids, auditory_ids=auditory_ids
+        )
         users_to_notify = await get_users_by_group_id(session, group_id=change.group_id)
 
     if not users_to_notify:
         logger.info(f"No users found for group {change.group_id} to notify.")
         return
 
+    message = format_change_message(change, tutor_names, auditory_names)
     logger.info(f"Notifying {len(users_to_notify)} users in group {change.group_id} about a schedule change.")
     for user in users_to_notify:
         if user.settings and user.settings.get("notifications_enabled", False):
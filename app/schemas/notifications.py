@@ -1,16 +1,28 @@
 # app/schemas/notifications.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class LessonInfo(BaseModel):
     source_id: int # <-- Добавьте это поле
     date: str
     time_slot: int
     subject_name: str
+    lesson_type: Optional[str] = None
+    subgroup_name: Optional[str] = None
+    tutor_id: Optional[int] = None
+    auditory_id: Optional[int] = None
 
 class ScheduleChange(BaseModel):
     """Модель одного изменения в расписании."""
     change_type: str  # "NEW", "UPDATED", "CANCELLED"
     group_id: int
     lesson_before: Optional[LessonInfo] = None # Старое состояние (для UPDATED и CANCELLED)
-    lesson_after: Optional[LessonInfo] = None  # Новое состояние (для NEW и UPDATED)pip
\ No newline at end of file
+    lesson_after: Optional[LessonInfo] = None  # Новое состояние (для NEW и UPDATED)pip
+    # Одинаков для одного и того же изменения при повторном diff - для отбрасывания дублей
+    idempotency_key: Optional[str] = None
+    # Версия расписания группы (Group.schedule_version), в которой произошло изменение
+    schedule_version: Optional[int] = None
+    # Сколько раз рассылка этого изменения уже срывалась (см. NOTIFY_RETRY_MAX_ATTEMPTS)
+    delivery_attempts: int = 0
+    # Для UPDATED: какие значимые поля занятия изменились (date, time_slot, tutor_id, ...)
+    changed_fields: List[str] = []
@@ -41,6 +41,19 @@ class DaySchedule(BaseModel):
     date: date
     lessons: List[Lesson]
 
+# Одно изменение занятия для /schedule/my/changes: lesson - текущее состояние (None для CANCELLED)
+class LessonChange(BaseModel):
+    source_id: int
+    change_type: str  # "NEW", "UPDATED", "CANCELLED"
+    lesson: Optional[Lesson] = None
+
+# Изменения расписания группы после версии клиента
+class ScheduleChanges(BaseModel):
+    group_id: int
+    version: int  # Ее клиент передает в since в следующий раз
+    full_refresh: bool = False  # Дельты нет - нужно перезагрузить расписание целиком
+    changes: List[LessonChange] = []
+
 # Схема для элемента в списке элективов
 class ElectiveChoice(BaseModel):
     subject_name: str
@@ -0,0 +1,26 @@
+# app/services/lesson_hashing.py
+
+import hashlib
+from typing import Any, Dict
+
+# Версия алгоритма хранится в самом content_hash ("v2:<hex>"). Строки со старым
+# форматом (голый SHA-256 от JSON) не требуют миграции: хэш не совпадет, сверка
+# пойдет по полям, и при следующей синхронизации строка получит новый хэш.
+HASH_VERSION = "v2"
+_HASH_PREFIX = f"{HASH_VERSION}:"
+
+# Только те поля ответа ОмГУ, которые мы сохраняем в lessons (кроме source_id)
+HASHED_FIELDS = ("day", "time", "lesson", "type_work", "subgroupName", "teacher_id", "auditory_id", "lesson_id")
+_FIELD_SEPARATOR = "\x1f"
+
+
+def lesson_content_hash(lesson_data: Dict[str, Any]) -> str:
+    """
+    Быстрый версионированный хэш занятия: канонизация только хранимых полей
+    и 128-битный BLAKE2b вместо SHA-256 от отсортированного JSON.
+    """
+    canonical = _FIELD_SEPARATOR.join(
+        "" if (value := lesson_data.get(name)) is None else str(value) for name in HASHED_FIELDS
+    )
+    return _HASH_PREFIX + hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
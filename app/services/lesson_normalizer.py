@@ -0,0 +1,73 @@
+# app/services/lesson_normalizer.py
+
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.services.lesson_hashing import lesson_content_hash
+
+OMSU_DATE_FORMAT = "%d.%m.%Y"
+
+
+@lru_cache(maxsize=2048)
+def parse_omsu_date(day_str: str) -> Optional[date]:
+    """Разбирает дату ОмГУ ("dd.mm.yyyy"). В семестре пара сотен разных дат, поэтому результат кэшируется."""
+    try:
+        return datetime.strptime(day_str, OMSU_DATE_FORMAT).date()
+    except (ValueError, TypeError):
+        return None
+
+
+class LessonRow:
+    """
+    Нормализованное занятие из ответа API ОмГУ. Строится один раз за синхронизацию
+    и используется и для поиска изменений, и для записи в БД.
+    """
+    __slots__ = (
+        "source_id", "lesson_id", "date", "day_str", "time_slot", "subgroup_name",
+        "subject_name", "lesson_type", "tutor_id", "auditory_id", "content_hash",
+    )
+
+    def __init__(self, lesson_api: Dict[str, Any], lesson_date: date):
+        self.source_id: int = lesson_api['id']
+        self.lesson_id: Optional[int] = lesson_api.get('lesson_id')
+        self.date = lesson_date
+        self.day_str: str = lesson_api['day']
+        self.time_slot: int = lesson_api.get('time', 0)
+        self.subgroup_name: Optional[str] = lesson_api.get('subgroupName')
+        self.subject_name: str = lesson_api.get('lesson', 'N/A')
+        self.lesson_type: str = lesson_api.get('type_work', 'N/A')
+        self.tutor_id: Optional[int] = lesson_api.get('teacher_id')
+        self.auditory_id: Optional[int] = lesson_api.get('auditory_id')
+        self.content_hash = lesson_content_hash(lesson_api)
+
+    @property
+    def is_complete(self) -> bool:
+        """Есть ли у занятия все поля, обязательные для записи в lessons."""
+        return bool(self.tutor_id and self.auditory_id and self.lesson_id)
+
+    def to_db_row(self, group_id: int, last_seen_at: datetime) -> Dict[str, Any]:
+        return {
+            "source_id": self.source_id, "lesson_id": self.lesson_id, "date": self.date,
+            "time_slot": self.time_slot, "subgroup_name": self.subgroup_name,
+            "subject_name": self.subject_name, "lesson_type": self.lesson_type,
+            "content_hash": self.content_hash, "last_seen_at": last_seen_at,
+            "group_id": group_id, "tutor_id": self.tutor_id, "auditory_id": self.auditory_id,
+        }
+
+
+def normalize_schedule(lessons_from_api: List[Dict[str, Any]]) -> List[LessonRow]:
+    """
+    Один проход по ответу /schedule/group/{id}: отбрасывает занятия без id или с
+    нечитаемой датой, разбирает даты (с кэшем) и считает хэш каждого занятия.
+    """
+    rows: List[LessonRow] = []
+    for day_data in lessons_from_api:
+        for lesson_api in day_data.get("lessons", []):
+            if not lesson_api.get('id'):
+                continue
+            lesson_date = parse_omsu_date(lesson_api.get('day'))
+            if lesson_date is None:
+                continue
+            rows.append(LessonRow(lesson_api, lesson_date))
+    return rows
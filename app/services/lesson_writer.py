@@ -0,0 +1,108 @@
+# app/services/lesson_writer.py
+
+import logging
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import text, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.schedule import Lesson
+
+logger = logging.getLogger(__name__)
+
+# 12 колонок на строку: 2000 строк держат один INSERT в пределах лимита Postgres в 32767 параметров
+UPSERT_CHUNK_ROWS = 2000
+
+STAGING_TABLE = "lessons_staging"
+LESSON_COLUMNS = [c.name for c in Lesson.__table__.columns]
+_UPDATE_COLUMNS = [c.name for c in Lesson.__table__.columns if not c.primary_key]
+
+_CREATE_STAGING_SQL = text(
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+    f"(LIKE {Lesson.__tablename__} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+)
+_MERGE_SQL = text(
+    f"INSERT INTO {Lesson.__tablename__} ({', '.join(LESSON_COLUMNS)}) "
+    f"SELECT {', '.join(LESSON_COLUMNS)} FROM {STAGING_TABLE} "
+    f"ON CONFLICT (source_id) DO UPDATE SET "
+    + ", ".join(f"{name} = EXCLUDED.{name}" for name in _UPDATE_COLUMNS)
+)
+
+
+async def write_lessons_values(
+    db: AsyncSession, lessons_to_upsert: List[Dict[str, Any]], lessons_to_delete_ids: List[int]
+):
+    """Запись через INSERT ... VALUES ... ON CONFLICT DO UPDATE порциями по UPSERT_CHUNK_ROWS строк."""
+    for start in range(0, len(lessons_to_upsert), UPSERT_CHUNK_ROWS):
+        stmt = insert(Lesson).values(lessons_to_upsert[start:start + UPSERT_CHUNK_ROWS])
+        update_dict = {name: getattr(stmt.excluded, name) for name in _UPDATE_COLUMNS}
+        stmt = stmt.on_conflict_do_update(index_elements=['source_id'], set_=update_dict)
+        await db.execute(stmt)
+
+    if lessons_to_delete_ids:
+        await db.execute(delete(Lesson).where(Lesson.source_id.in_(lessons_to_delete_ids)))
+
+
+async def _get_asyncpg_connection(db: AsyncSession):
+    """Возвращает соединение asyncpg текущей транзакции сессии или None для других драйверов."""
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not hasattr(driver_connection, "copy_records_to_table"):
+        return None
+    return driver_connection
+
+
+async def write_lessons_copy(
+    db: AsyncSession, lessons_to_upsert: List[Dict[str, Any]], lessons_to_delete_ids: List[int]
+) -> bool:
+    """
+    Запись через COPY во временную таблицу и один INSERT ... SELECT ... ON CONFLICT.
+    Работает в транзакции сессии `db`. Возвращает False, если драйвер не asyncpg
+    и COPY недоступен (тогда ничего не записано).
+    """
+    driver_connection = await _get_asyncpg_connection(db)
+    if driver_connection is None:
+        return False
+
+    if lessons_to_upsert:
+        # DDL идет через сессию, чтобы транзакция asyncpg уже была открыта к моменту COPY.
+        # Таблица живет всё соединение и очищается при коммите; в рамках одной
+        # транзакции её могли уже наполнить, поэтому чистим явно.
+        await db.execute(_CREATE_STAGING_SQL)
+        await db.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        await driver_connection.copy_records_to_table(
+            STAGING_TABLE,
+            records=[tuple(row[name] for name in LESSON_COLUMNS) for row in lessons_to_upsert],
+            columns=LESSON_COLUMNS,
+        )
+        await db.execute(_MERGE_SQL)
+
+    if lessons_to_delete_ids:
+        # Один параметр-массив вместо IN (...) на тысячи параметров
+        await db.execute(
+            text(f"DELETE FROM {Lesson.__tablename__} WHERE source_id = ANY(:ids)"),
+            {"ids": lessons_to_delete_ids},
+        )
+    return True
+
+
+async def write_lessons(
+    db: AsyncSession,
+    lessons_to_upsert: List[Dict[str, Any]],
+    lessons_to_delete_ids: List[int],
+    method: Optional[str] = None,
+):
+    """
+    Записывает пачку занятий в lessons в текущей транзакции сессии.
+    `method` - "copy" (по умолчанию из SYNC_LESSON_WRITER) или "values".
+    Если COPY недоступен, используется запись через VALUES.
+    """
+    method = method or settings.SYNC_LESSON_WRITER
+    if method == "copy":
+        if await write_lessons_copy(db, lessons_to_upsert, lessons_to_delete_ids):
+            return
+        logger.warning("COPY is not supported by the database driver, falling back to VALUES upsert.")
+    await write_lessons_values(db, lessons_to_upsert, lessons_to_delete_ids)
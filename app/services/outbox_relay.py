@@ -0,0 +1,78 @@
+# app/services/outbox_relay.py
+
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.core.queue import push_serialized_changes_to_queue
+from app.crud.crud_outbox import delete_outbox_rows, lock_outbox_batch
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Переносит изменения расписания из таблицы schedule_change_outbox в очередь Redis.
+
+    За один проход блокирует пачку записей (FOR UPDATE SKIP LOCKED), отправляет их
+    одним RPUSH и удаляет в той же транзакции. Если после RPUSH транзакция не
+    закоммитилась, пачка уйдет повторно - такие дубли notifier отбрасывает по
+    idempotency_key. Синхронизация будит ретранслятор после коммита (notify), а
+    без этого он проверяет таблицу раз в OUTBOX_RELAY_POLL_SECONDS.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.OUTBOX_RELAY_BATCH_SIZE
+        self.poll_interval = settings.OUTBOX_RELAY_POLL_SECONDS
+        self.relayed = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        """Сообщает, что в outbox появились записи (вызывается после коммита синхронизации)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        """Один проход: отправляет до batch_size записей. Возвращает их количество."""
+        async with AsyncSessionLocal() as session:
+            rows = await lock_outbox_batch(session, limit=self.batch_size)
+            if not rows:
+                await session.rollback()
+                return 0
+            try:
+                await push_serialized_changes_to_queue([payload for _, payload in rows])
+            except Exception:
+                await session.rollback()
+                raise
+            await delete_outbox_rows(session, ids=[row_id for row_id, _ in rows])
+            await session.commit()
+        self.relayed += len(rows)
+        return len(rows)
+
+    async def run(self):
+        """Бесконечный цикл ретранслятора (запускается задачей в воркере)."""
+        self._wakeup = asyncio.Event()
+        logger.info("Outbox relay started.")
+        while True:
+            # Сбрасываем до прохода: notify во время прохода не потеряется
+            self._wakeup.clear()
+            try:
+                relayed = await self.relay_once()
+                if relayed:
+                    logger.info(f"Relayed {relayed} schedule changes from outbox to Redis.")
+                if relayed >= self.batch_size:
+                    continue  # Таблица, скорее всего, не пуста - сразу следующая пачка
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {e}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+outbox_relay = OutboxRelay()
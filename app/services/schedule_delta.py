@@ -0,0 +1,56 @@
+# app/services/schedule_delta.py
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import crud_change_log, crud_schedule
+
+
+async def get_schedule_changes(db: AsyncSession, *, group_id: int, since_version: int) -> Optional[Dict[str, Any]]:
+    """
+    Изменения расписания группы после версии клиента since_version (см. schemas.schedule.ScheduleChanges).
+    Несколько изменений одного занятия сливаются в одно с его текущим состоянием, а
+    занятие, добавленное и отмененное после since_version, не попадает в ответ вовсе.
+    full_refresh=True - дельту отдать нельзя (журнал уже очищен, версия клиента
+    из будущего или изменений слишком много), клиент перезагружает расписание целиком.
+    None - группы нет.
+    """
+    versions = await crud_schedule.get_group_schedule_versions(db, group_ids=[group_id])
+    if group_id not in versions:
+        return None
+    # Версия читается раньше журнала и занятий: все, что закоммичено позже, придет в следующей дельте
+    version = versions[group_id]
+    response = {"group_id": group_id, "version": version, "full_refresh": False, "changes": []}
+    if since_version == version:
+        return response
+
+    min_logged_version = await crud_change_log.get_min_logged_version(db, group_id=group_id)
+    if since_version > version or min_logged_version is None or since_version < min_logged_version - 1:
+        response["full_refresh"] = True
+        return response
+
+    first_change_types: Dict[int, str] = {}
+    for source_id, change_type in await crud_change_log.get_change_log_since(
+        db, group_id=group_id, since_version=since_version, until_version=version
+    ):
+        first_change_types.setdefault(source_id, change_type)
+    if len(first_change_types) > settings.SCHEDULE_DELTA_MAX_CHANGES:
+        response["full_refresh"] = True
+        return response
+
+    current_lessons = {
+        lesson.source_id: lesson
+        for lesson in await crud_schedule.get_lessons_by_source_ids(db, source_ids=list(first_change_types))
+    }
+    for source_id, first_change_type in first_change_types.items():
+        lesson = current_lessons.get(source_id)
+        if lesson is not None:
+            change_type = "NEW" if first_change_type == "NEW" else "UPDATED"
+        elif first_change_type == "NEW":
+            continue
+        else:
+            change_type = "CANCELLED"
+        response["changes"].append({"source_id": source_id, "change_type": change_type, "lesson": lesson})
+    return response
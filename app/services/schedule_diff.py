@@ -0,0 +1,324 @@
+# app/services/schedule_diff.py
+
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from app.schemas.notifications import ScheduleChange, LessonInfo
+from app.services.lesson_normalizer import LessonRow, normalize_schedule
+
+# Чистые функции стадии diff синхронизации расписания: без БД, сети и глобального
+# состояния, поэтому их можно выполнять как в цикле событий, так и в пуле процессов.
+
+
+class PreparedGroup:
+    """Результат стадии diff для одной группы: все, что нужно стадии записи."""
+    __slots__ = (
+        "group_id", "fingerprint", "changes", "rows", "delete_ids", "skipped_by_dictionaries", "affected_dates",
+        "new_source_ids",
+    )
+
+    def __init__(
+        self,
+        group_id: int,
+        fingerprint: Optional[str],
+        changes: List[ScheduleChange],
+        rows: List[Dict[str, Any]],
+        delete_ids: List[int],
+        skipped_by_dictionaries: int,
+        affected_dates: Optional[set[date]] = None,
+        new_source_ids: Optional[set[int]] = None,
+    ):
+        self.group_id = group_id
+        self.fingerprint = fingerprint
+        self.changes = changes
+        self.rows = rows
+        self.delete_ids = delete_ids
+        self.skipped_by_dictionaries = skipped_by_dictionaries
+        # Даты, расписание которых изменится после записи (старые и новые даты занятий)
+        self.affected_dates = affected_dates or set()
+        # Занятия, которых не было в БД (в том числе прошедшие, о которых не уведомляем)
+        self.new_source_ids = new_source_ids or set()
+
+    # __slots__ без __dict__: для передачи между процессами состояние собираем явно
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def change_idempotency_key(
+    group_id: int, change_type: str, source_id: int, hash_before: Optional[str], hash_after: Optional[str]
+) -> str:
+    """
+    Ключ изменения, зависящий только от его содержания: повторный diff того же
+    состояния (например, после отката транзакции) дает тот же ключ. Перед записью
+    в outbox ключ привязывается к версии расписания (см. stamp_changes).
+    """
+    raw = f"{group_id}\x1f{change_type}\x1f{source_id}\x1f{hash_before or ''}\x1f{hash_after or ''}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def stamp_changes(changes: List[ScheduleChange], schedule_version: int) -> List[ScheduleChange]:
+    """
+    Копии изменений с ключом, привязанным к версии расписания группы, в которой они
+    произошли. Без версии повтор того же изменения (отмена, возврат и снова отмена
+    занятия) дал бы тот же ключ и был бы отброшен как уже доставленный. Откат транзакции
+    откатывает и версию, поэтому повторная запись того же diff дает те же ключи.
+    """
+    return [
+        change.model_copy(update={
+            "schedule_version": schedule_version,
+            "idempotency_key": hashlib.blake2b(
+                f"{change.idempotency_key}\x1f{schedule_version}".encode("utf-8"), digest_size=16
+            ).hexdigest(),
+        })
+        for change in changes
+    ]
+
+
+# Порядок полей в кортежах состояния БД (см. get_lesson_diff_rows_for_groups)
+DB_ROW_FIELDS = (
+    "source_id", "content_hash", "date", "time_slot", "subject_name",
+    "lesson_type", "subgroup_name", "tutor_id", "auditory_id", "lesson_id",
+)
+_HASH_INDEX = DB_ROW_FIELDS.index("content_hash")
+
+# Поля, изменение которых видно студенту: о них уведомляем
+SIGNIFICANT_FIELDS = ("date", "time_slot", "subject_name", "lesson_type", "subgroup_name", "tutor_id", "auditory_id")
+# Текстовые поля сравниваются без учета регистра и пробелов: "Мат. анализ " и "мат. анализ" - одно и то же
+_TEXT_FIELDS = frozenset(("subject_name", "lesson_type", "subgroup_name"))
+# Остальные хранимые поля (внутренний lesson_id ОмГУ) меняются без уведомления
+_FIELD_INDEXES = tuple((name, DB_ROW_FIELDS.index(name)) for name in SIGNIFICANT_FIELDS + ("lesson_id",))
+
+
+def _normalize_text(value: Optional[str]) -> str:
+    return " ".join(value.split()).casefold() if value else ""
+
+
+def compare_lesson(db_row: tuple, row: LessonRow) -> tuple[bool, List[str]]:
+    """
+    Сравнивает хранимое занятие с занятием из API по колонкам. Возвращает
+    (нужно ли перезаписать строку, список значимых изменившихся полей).
+    Совпадение хэшей - быстрый путь: строка не изменилась и не перезаписывается.
+    Косметические отличия (регистр, пробелы, lesson_id, старый формат хэша)
+    перезаписывают строку, но не считаются изменением расписания.
+    """
+    if db_row[_HASH_INDEX] == row.content_hash:
+        return False, []
+    changed_fields = []
+    for name, index in _FIELD_INDEXES:
+        stored, current = db_row[index], getattr(row, name)
+        if stored == current:
+            continue
+        if name in _TEXT_FIELDS and _normalize_text(stored) == _normalize_text(current):
+            continue
+        if name != "lesson_id":
+            changed_fields.append(name)
+    return True, changed_fields
+
+
+def lesson_info_from_row(row: tuple) -> LessonInfo:
+    source_id, _, lesson_date, time_slot, subject_name, lesson_type, subgroup_name, tutor_id, auditory_id, _ = row
+    return LessonInfo(
+        source_id=source_id, date=lesson_date.strftime("%d.%m.%Y"),
+        time_slot=time_slot, subject_name=subject_name, lesson_type=lesson_type,
+        subgroup_name=subgroup_name, tutor_id=tutor_id, auditory_id=auditory_id,
+    )
+
+
+def lesson_info_from_api_row(row: LessonRow) -> LessonInfo:
+    return LessonInfo(
+        source_id=row.source_id, date=row.day_str, time_slot=row.time_slot, subject_name=row.subject_name,
+        lesson_type=row.lesson_type, subgroup_name=row.subgroup_name,
+        tutor_id=row.tutor_id, auditory_id=row.auditory_id,
+    )
+
+
+class ScheduleDiff:
+    """Результат сравнения расписания группы с БД."""
+    __slots__ = ("changes", "changed_source_ids", "new_source_ids", "delete_ids", "affected_dates")
+
+    def __init__(self):
+        self.changes: List[ScheduleChange] = []
+        self.changed_source_ids: set[int] = set()  # новые и отличающиеся занятия - только их нужно писать
+        self.new_source_ids: set[int] = set()  # занятия, которых нет в БД
+        self.delete_ids: List[int] = []
+        self.affected_dates: set[date] = set()
+
+
+def diff_lessons(
+    group_id: int,
+    api_rows: List[LessonRow],
+    db_lessons: Dict[int, tuple],
+    today: date,
+    window: Optional[tuple[date, Optional[date]]] = None,
+) -> ScheduleDiff:
+    """
+    Сравнивает нормализованные данные из API с состоянием БД по колонкам.
+    `db_lessons` - source_id -> кортеж в порядке DB_ROW_FIELDS для занятий группы
+    в окне синхронизации `window` = (начало, конец или None) включительно; None - все занятия.
+
+    Занятия из API вне окна пропускаются, если их нет в `db_lessons`: строки вне окна
+    заморожены. Занятие, перенесенное из окна за его пределы, - обычное изменение.
+    Уведомления (changes) формируются только для занятий СЕГОДНЯ или В БУДУЩЕМ и
+    только при значимых изменениях.
+    """
+    diff = ScheduleDiff()
+    api_source_ids: set[int] = set()
+
+    # 1. Проходим по данным из API (ищем НОВЫЕ и ОБНОВЛЕННЫЕ занятия)
+    for row in api_rows:
+        db_row = db_lessons.get(row.source_id)
+        if db_row is None and window is not None and (
+            row.date < window[0] or (window[1] is not None and row.date > window[1])
+        ):
+            continue
+        api_source_ids.add(row.source_id)
+        if db_row is None:
+            diff.changed_source_ids.add(row.source_id)
+            diff.new_source_ids.add(row.source_id)
+            diff.affected_dates.add(row.date)
+            if row.date >= today:
+                diff.changes.append(ScheduleChange(
+                    change_type="NEW", group_id=group_id, lesson_after=lesson_info_from_api_row(row),
+                    idempotency_key=change_idempotency_key(group_id, "NEW", row.source_id, None, row.content_hash),
+                ))
+            continue
+
+        needs_write, changed_fields = compare_lesson(db_row, row)
+        if not needs_write:
+            continue
+        diff.changed_source_ids.add(row.source_id)
+        diff.affected_dates.update((row.date, db_row[2]))
+        # Игнорируем изменения, которые целиком в прошлом
+        if changed_fields and max(row.date, db_row[2]) >= today:
+            diff.changes.append(ScheduleChange(
+                change_type="UPDATED", group_id=group_id,
+                lesson_before=lesson_info_from_row(db_row),
+                lesson_after=lesson_info_from_api_row(row),
+                idempotency_key=change_idempotency_key(
+                    group_id, "UPDATED", row.source_id, db_row[_HASH_INDEX], row.content_hash
+                ),
+                changed_fields=changed_fields,
+            ))
+
+    # 2. Проходим по данным из БД (ищем ОТМЕНЕННЫЕ занятия)
+    for source_id, db_row in db_lessons.items():
+        if source_id in api_source_ids:
+            continue
+        diff.delete_ids.append(source_id)
+        diff.affected_dates.add(db_row[2])
+        if db_row[2] >= today:
+            diff.changes.append(ScheduleChange(
+                change_type="CANCELLED", group_id=group_id,
+                lesson_before=lesson_info_from_row(db_row),
+                idempotency_key=change_idempotency_key(group_id, "CANCELLED", source_id, db_row[_HASH_INDEX], None),
+            ))
+    return diff
+
+
+def build_lesson_rows(
+    group_id: int,
+    api_rows: List[LessonRow],
+    existing_tutor_ids: set[int],
+    existing_auditory_ids: set[int],
+    current_sync_time: datetime,
+    only_source_ids: Optional[set[int]] = None,
+) -> tuple[List[Dict[str, Any]], int]:
+    """
+    Готовит строки для upsert в lessons (только занятия из `only_source_ids`, если
+    задано). Возвращает строки и число занятий, отброшенных из-за отсутствующих
+    в справочниках преподавателей или аудиторий.
+    """
+    lessons_to_upsert = []
+    skipped_by_dictionaries = 0
+    for row in api_rows:
+        if only_source_ids is not None and row.source_id not in only_source_ids:
+            continue
+        if not row.is_complete:
+            continue
+        if row.tutor_id not in existing_tutor_ids or row.auditory_id not in existing_auditory_ids:
+            skipped_by_dictionaries += 1
+            continue
+        lessons_to_upsert.append(row.to_db_row(group_id, current_sync_time))
+    return lessons_to_upsert, skipped_by_dictionaries
+
+
+def prepare_group(
+    group_id: int,
+    api_rows: List[LessonRow],
+    fingerprint: Optional[str],
+    db_lessons: Dict[int, tuple],
+    today: date,
+    existing_tutor_ids: set[int],
+    existing_auditory_ids: set[int],
+    current_sync_time: datetime,
+    window: Optional[tuple[date, Optional[date]]] = None,
+) -> PreparedGroup:
+    diff = diff_lessons(group_id, api_rows, db_lessons, today, window)
+    rows, skipped_by_dictionaries = build_lesson_rows(
+        group_id, api_rows, existing_tutor_ids, existing_auditory_ids, current_sync_time,
+        only_source_ids=diff.changed_source_ids,
+    )
+    return PreparedGroup(
+        group_id, fingerprint, diff.changes, rows, diff.delete_ids, skipped_by_dictionaries, diff.affected_dates,
+        diff.new_source_ids,
+    )
+
+
+def prepare_group_from_body(
+    group_id: int,
+    body: bytes,
+    fingerprint: Optional[str],
+    db_lessons: Dict[int, tuple],
+    today: date,
+    existing_tutor_ids: set[int],
+    existing_auditory_ids: set[int],
+    current_sync_time: datetime,
+    window: Optional[tuple[date, Optional[date]]] = None,
+) -> Optional[PreparedGroup]:
+    """
+    Вся CPU-работа по группе из сырого тела ответа ОмГУ: JSON, даты, хэши, diff и
+    строки для записи. Выполняется в пуле процессов. None - тело непригодно
+    (не JSON или success=false).
+    """
+    try:
+        json_response = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(json_response, dict) or not json_response.get("success"):
+        return None
+    lessons_from_api = json_response.get("data")
+    if lessons_from_api is None:
+        return None
+    api_rows = normalize_schedule(lessons_from_api)
+    return prepare_group(
+        group_id, api_rows, fingerprint, db_lessons, today,
+        existing_tutor_ids, existing_auditory_ids, current_sync_time, window,
+    )
+
+
+def prepare_groups_from_bodies(
+    items: List[tuple],
+    today: date,
+    existing_tutor_ids: set[int],
+    existing_auditory_ids: set[int],
+    current_sync_time: datetime,
+    window: Optional[tuple[date, Optional[date]]] = None,
+) -> List[Optional[PreparedGroup]]:
+    """
+    Задача для пула процессов: несколько групп за один вызов, чтобы множества ID
+    справочников передавались в процесс один раз, а не на каждую группу.
+    `items` - [(group_id, body, fingerprint, db_lessons)].
+    """
+    return [
+        prepare_group_from_body(
+            group_id, body, fingerprint, db_lessons, today,
+            existing_tutor_ids, existing_auditory_ids, current_sync_time, window,
+        )
+        for group_id, body, fingerprint, db_lessons in items
+    ]
@@ -0,0 +1,148 @@
+# app/services/schedule_events.py
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.queue import SCHEDULE_UPDATES_CHANNEL, redis_client
+from app.crud import crud_schedule
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Через сколько браузер переподключает EventSource после обрыва
+CLIENT_RETRY_MS = 5000
+RECONNECT_DELAY_SECONDS = 2.0
+
+# Событие подписчику: ("schedule", версия) или ("resync", None) - сообщения могли потеряться
+Event = Tuple[str, Optional[int]]
+
+
+class ScheduleEventHub:
+    """
+    Раздает новые версии расписаний групп открытым SSE-соединениям процесса.
+    На процесс одна подписка на SCHEDULE_UPDATES_CHANNEL, а подписчики сгруппированы
+    по group_id: сообщение синхронизации стоит O(групп в нем), а не O(соединений).
+
+    У подписчика очередь на одно событие: событие несет текущую версию группы, поэтому
+    непрочитанное событие просто заменяется новым - медленный клиент не копит память.
+    Простаивающее соединение - только эта очередь и ожидающая корутина, без БД и Redis.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, group_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers[group_id].add(queue)
+        return queue
+
+    def unsubscribe(self, group_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(group_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[group_id]
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Event):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def dispatch(self, message: str):
+        """Разбирает сообщение синхронизации {group_id: version} и раздает его подписчикам."""
+        try:
+            versions = json.loads(message)
+        except ValueError:
+            logger.warning(f"Skipping malformed schedule update: {message[:200]}")
+            return
+        for group_id, version in versions.items():
+            queues = self._subscribers.get(int(group_id))
+            if not queues:
+                continue
+            for queue in list(queues):
+                self._offer(queue, ("schedule", version))
+            # Большая группа не должна надолго занимать цикл событий
+            await asyncio.sleep(0)
+
+    def _broadcast_resync(self):
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._offer(queue, ("resync", None))
+
+    async def _run(self):
+        reconnecting = False
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(SCHEDULE_UPDATES_CHANNEL)
+                if reconnecting:
+                    # Пока подписки не было, обновления публиковались мимо нас
+                    self._broadcast_resync()
+                    reconnecting = False
+                async for message in pubsub.listen():
+                    await self.dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Schedule updates subscription failed, reconnecting: {e}")
+                reconnecting = True
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="ScheduleEventHub")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+schedule_event_hub = ScheduleEventHub()
+
+
+def _format_event(event: Event, group_id: int) -> str:
+    name, version = event
+    if name == "resync":
+        return "event: resync\ndata: {}\n\n"
+    return f"event: schedule\nid: {version}\ndata: {json.dumps({'group_id': group_id, 'version': version})}\n\n"
+
+
+async def schedule_event_stream(group_id: int) -> AsyncIterator[str]:
+    """
+    Поток SSE для группы: сначала текущая версия ее расписания, затем каждая новая.
+    Получив версию новее своей, клиент забирает /schedule/my/changes?since=<своя версия>;
+    resync - то же самое, но без известной версии.
+    """
+    # Подписываемся до чтения версии: обновление между ними не потеряется
+    queue = schedule_event_hub.subscribe(group_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            versions = await crud_schedule.get_group_schedule_versions(db, group_ids=[group_id])
+        yield f"retry: {CLIENT_RETRY_MS}\n" + _format_event(("schedule", versions.get(group_id, 0)), group_id)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.SCHEDULE_EVENTS_PING_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield _format_event(event, group_id)
+    finally:
+        schedule_event_hub.unsubscribe(group_id, queue)
@@ -0,0 +1,87 @@
+# app/services/schedule_reader.py
+
+from datetime import date
+from typing import List
+
+from app.core.coalesce import RequestCoalescer
+from app.core.config import settings
+from app.core.schedule_snapshots import GroupSnapshot, read_snapshot_days
+from app.crud import crud_schedule
+from app.db.session import AsyncSessionLocal
+from app.models.schedule import Lesson
+from app.services import snapshot_builder
+
+# Чтение расписания для API и бота. Одинаковые одновременные запросы (сотни студентов
+# одной группы в 08:00) сливаются в один: он идет в своей сессии, поэтому сессии
+# вызывающих не открывают соединений, а отмена одного запроса не ломает остальные.
+schedule_coalescer = RequestCoalescer("schedule")
+
+
+async def _read_group_period(group_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    async with AsyncSessionLocal() as db:
+        return await crud_schedule.get_schedule_for_group_for_period(
+            db, group_id=group_id, start_date=start_date, end_date=end_date
+        )
+
+
+async def _read_tutor_period(tutor_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    async with AsyncSessionLocal() as db:
+        return await crud_schedule.get_schedule_for_tutor_for_period(
+            db, tutor_id=tutor_id, start_date=start_date, end_date=end_date
+        )
+
+
+async def _read_auditory_period(auditory_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    async with AsyncSessionLocal() as db:
+        return await crud_schedule.get_schedule_for_auditory_for_period(
+            db, auditory_id=auditory_id, start_date=start_date, end_date=end_date
+        )
+
+
+async def get_group_schedule_for_period(group_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    lessons = await schedule_coalescer.run(
+        ("group", group_id, start_date, end_date), lambda: _read_group_period(group_id, start_date, end_date)
+    )
+    return list(lessons)
+
+
+async def get_group_schedule_for_date(group_id: int, target_date: date) -> List[Lesson]:
+    return await get_group_schedule_for_period(group_id, target_date, target_date)
+
+
+async def get_tutor_schedule_for_period(tutor_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    lessons = await schedule_coalescer.run(
+        ("tutor", tutor_id, start_date, end_date), lambda: _read_tutor_period(tutor_id, start_date, end_date)
+    )
+    return list(lessons)
+
+
+async def get_auditory_schedule_for_period(auditory_id: int, start_date: date, end_date: date) -> List[Lesson]:
+    lessons = await schedule_coalescer.run(
+        ("auditory", auditory_id, start_date, end_date),
+        lambda: _read_auditory_period(auditory_id, start_date, end_date),
+    )
+    return list(lessons)
+
+
+async def get_group_schedule_days(group_id: int, days: List[date]) -> GroupSnapshot:
+    """
+    Расписание группы по дням (подряд идущим) в виде готового JSON с ETag - для API.
+    Дни берутся из снимка; если снимка нет, а дни входят в его текущий диапазон,
+    снимок собирается (одна сборка на все одновременные запросы процесса).
+    Остальные дни читаются из БД и сериализуются на лету - у результата version=None.
+    """
+    snapshot = await read_snapshot_days(group_id, days)
+    if snapshot is not None:
+        return snapshot
+
+    start, end = snapshot_builder.snapshot_range(date.today())
+    if settings.SCHEDULE_SNAPSHOT_ENABLED and start <= days[0] and days[-1] <= end:
+        snapshot = await schedule_coalescer.run(
+            ("snapshot", group_id), lambda: snapshot_builder.build_group_snapshot(group_id)
+        )
+        if snapshot is not None:
+            return snapshot.slice(days)
+
+    lessons = await get_group_schedule_for_period(group_id, days[0], days[-1])
+    return snapshot_builder.build_snapshot(group_id, None, days[0], days[-1], lessons)
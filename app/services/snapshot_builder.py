@@ -0,0 +1,90 @@
+# app/services/snapshot_builder.py
+
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.schedule_snapshots import GroupSnapshot, SnapshotDay, write_snapshot
+from app.crud import crud_schedule
+from app.db.session import AsyncSessionLocal
+from app.models.schedule import Lesson
+from app.schemas import schedule
+
+logger = logging.getLogger(__name__)
+
+_lessons_adapter = TypeAdapter(List[schedule.Lesson])
+
+
+def snapshot_range(today: date) -> tuple[date, date]:
+    """Диапазон дней снимка (включительно): с понедельника текущей недели на SCHEDULE_SNAPSHOT_WEEKS недель."""
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=7 * settings.SCHEDULE_SNAPSHOT_WEEKS - 1)
+
+
+def serialize_day(lessons: List[Lesson]) -> SnapshotDay:
+    """Занятия одного дня в JSON ответа API (как при response_model) и их хэш."""
+    body = _lessons_adapter.dump_json(_lessons_adapter.validate_python(lessons, from_attributes=True), by_alias=True)
+    return SnapshotDay(etag=hashlib.sha256(body).hexdigest()[:32], lessons=body)
+
+
+def build_snapshot(
+    group_id: int, version: Optional[int], start: date, end: date, lessons: Iterable[Lesson]
+) -> GroupSnapshot:
+    """Раскладывает занятия (отсортированные по дате и паре) по дням диапазона; пустые дни тоже попадают в снимок."""
+    lessons_by_day = {start + timedelta(days=i): [] for i in range((end - start).days + 1)}
+    for lesson in lessons:
+        if lesson.date in lessons_by_day:
+            lessons_by_day[lesson.date].append(lesson)
+    return GroupSnapshot(
+        group_id, version, start, end, {day: serialize_day(day_lessons) for day, day_lessons in lessons_by_day.items()}
+    )
+
+
+async def refresh_snapshots(db: AsyncSession, *, group_ids: List[int]) -> int:
+    """
+    Пересобирает снимки групп из БД. Вызывается синхронизацией после коммита.
+    Возвращает количество записанных снимков.
+    """
+    if not settings.SCHEDULE_SNAPSHOT_ENABLED or not group_ids:
+        return 0
+    start, end = snapshot_range(date.today())
+    # Версия читается раньше занятий: если между запросами закоммитится новая
+    # синхронизация, снимок получит старую версию и будет перезаписан ее снимком.
+    versions = await crud_schedule.get_group_schedule_versions(db, group_ids=group_ids)
+    lessons_by_group = defaultdict(list)
+    for lesson in await crud_schedule.get_schedule_for_groups_for_period(
+        db, group_ids=list(versions), start_date=start, end_date=end
+    ):
+        lessons_by_group[lesson.group_id].append(lesson)
+
+    written = 0
+    for group_id, version in versions.items():
+        if await write_snapshot(build_snapshot(group_id, version, start, end, lessons_by_group[group_id])):
+            written += 1
+    return written
+
+
+async def build_group_snapshot(group_id: int) -> Optional[GroupSnapshot]:
+    """
+    Собирает и сохраняет снимок группы по запросу API (снимка нет, истек или
+    устарел его диапазон). None - группы нет или уже записан снимок новее.
+    """
+    start, end = snapshot_range(date.today())
+    async with AsyncSessionLocal() as db:
+        versions = await crud_schedule.get_group_schedule_versions(db, group_ids=[group_id])
+        if group_id not in versions:
+            return None
+        lessons = await crud_schedule.get_schedule_for_groups_for_period(
+            db, group_ids=[group_id], start_date=start, end_date=end
+        )
+    snapshot = build_snapshot(group_id, versions[group_id], start, end, lessons)
+    if not await write_snapshot(snapshot):
+        logger.info(f"Schedule snapshot of group {group_id} was superseded while building.")
+        return None
+    return snapshot
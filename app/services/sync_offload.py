@@ -0,0 +1,79 @@
+# app/services/sync_offload.py
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from typing import List, Optional
+
+from app.core.config import settings
+from app.services.schedule_diff import PreparedGroup, prepare_groups_from_bodies
+
+logger = logging.getLogger(__name__)
+
+
+class SyncProcessPool:
+    """
+    Пул процессов для CPU-части синхронизации расписания (разбор JSON, даты,
+    хэши, diff, pydantic). Цикл событий воркера отдает в пул сырые тела ответов
+    и состояние БД, а получает готовые PreparedGroup и занимается только вводом-выводом.
+
+    Пул создается при первом использовании. Процессы запускаются через "spawn":
+    fork процесса с работающим циклом событий, соединениями к БД и Redis небезопасен.
+    """
+
+    def __init__(self):
+        self.enabled = settings.SYNC_PARSE_IN_PROCESS_POOL
+        self.max_workers = max(1, settings.SYNC_PROCESS_POOL_WORKERS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started sync process pool with {self.max_workers} workers.")
+        return self._executor
+
+    async def prepare_groups(
+        self,
+        items: List[tuple],
+        today: date,
+        existing_tutor_ids: set[int],
+        existing_auditory_ids: set[int],
+        current_sync_time: datetime,
+        window: Optional[tuple[date, Optional[date]]] = None,
+    ) -> List[Optional[PreparedGroup]]:
+        """
+        Разбирает `items` = [(group_id, body, fingerprint, db_lessons)] в пуле, разделив их
+        на части по числу процессов. Порядок результатов совпадает с порядком `items`.
+        """
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        chunk_size = -(-len(items) // self.max_workers)
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        try:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor, prepare_groups_from_bodies, chunk, today,
+                    existing_tutor_ids, existing_auditory_ids, current_sync_time, window,
+                )
+                for chunk in chunks
+            ))
+        except BrokenProcessPool:
+            # Процесс пула умер (например, OOM) - пересоздадим пул при следующем вызове
+            self._executor = None
+            raise
+        return [prepared for chunk_result in results for prepared in chunk_result]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+sync_process_pool = SyncProcessPool()
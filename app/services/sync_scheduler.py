@@ -0,0 +1,245 @@
+# app/services/sync_scheduler.py
+
+import heapq
+import logging
+import math
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud.crud_schedule import (
+    LESSON_START_TIMES,
+    get_active_user_counts_by_group,
+    get_all_groups_ids,
+    get_next_lesson_slots,
+)
+
+logger = logging.getLogger(__name__)
+
+# Начальная оценка доли синхронизаций с изменениями для группы, о которой еще ничего не знаем
+INITIAL_CHANGE_RATE = 0.2
+# Насколько дальше заглядываем в поисках ближайшего занятия группы
+NEXT_LESSON_LOOKAHEAD_DAYS = 7
+
+
+class GroupSyncState:
+    """Что планировщик знает о группе: частота изменений, аудитория и ближайшее занятие."""
+    __slots__ = ("group_id", "change_rate", "active_users", "next_lesson_at", "failures", "last_synced_at", "due_at")
+
+    def __init__(self, group_id: int):
+        self.group_id = group_id
+        self.change_rate = INITIAL_CHANGE_RATE
+        self.active_users = 0
+        self.next_lesson_at: Optional[datetime] = None
+        self.failures = 0
+        self.last_synced_at: Optional[float] = None
+        # None - группа сейчас синхронизируется и в очереди отсутствует
+        self.due_at: Optional[float] = None
+
+
+def lesson_start_datetime(lesson_date: date, time_slot: int) -> datetime:
+    """Время начала пары по ее номеру (локальное время, как и в напоминаниях)."""
+    time_str = LESSON_START_TIMES.get(time_slot)
+    if time_str is None:
+        return datetime.combine(lesson_date, datetime.min.time())
+    h, m = map(int, time_str.split(':'))
+    return datetime.combine(lesson_date, datetime.min.time()).replace(hour=h, minute=m)
+
+
+class AdaptiveSyncScheduler:
+    """
+    Непрерывный планировщик синхронизации расписания вместо деления на горячие/холодные группы.
+
+    Для каждой группы хранится время следующей синхронизации в очереди с приоритетом (куча
+    по времени). Интервал до следующей синхронизации короче, если расписание группы часто
+    меняется (EWMA доли синхронизаций с изменениями), если у группы много активных
+    пользователей и если ближайшее занятие скоро. На каждом тике забирается не больше
+    `max_groups_per_tick` самых просроченных групп, а первые запуски разбросаны по всему
+    интервалу, поэтому нагрузка на ОмГУ и БД распределяется равномерно, без всплесков.
+    """
+
+    def __init__(self):
+        self.min_interval = settings.SYNC_MIN_INTERVAL_SECONDS
+        self.base_interval = settings.SYNC_BASE_INTERVAL_SECONDS
+        self.max_interval = settings.SYNC_MAX_INTERVAL_SECONDS
+        self.refresh_interval = settings.SYNC_SCHEDULER_REFRESH_SECONDS
+        self.max_groups_per_tick = settings.SYNC_MAX_GROUPS_PER_TICK
+        self.change_rate_alpha = settings.SYNC_CHANGE_RATE_ALPHA
+
+        self._states: Dict[int, GroupSyncState] = {}
+        # Элементы (due_at, group_id); устаревшие записи отбрасываются при извлечении
+        self._heap: List[Tuple[float, int]] = []
+        # Группы чужих шардов: ждут, пока шард не перейдет к этому воркеру
+        self._parked: Set[int] = set()
+        self._refreshed_at = 0.0
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return not self._states or now - self._refreshed_at >= self.refresh_interval
+
+    async def refresh(self, db: AsyncSession, now: Optional[float] = None):
+        """Подтягивает из БД список групп, число активных пользователей и ближайшие занятия."""
+        now = time.time() if now is None else now
+        group_ids = await get_all_groups_ids(db)
+        # Пользователи, не заходившие дольше окна горячих групп, на интервал не влияют
+        user_counts = await get_active_user_counts_by_group(
+            db, active_since=datetime.now(timezone.utc) - timedelta(days=settings.HOT_GROUP_WINDOW_DAYS)
+        )
+        today = date.today()
+        next_slots = await get_next_lesson_slots(
+            db, from_date=today, to_date=today + timedelta(days=NEXT_LESSON_LOOKAHEAD_DAYS)
+        )
+        current_time = datetime.now()
+
+        known_ids = set(group_ids)
+        for group_id in list(self._states):
+            if group_id not in known_ids:
+                # Запись в куче останется, но будет пропущена при извлечении
+                del self._states[group_id]
+                self._parked.discard(group_id)
+
+        added = 0
+        for group_id in group_ids:
+            state = self._states.get(group_id)
+            is_new = state is None
+            if is_new:
+                state = self._states[group_id] = GroupSyncState(group_id)
+                added += 1
+
+            state.active_users = user_counts.get(group_id, 0)
+            state.next_lesson_at = None
+            slot = next_slots.get(group_id)
+            if slot is not None:
+                # Если сегодняшние пары уже идут, время начала в прошлом - это максимальная
+                # срочность, что и нужно в учебный день
+                state.next_lesson_at = lesson_start_datetime(*slot)
+
+            interval = self.compute_interval(state, current_time)
+            if is_new:
+                # Разбрасываем первые синхронизации по интервалу, чтобы не было всплеска на старте
+                self._schedule(state, now + random.uniform(0, interval))
+            elif state.due_at is not None and state.last_synced_at is not None:
+                # Группа стала важнее (появились пользователи, приблизилось занятие) - переносим раньше
+                new_due = state.last_synced_at + interval
+                if new_due < state.due_at:
+                    self._schedule(state, max(now, new_due))
+
+        self._refreshed_at = now
+        logger.info(
+            f"Adaptive sync scheduler refreshed: {len(self._states)} groups ({added} new), "
+            f"{sum(1 for s in self._states.values() if s.active_users)} with active users."
+        )
+
+    def compute_interval(self, state: GroupSyncState, current_time: Optional[datetime] = None) -> float:
+        """Интервал до следующей синхронизации группы, в секундах."""
+        current_time = current_time or datetime.now()
+        interval = self.base_interval
+
+        # Пользователи: логарифмически, чтобы одна большая группа не забирала весь бюджет
+        if state.active_users:
+            interval /= 1 + math.log2(1 + state.active_users)
+        else:
+            # Группы без пользователей обновляются редко, но не перестают обновляться совсем
+            interval *= 4
+
+        # Частота изменений: группа, которая меняется на каждой синхронизации, проверяется в 4 раза чаще
+        interval /= 1 + 3 * state.change_rate
+
+        if state.next_lesson_at is not None:
+            hours_left = (state.next_lesson_at - current_time).total_seconds() / 3600
+            if hours_left <= 3:
+                interval /= 2
+            elif hours_left <= 24:
+                interval /= 1.5
+
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _schedule(self, state: GroupSyncState, due_at: float):
+        state.due_at = due_at
+        heapq.heappush(self._heap, (due_at, state.group_id))
+
+    def pop_due(
+        self,
+        now: Optional[float] = None,
+        limit: Optional[int] = None,
+        owns: Optional[Callable[[int], bool]] = None,
+    ) -> List[int]:
+        """
+        Забирает из очереди группы, которым пора синхронизироваться, самые просроченные первыми.
+        `owns` отсекает группы чужих шардов: они откладываются и возвращаются в очередь,
+        когда шард достанется этому воркеру.
+        """
+        now = time.time() if now is None else now
+        limit = self.max_groups_per_tick if limit is None else limit
+        if owns is not None and self._parked:
+            for group_id in [g for g in self._parked if owns(g)]:
+                self._parked.discard(group_id)
+                # Прежний владелец недавно синхронизировал группу, поэтому без спешки
+                self._schedule(self._states[group_id], now + random.uniform(0, self.min_interval))
+
+        due: List[int] = []
+        while self._heap and len(due) < limit:
+            due_at, group_id = self._heap[0]
+            state = self._states.get(group_id)
+            if state is None or state.due_at != due_at:
+                heapq.heappop(self._heap)
+                continue
+            if due_at > now:
+                break
+            heapq.heappop(self._heap)
+            state.due_at = None
+            if owns is not None and not owns(group_id):
+                self._parked.add(group_id)
+                continue
+            due.append(group_id)
+        return due
+
+    def record_results(self, group_ids: Iterable[int], stats=None, now: Optional[float] = None):
+        """
+        Возвращает группы в очередь по итогам синхронизации. Группа без результата в
+        `stats` (в т.ч. если синхронизация упала целиком) считается неудачной и
+        повторяется с экспоненциальной задержкой.
+        """
+        now = time.time() if now is None else now
+        current_time = datetime.now()
+        changes_by_group = stats.changes_by_group if stats is not None else {}
+        alpha = self.change_rate_alpha
+
+        for group_id in group_ids:
+            state = self._states.get(group_id)
+            if state is None:
+                continue
+            changes = changes_by_group.get(group_id)
+            if changes is None:
+                state.failures += 1
+                delay = min(self.max_interval, self.min_interval * (2 ** (state.failures - 1)))
+                self._schedule(state, now + random.uniform(0.5, 1.0) * delay)
+                continue
+
+            state.failures = 0
+            state.last_synced_at = now
+            state.change_rate = (1 - alpha) * state.change_rate + alpha * (1.0 if changes else 0.0)
+            interval = self.compute_interval(state, current_time)
+            # Небольшой джиттер не дает группам одного тика снова собраться в один тик
+            self._schedule(state, now + interval * random.uniform(0.9, 1.1))
+
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, float]:
+        now = time.time() if now is None else now
+        queued = [s for s in self._states.values() if s.due_at is not None]
+        return {
+            "groups": len(self._states),
+            "queued": len(queued),
+            "parked": len(self._parked),
+            "overdue": sum(1 for s in queued if s.due_at <= now),
+            "failing": sum(1 for s in self._states.values() if s.failures),
+            "avg_change_rate": round(
+                sum(s.change_rate for s in self._states.values()) / len(self._states), 3
+            ) if self._states else 0.0,
+        }
+
+
+sync_scheduler = AdaptiveSyncScheduler()
@@ -1,229 +1,583 @@
 # app/services/sync_service.py
 
-import hashlib
-import json
+import asyncio
 import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta, date
-from typing import List, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, exists
 
+from app.core.config import settings
 from app.core.omsu_api import api_client
 from app.models.schedule import Group, Tutor, Auditory, Lesson
-from app.crud.crud_schedule import get_lessons_for_group
-from app.schemas.notifications import ScheduleChange, LessonInfo
-from app.core.queue import push_changes_to_queue
+from app.crud.crud_schedule import (
+    get_lesson_diff_rows_for_groups,
+    get_group_schedule_fingerprints,
+    get_group_schedule_versions,
+)
+from app.schemas.notifications import ScheduleChange
+from app.crud.crud_outbox import add_schedule_changes
+from app.crud.crud_change_log import add_change_log_entries, delete_change_log_before
+from app.core.metrics import publish_metrics
+from app.core.queue import publish_schedule_versions
+from app.core import schedule_cache
+from app.core.schedule_snapshots import delete_all_snapshots
+from app.db.session import AsyncSessionLocal
+from app.services.lesson_writer import write_lessons, UPSERT_CHUNK_ROWS
+from app.services.lesson_normalizer import normalize_schedule
+from app.services.schedule_diff import PreparedGroup, prepare_group, stamp_changes
+from app.services.sync_offload import sync_process_pool
+from app.services.outbox_relay import outbox_relay
+from app.services.snapshot_builder import refresh_snapshots, snapshot_range
 
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
 
+DICTIONARY_MODELS = {"groups": Group, "tutors": Tutor, "auditories": Auditory}
+# Колонки справочников, которые приходят из API ОмГУ (остальные колонки ведет сама синхронизация)
+DICTIONARY_COLUMNS = {
+    "groups": ("name", "real_group_id"),
+    "tutors": ("name",),
+    "auditories": ("name", "building"),
+}
 
-def generate_lesson_hash(lesson_data: dict) -> str:
-    """Генерирует стабильный хэш для объекта занятия."""
-    stable_data = lesson_data.copy()
-    stable_data.pop("id", None)
-    stable_data.pop("publishDate", None)
-    encoded_data = json.dumps(stable_data, sort_keys=True).encode('utf-8')
-    return hashlib.sha256(encoded_data).hexdigest()
+
+def get_sync_window(today: date) -> tuple[date, Optional[date]]:
+    """Окно синхронизации (включительно): занятия вне него синхронизация не трогает."""
+    future_days = settings.SYNC_WINDOW_FUTURE_DAYS
+    return (
+        today - timedelta(days=settings.SYNC_WINDOW_PAST_DAYS),
+        today + timedelta(days=future_days) if future_days is not None else None,
+    )
+
+
+@dataclass
+class SyncStats:
+    """
+    Итоги одного прогона синхронизации расписания.
+    `stage_seconds` - суммарное время по стадиям: fetch (запросы к ОмГУ, идут
+    параллельно, поэтому сумма может превышать общее время), normalize, diff,
+    write, snapshot (пересборка снимков для API) и wait (стадия БД простаивает в ожидании ответа API).
+    """
+    total_groups: int
+    groups_done: int = 0
+    groups_failed: int = 0
+    groups_unchanged: int = 0
+    changes: int = 0
+    lessons_written: int = 0  # только новые и изменившиеся строки lessons
+    lessons_deleted: int = 0
+    # group_id -> количество изменений для успешно обработанных групп
+    changes_by_group: Dict[int, int] = field(default_factory=dict)
+    failed_group_ids: List[int] = field(default_factory=list)
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def add(self, stage: str, seconds: float):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    @property
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def log_summary(self):
+        stages = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in sorted(self.stage_seconds.items()))
+        logger.info(
+            f"Schedule sync finished in {self.wall_seconds:.2f}s: "
+            f"{self.groups_done}/{self.total_groups} groups processed "
+            f"({self.groups_unchanged} unchanged), {self.groups_failed} failed, "
+            f"{self.changes} changes, {self.lessons_written} lessons written, "
+            f"{self.lessons_deleted} deleted. Stages: {stages}."
+        )
 
 
 class SyncService:
-    async def sync_dictionaries(self, db: AsyncSession):
-        """Синхронизирует справочники: группы, преподаватели, аудитории."""
+    @staticmethod
+    def _normalize_dictionary(name: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Оставляет только хранимые колонки и отбрасывает мусорные записи справочника."""
+        if name == "groups":
+            rows = [
+                {"id": g.get("id"), "name": g.get("name"), "real_group_id": g.get("real_group_id")}
+                for g in items if g.get("id") is not None
+            ]
+        elif name == "tutors":
+            rows = [
+                {"id": t.get("id"), "name": t.get("name")}
+                for t in items if t.get("id") is not None and t.get("name") not in ('-', '--', '_')
+            ]
+        else:
+            rows = [
+                {"id": a.get("id"), "name": a.get("name"), "building": a.get("building")}
+                for a in items if a.get("id") is not None
+            ]
+        # ON CONFLICT DO UPDATE не может затронуть одну строку дважды, поэтому убираем дубли id
+        return list({row["id"]: row for row in rows}.values())
+
+    async def _sync_dictionary(self, db: AsyncSession, name: str, items: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Записывает только новые и изменившиеся строки справочника. Возвращает счетчики diff."""
+        model = DICTIONARY_MODELS[name]
+        columns = [c.name for c in model.__table__.columns if c.name in DICTIONARY_COLUMNS[name]]
+        rows = self._normalize_dictionary(name, items)
+
+        result = await db.execute(select(model.id, *[getattr(model, c) for c in columns]))
+        existing = {row[0]: tuple(row[1:]) for row in result}
+        rows_to_write = [row for row in rows if existing.get(row["id"]) != tuple(row[c] for c in columns)]
+        inserted = sum(1 for row in rows_to_write if row["id"] not in existing)
+
+        for start in range(0, len(rows_to_write), UPSERT_CHUNK_ROWS):
+            stmt = insert(model).values(rows_to_write[start:start + UPSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['id'], set_={c: getattr(stmt.excluded, c) for c in columns}
+            )
+            await db.execute(stmt)
+
+        return {
+            "fetched": len(rows), "inserted": inserted,
+            "updated": len(rows_to_write) - inserted, "unchanged": len(rows) - len(rows_to_write),
+        }
+
+    async def sync_dictionaries(self, db: AsyncSession) -> Dict[str, Dict[str, Any]]:
+        """
+        Синхронизирует справочники: группы, преподаватели, аудитории.
+        Все три справочника загружаются параллельно и условно (ETag/Last-Modified
+        или отпечаток тела), а в БД пишутся только отличающиеся строки.
+        Возвращает счетчики diff по каждому справочнику.
+        """
         logger.info("Starting dictionaries sync...")
+        names = list(DICTIONARY_MODELS)
+        dict_stats: Dict[str, Dict[str, Any]] = {}
         try:
-            # Синхронизация групп
-            groups_data = await api_client.get_groups()
-            if groups_data:
-                normalized_groups = [
-                    {"id": g.get("id"), "name": g.get("name"), "real_group_id": g.get("real_group_id")}
-                    for g in groups_data if g.get("id") is not None
-                ]
-                if normalized_groups:
-                    stmt = insert(Group).values(normalized_groups)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=['id'],
-                        set_={'name': stmt.excluded.name, 'real_group_id': stmt.excluded.real_group_id}
-                    )
-                    await db.execute(stmt)
-                    logger.info(f"Synced {len(normalized_groups)} groups.")
-
-            # Синхронизация преподавателей
-            tutors_data = await api_client.get_tutors()
-            if tutors_data:
-                normalized_tutors = [t for t in tutors_data if t.get("id") is not None and t.get("name") not in ('-', '--', '_')]
-                if normalized_tutors:
-                    stmt = insert(Tutor).values(normalized_tutors)
-                    stmt = stmt.on_conflict_do_update(index_elements=['id'], set_={'name': stmt.excluded.name})
-                    await db.execute(stmt)
-                    logger.info(f"Synced {len(normalized_tutors)} tutors.")
-
-            # Синхронизация аудиторий
-            auditories_data = await api_client.get_auditories()
-            if auditories_data:
-                normalized_auditories = [a for a in auditories_data if a.get("id") is not None]
-                if normalized_auditories:
-                    stmt = insert(Auditory).values(normalized_auditories)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=['id'],
-                        set_={'name': stmt.excluded.name, 'building': stmt.excluded.building}
-                    )
-                    await db.execute(stmt)
-                    logger.info(f"Synced {len(normalized_auditories)} auditories.")
-            
+            responses = await asyncio.gather(*(api_client.get_dictionary_if_modified(name) for name in names))
+
+            # Порядок важен только для читаемости логов: внешних ключей между справочниками нет
+            for name, (items, not_modified) in zip(names, responses):
+                if not_modified:
+                    dict_stats[name] = {"status": "not_modified"}
+                elif items is None:
+                    dict_stats[name] = {"status": "failed"}
+                else:
+                    dict_stats[name] = {"status": "synced", **await self._sync_dictionary(db, name, items)}
+                logger.info(f"Dictionary '{name}': {dict_stats[name]}")
+
             await db.commit()
             logger.info("Dictionaries sync finished successfully.")
+            # В кэше и снимках расписаний лежат имена преподавателей, аудиторий и групп
+            if any(stats.get("updated") for stats in dict_stats.values()):
+                await schedule_cache.invalidate_all()
+                await delete_all_snapshots()
         except Exception as e:
             logger.error(f"FATAL error during dictionaries sync: {e}", exc_info=True)
             await db.rollback()
+            # Иначе следующий запуск решит, что справочники не менялись, и не запишет их
+            api_client.reset_dictionary_validators()
+            dict_stats["error"] = {"status": "failed", "message": str(e)}
 
-    async def find_schedule_changes(
-        self, db: AsyncSession, group_id: int, lessons_from_api: List[Dict[str, Any]]
-    ) -> List[ScheduleChange]:
+        await publish_metrics("dictionaries_sync", dict_stats)
+        return dict_stats
+
+    async def _prepare_batch(
+        self,
+        db: AsyncSession,
+        batch: List[tuple],
+        existing_tutor_ids: set[int],
+        existing_auditory_ids: set[int],
+        current_sync_time: datetime,
+        stats: "SyncStats",
+        window: Optional[tuple[date, Optional[date]]] = None,
+    ) -> List[PreparedGroup]:
         """
-        Сравнивает данные из API с данными в БД и возвращает список изменений,
-        произошедших СЕГОДНЯ или В БУДУЩЕМ.
+        Стадия diff для пачки групп `batch` = [(group_id, payload, fingerprint)]: одна
+        выборка состояния БД на всю пачку. `payload` - нормализованные занятия, а при
+        SYNC_PARSE_IN_PROCESS_POOL - сырой ответ API (RawPayload), который разбирается
+        вместе с diff в пуле процессов, не занимая цикл событий.
+        `window` - окно синхронизации, по умолчанию get_sync_window.
         """
-        changes: List[ScheduleChange] = []
         today = date.today()
-        
-        db_lessons_raw = await get_lessons_for_group(db, group_id=group_id)
-        db_lessons = {l.source_id: l for l in db_lessons_raw}
-        
-        api_lessons_map: Dict[int, Dict[str, Any]] = {}
-
-        # 1. Проходим по данным из API (ищем НОВЫЕ и ОБНОВЛЕННЫЕ занятия)
-        for day_data in lessons_from_api:
-            for lesson_api in day_data.get("lessons", []):
-                source_id = lesson_api.get('id')
-                if not source_id: continue
-                
-                try:
-                    lesson_date = datetime.strptime(lesson_api.get('day', ''), "%d.%m.%Y").date()
-                except (ValueError, TypeError):
-                    continue
+        window = window or get_sync_window(today)
+        try:
+            with stats.measure("diff"):
+                db_state = await get_lesson_diff_rows_for_groups(
+                    db, group_ids=[group_id for group_id, _, _ in batch], from_date=window[0], to_date=window[1]
+                )
+                if not sync_process_pool.enabled:
+                    return [
+                        prepare_group(
+                            group_id, api_rows, fingerprint, db_state.get(group_id, {}), today,
+                            existing_tutor_ids, existing_auditory_ids, current_sync_time, window,
+                        )
+                        for group_id, api_rows, fingerprint in batch
+                    ]
+                results = await sync_process_pool.prepare_groups(
+                    [
+                        (group_id, payload.body, fingerprint, db_state.get(group_id, {}))
+                        for group_id, payload, fingerprint in batch
+                    ],
+                    today, existing_tutor_ids, existing_auditory_ids, current_sync_time, window,
+                )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Failed to prepare a batch of {len(batch)} groups: {e}", exc_info=True)
+            stats.groups_failed += len(batch)
+            stats.failed_group_ids.extend(group_id for group_id, _, _ in batch)
+            return []
 
-                if lesson_date < today:
-                    continue # Игнорируем изменения, дата которых уже прошла
+        prepared_groups = []
+        for (group_id, payload, _), prepared in zip(batch, results):
+            api_client.confirm_payload(payload, valid=prepared is not None)
+            if prepared is None:
+                logger.warning(f"API returned an unusable payload for group {group_id}. Skipping.")
+                stats.groups_failed += 1
+                stats.failed_group_ids.append(group_id)
+            else:
+                prepared_groups.append(prepared)
+        return prepared_groups
 
-                api_lessons_map[source_id] = lesson_api
-                lesson_hash = generate_lesson_hash(lesson_api)
+    async def _process_batch(
+        self,
+        db: AsyncSession,
+        batch: List[PreparedGroup],
+        current_sync_time: datetime,
+        stats: "SyncStats",
+    ) -> int:
+        """
+        Стадия записи для подготовленных групп: одна транзакция на все upsert/delete.
+        Возвращает количество найденных изменений.
+        """
+        lessons_to_upsert: List[Dict[str, Any]] = []
+        lessons_to_delete_ids: List[int] = []
+        group_updates: List[Dict[str, Any]] = []
+        changes_by_group: Dict[int, int] = {}
 
-                lesson_after_info = LessonInfo(
-                    source_id=source_id, date=lesson_api.get('day', ''),
-                    time_slot=lesson_api.get('time', 0), subject_name=lesson_api.get('lesson', 'N/A')
+        for prepared in batch:
+            if prepared.changes:
+                logger.info(
+                    f"Found {len(prepared.changes)} changes for group {prepared.group_id} "
+                    f"({len(prepared.delete_ids)} to delete)."
                 )
-                
-                if source_id not in db_lessons:
-                    changes.append(ScheduleChange(change_type="NEW", group_id=group_id, lesson_after=lesson_after_info))
-                elif db_lessons[source_id].content_hash != lesson_hash:
-                    db_lesson = db_lessons[source_id]
-                    lesson_before_info = LessonInfo(
-                        source_id=db_lesson.source_id, date=db_lesson.date.strftime("%d.%m.%Y"),
-                        time_slot=db_lesson.time_slot, subject_name=db_lesson.subject_name
-                    )
-                    changes.append(ScheduleChange(
-                        change_type="UPDATED", group_id=group_id,
-                        lesson_before=lesson_before_info, lesson_after=lesson_after_info
-                    ))
-
-        # 2. Проходим по данным из БД (ищем ОТМЕНЕННЫЕ занятия)
-        for source_id, db_lesson in db_lessons.items():
-            if source_id not in api_lessons_map:
-                if db_lesson.date < today:
-                    continue # Игнорируем отмену занятий, которые уже прошли
-
-                changes.append(ScheduleChange(
-                    change_type="CANCELLED", group_id=group_id,
-                    lesson_before=LessonInfo(
-                        source_id=db_lesson.source_id, date=db_lesson.date.strftime("%d.%m.%Y"),
-                        time_slot=db_lesson.time_slot, subject_name=db_lesson.subject_name
-                    )
-                ))
-        return changes
-
-    async def sync_schedules_for_groups(self, db: AsyncSession, group_ids: list[int]):
+            changes_by_group[prepared.group_id] = len(prepared.changes)
+            lessons_to_upsert.extend(prepared.rows)
+            lessons_to_delete_ids.extend(prepared.delete_ids)
+            # Если занятия были отброшены из-за справочников, отпечаток не сохраняем:
+            # после синхронизации справочников тот же ответ API должен быть применен заново.
+            group_updates.append({
+                "id": prepared.group_id,
+                "schedule_fingerprint": prepared.fingerprint if not prepared.skipped_by_dictionaries else None,
+                "schedule_synced_at": current_sync_time,
+                "schedule_checked_at": current_sync_time,
+            })
+
+        with stats.measure("write"):
+            await write_lessons(db, lessons_to_upsert, lessons_to_delete_ids)
+            await db.execute(update(Group), group_updates)
+            new_versions = await self._bump_schedule_versions(db, batch)
+            # Изменения уходят в outbox в той же транзакции, что и занятия: откат
+            # транзакции откатывает и уведомления, а повторный diff не даст дублей
+            all_changes = await self._stamp_changes(db, batch, new_versions)
+            await add_schedule_changes(db, changes=all_changes)
+            await db.commit()
+        stats.changes_by_group.update(changes_by_group)
+        stats.lessons_written += len(lessons_to_upsert)
+        stats.lessons_deleted += len(lessons_to_delete_ids)
+        # После коммита, иначе читатель успел бы положить в кэш старое расписание
+        await schedule_cache.invalidate_group_days(
+            (prepared.group_id, day) for prepared in batch for day in prepared.affected_dates
+        )
+        await self._refresh_snapshots(db, batch, stats)
+        # После снимков: открытые Mini App сразу перечитают расписание
+        try:
+            await publish_schedule_versions(new_versions)
+        except Exception as e:
+            logger.warning(f"Failed to publish schedule versions of {len(new_versions)} groups: {e}")
+        if all_changes:
+            outbox_relay.notify()
+
+        logger.info(
+            f"Processed {len(batch)} groups ({stats.groups_done + len(batch)}/{stats.total_groups}): "
+            f"Upserted {len(lessons_to_upsert)}, Deleted {len(lessons_to_delete_ids)}."
+        )
+        return len(all_changes)
+
+    @staticmethod
+    async def _bump_schedule_versions(db: AsyncSession, batch: List[PreparedGroup]) -> Dict[int, int]:
+        """
+        Поднимает версию расписания групп, у которых записаны или удалены занятия, и
+        пишет эти занятия в журнал под новой версией - в транзакции записи занятий.
+        Возвращает новые версии {group_id: version}.
+        У каждой версии есть строки в журнале: по ним API отличает пропущенные версии от удаленных очисткой.
+        """
+        changed = [prepared for prepared in batch if prepared.rows or prepared.delete_ids]
+        if not changed:
+            return {}
+        result = await db.execute(
+            update(Group)
+            .where(Group.id.in_([prepared.group_id for prepared in changed]))
+            .values(schedule_version=Group.schedule_version + 1)
+            .returning(Group.id, Group.schedule_version)
+        )
+        versions = {group_id: version for group_id, version in result}
+
+        entries = []
+        for prepared in changed:
+            version = versions[prepared.group_id]
+            # NEW - по состоянию БД, а не по уведомлениям: о прошедших занятиях не уведомляем
+            entries.extend(
+                {
+                    "group_id": prepared.group_id, "version": version, "source_id": row["source_id"],
+                    "change_type": "NEW" if row["source_id"] in prepared.new_source_ids else "UPDATED",
+                }
+                for row in prepared.rows
+            )
+            entries.extend(
+                {"group_id": prepared.group_id, "version": version, "source_id": source_id, "change_type": "CANCELLED"}
+                for source_id in prepared.delete_ids
+            )
+        await add_change_log_entries(db, entries=entries)
+        return versions
+
+    @staticmethod
+    async def _stamp_changes(
+        db: AsyncSession, batch: List[PreparedGroup], new_versions: Dict[int, int]
+    ) -> List[ScheduleChange]:
+        """
+        Изменения пачки с ключами, привязанными к версиям расписания групп. Группа без
+        записанных занятий (новое занятие отброшено справочниками) версию не поднимает -
+        ее изменения получают текущую версию и не повторяются на каждой синхронизации.
+        """
+        versions = dict(new_versions)
+        unversioned = [
+            prepared.group_id for prepared in batch if prepared.changes and prepared.group_id not in versions
+        ]
+        if unversioned:
+            versions.update(await get_group_schedule_versions(db, group_ids=unversioned))
+        all_changes: List[ScheduleChange] = []
+        for prepared in batch:
+            if prepared.changes:
+                all_changes.extend(stamp_changes(prepared.changes, versions.get(prepared.group_id, 0)))
+        return all_changes
+
+    async def _refresh_snapshots(self, db: AsyncSession, batch: List[PreparedGroup], stats: "SyncStats"):
+        """Пересобирает снимки групп пачки, у которых изменились дни из диапазона снимков."""
+        start, end = snapshot_range(date.today())
+        group_ids = [
+            prepared.group_id for prepared in batch
+            if any(start <= day <= end for day in prepared.affected_dates)
+        ]
+        if not group_ids:
+            return
+        try:
+            with stats.measure("snapshot"):
+                await refresh_snapshots(db, group_ids=group_ids)
+                await db.commit()
+        except Exception as e:
+            # Занятия уже закоммичены: снимки пересоберутся по запросу, когда устаревший истечет
+            await db.rollback()
+            logger.error(f"Failed to refresh schedule snapshots for groups {group_ids}: {e}", exc_info=True)
+
+    async def _write_batch_with_fallback(
+        self, db: AsyncSession, batch: List[PreparedGroup], current_sync_time: datetime, stats: "SyncStats"
+    ):
+        """Пишет пачку одной транзакцией, а при ошибке повторяет запись по одной группе."""
+        if not batch:
+            return
+        try:
+            stats.changes += await self._process_batch(db, batch, current_sync_time, stats)
+            stats.groups_done += len(batch)
+            return
+        except Exception as e:
+            await db.rollback()
+            if len(batch) == 1:
+                logger.error(f"Failed to process group_id={batch[0].group_id}: {e}", exc_info=True)
+                stats.groups_failed += 1
+                stats.failed_group_ids.append(batch[0].group_id)
+                return
+            logger.warning(f"Batch of {len(batch)} groups failed ({e}). Retrying group by group.")
+
+        for prepared in batch:
+            await self._write_batch_with_fallback(db, [prepared], current_sync_time, stats)
+
+    async def _sync_batch(
+        self,
+        batch: List[tuple],
+        existing_tutor_ids: set[int],
+        existing_auditory_ids: set[int],
+        current_sync_time: datetime,
+        stats: "SyncStats",
+        window: Optional[tuple[date, Optional[date]]] = None,
+    ):
+        """
+        Стадии diff и записи для одной пачки в собственной короткой сессии: все, что
+        сессия успела загрузить, освобождается вместе с ней, поэтому память воркера не
+        растет с числом групп в прогоне, а соединение не висит в транзакции весь прогон.
+        """
+        async with AsyncSessionLocal() as batch_db:
+            prepared = await self._prepare_batch(
+                batch_db, batch, existing_tutor_ids, existing_auditory_ids, current_sync_time,
+                stats=stats, window=window,
+            )
+            await self._write_batch_with_fallback(batch_db, prepared, current_sync_time, stats)
+
+    async def sync_schedules_for_groups(
+        self,
+        db: AsyncSession,
+        group_ids: list[int],
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        force: bool = False,
+        window: Optional[tuple[date, Optional[date]]] = None,
+        on_progress: Optional[Callable[["SyncStats"], Awaitable[None]]] = None,
+    ) -> "SyncStats":
         """
         Синхронизирует расписание для ЗАДАННОГО списка групп, находит изменения,
         отправляет уведомления, обновляет БД и удаляет отмененные занятия.
+
+        Работает конвейером: до `concurrency` запросов к API ОмГУ выполняются
+        параллельно, а стадии diff и записи в БД разбирают готовые ответы пачками
+        по `batch_size` групп, последовательно и каждая в своей сессии (см. _sync_batch).
+        `db` используется только для чтения справочников и итоговой отметки групп.
+
+        force - применять ответ API, даже если его отпечаток совпадает с сохраненным;
+        window - окно синхронизации вместо get_sync_window (для разовых прогонов из админки);
+        on_progress - вызывается со статистикой после каждых `batch_size` полученных групп.
         """
+        stats = SyncStats(total_groups=len(group_ids))
         if not group_ids:
             logger.info("Received empty list of group_ids to sync. Skipping.")
-            return
+            return stats
 
-        logger.info(f"Starting schedule sync for {len(group_ids)} groups...")
+        concurrency = max(1, concurrency or settings.SYNC_FETCH_CONCURRENCY)
+        batch_size = max(1, batch_size or settings.SYNC_BATCH_SIZE)
+        logger.info(
+            f"Starting schedule sync for {len(group_ids)} groups "
+            f"(fetch concurrency={concurrency}, batch size={batch_size})..."
+        )
         current_sync_time = datetime.now(timezone.utc)
-        
+
         tutors_res = await db.execute(select(Tutor.id))
         existing_tutor_ids = {id for id, in tutors_res}
         auditories_res = await db.execute(select(Auditory.id))
         existing_auditory_ids = {id for id, in auditories_res}
-        
-        for i, group_id in enumerate(group_ids):
-            try:
-                lessons_from_api = await api_client.get_schedule_for_group(group_id)
-                if lessons_from_api is None:
+        stored_fingerprints = await get_group_schedule_fingerprints(db, group_ids=group_ids)
+        # Соединение возвращается в пул: пачки пишутся в своих сессиях
+        await db.commit()
+        unchanged_group_ids: list[int] = []
+        prepare_args = (existing_tutor_ids, existing_auditory_ids, current_sync_time)
+
+        # Очередь ограничена, чтобы быстрые загрузчики не накапливали в памяти
+        # ответы API, пока стадия записи занята.
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=max(concurrency, batch_size))
+        pending_ids = iter(group_ids)
+
+        use_process_pool = sync_process_pool.enabled
+
+        async def fetcher():
+            for group_id in pending_ids:
+                started = time.perf_counter()
+                try:
+                    if use_process_pool:
+                        # JSON разбирается в пуле процессов вместе с diff
+                        payload = await api_client.get_schedule_payload_for_group(group_id)
+                        fingerprint = payload.fingerprint if payload is not None else None
+                    else:
+                        payload, fingerprint = await api_client.get_schedule_for_group_with_fingerprint(group_id)
+                except Exception as e:
+                    logger.error(f"Failed to fetch schedule for group_id={group_id}: {e}", exc_info=True)
+                    payload, fingerprint = None, None
+                stats.add("fetch", time.perf_counter() - started)
+                await fetched.put((group_id, payload, fingerprint))
+
+        fetchers = [asyncio.create_task(fetcher()) for _ in range(min(concurrency, len(group_ids)))]
+        batch: List[tuple] = []
+        try:
+            for received in range(1, len(group_ids) + 1):
+                with stats.measure("wait"):
+                    group_id, payload, fingerprint = await fetched.get()
+                if window is not None:
+                    # Ответ применяется только в заданном окне: отпечаток не сохраняем и не сверяем
+                    fingerprint = None
+
+                if payload is None:
                     logger.warning(f"API returned an error for group {group_id}. Skipping.")
-                    continue
-
-                changes = await self.find_schedule_changes(db, group_id, lessons_from_api)
-                
-                lessons_to_delete_ids = []
-                if changes:
-                    await push_changes_to_queue(changes)
-                    lessons_to_delete_ids = [c.lesson_before.source_id for c in changes if c.change_type == "CANCELLED" and c.lesson_before]
-                    logger.info(f"Found {len(changes)} changes for group {group_id} ({len(lessons_to_delete_ids)} to delete). Pushing to queue.")
-
-                lessons_to_upsert = []
-                if lessons_from_api:
-                    for day_data in lessons_from_api:
-                        for lesson_api in day_data.get("lessons", []):
-                            source_id, teacher_id, auditory_id, day_str, lesson_id = (
-                                lesson_api.get('id'), lesson_api.get('teacher_id'),
-                                lesson_api.get('auditory_id'), lesson_api.get('day'),
-                                lesson_api.get('lesson_id')
-                            )
-                            if not all([source_id, teacher_id, auditory_id, day_str, lesson_id]): continue
-                            if teacher_id not in existing_tutor_ids: continue
-                            if auditory_id not in existing_auditory_ids: continue
-                            
-                            lessons_to_upsert.append({
-                                "source_id": source_id, "lesson_id": lesson_id,
-                                "date": datetime.strptime(day_str, "%d.%m.%Y").date(),
-                                "time_slot": lesson_api.get('time', 0), "subgroup_name": lesson_api.get('subgroupName'),
-                                "subject_name": lesson_api.get('lesson', 'N/A'), "lesson_type": lesson_api.get('type_work', 'N/A'),
-                                "content_hash": generate_lesson_hash(lesson_api), "last_seen_at": current_sync_time,
-                                "group_id": group_id, "tutor_id": teacher_id, "auditory_id": auditory_id
-                            })
-                
-                if lessons_to_upsert:
-                    stmt = insert(Lesson).values(lessons_to_upsert)
-                    update_dict = {c.name: getattr(stmt.excluded, c.name) for c in Lesson.__table__.columns if not c.primary_key}
-                    stmt = stmt.on_conflict_do_update(index_elements=['source_id'], set_=update_dict)
-                    await db.execute(stmt)
-                
-                if lessons_to_delete_ids:
-                    delete_stmt = delete(Lesson).where(Lesson.source_id.in_(lessons_to_delete_ids))
-                    await db.execute(delete_stmt)
-                
-                if lessons_to_upsert or lessons_to_delete_ids:
-                    await db.commit()
-                
-                logger.info(f"Processed group {group_id} ({i+1}/{len(group_ids)}): Upserted {len(lessons_to_upsert)}, Deleted {len(lessons_to_delete_ids)}.")
-
-            except Exception as e:
-                logger.error(f"Failed to process group_id={group_id}: {e}", exc_info=True)
-                await db.rollback()
+                    stats.groups_failed += 1
+                    stats.failed_group_ids.append(group_id)
+                elif not force and fingerprint and stored_fingerprints.get(group_id) == fingerprint:
+                    # Ответ API байт в байт совпадает с уже примененным - diff и запись не нужны
+                    if use_process_pool:
+                        api_client.confirm_payload(payload, valid=True)
+                    unchanged_group_ids.append(group_id)
+                    stats.changes_by_group[group_id] = 0
+                    stats.groups_unchanged += 1
+                    stats.groups_done += 1
+                elif use_process_pool:
+                    batch.append((group_id, payload, fingerprint))
+                else:
+                    with stats.measure("normalize"):
+                        api_rows = normalize_schedule(payload)
+                    batch.append((group_id, api_rows, fingerprint))
+
+                if batch and (len(batch) >= batch_size or received == len(group_ids)):
+                    await self._sync_batch(batch, *prepare_args, stats=stats, window=window)
+                    batch = []
+                if on_progress is not None and (received % batch_size == 0 or received == len(group_ids)):
+                    await on_progress(stats)
+        finally:
+            for task in fetchers:
+                task.cancel()
+            await asyncio.gather(*fetchers, return_exceptions=True)
+
+        if unchanged_group_ids:
+            # Вместо обновления last_seen_at у каждого занятия отмечаем проверку на уровне группы
+            with stats.measure("write"):
+                await db.execute(
+                    update(Group)
+                    .where(Group.id.in_(unchanged_group_ids))
+                    .values(schedule_checked_at=current_sync_time)
+                )
+                await db.commit()
+
+        stats.log_summary()
+        logger.info(f"OMSU client stats: {api_client.get_stats()}")
+        return stats
 
     async def cleanup_old_lessons(self, db: AsyncSession):
-        """Удаляет занятия, которые не были видны в течение последних 3 дней."""
+        """
+        Удаляет занятия групп, которые не проверялись последние 3 дня (группа пропала
+        из справочника или перестала синхронизироваться). Занятия окна синхронизации,
+        исчезнувшие из ответа API, синхронизация удаляет сама, а неизменившиеся и
+        замороженные (вне окна) строки не перезаписывает,
+        поэтому last_seen_at - время последней записи, а "видимость" занятия
+        определяется проверкой группы (schedule_checked_at).
+        """
         logger.info("Starting old lessons cleanup task...")
         three_days_ago = datetime.now(timezone.utc) - timedelta(days=3)
-        stmt = delete(Lesson).where(Lesson.last_seen_at < three_days_ago)
+        group_checked_recently = exists().where(
+            Group.id == Lesson.group_id,
+            Group.schedule_checked_at >= three_days_ago,
+        )
+        stmt = delete(Lesson).where(Lesson.last_seen_at < three_days_ago, ~group_checked_recently)
         result = await db.execute(stmt)
         await db.commit()
         logger.info(f"Cleaned up {result.rowcount} old lesson entries.")
 
+    async def cleanup_change_log(self, db: AsyncSession):
+        """
+        Удаляет журнал изменений старше SCHEDULE_CHANGE_LOG_RETENTION_DAYS. Клиенты
+        с более старой версией получат от /schedule/my/changes full_refresh.
+        """
+        before = datetime.now(timezone.utc) - timedelta(days=settings.SCHEDULE_CHANGE_LOG_RETENTION_DAYS)
+        deleted = await delete_change_log_before(db, before=before)
+        await db.commit()
+        logger.info(f"Cleaned up {deleted} schedule change log entries.")
+
 sync_service = SyncService()
\ No newline at end of file
@@ -0,0 +1,235 @@
+# app/services/sync_shards.py
+
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.queue import redis_client
+
+logger = logging.getLogger(__name__)
+
+SHARD_LEASE_KEY = "sync_shard_lease:{shard}"
+SYNC_WORKERS_KEY = "sync_workers"  # sorted set: worker_id -> время последнего heartbeat
+FULL_SYNC_REQUEST_KEY = "sync_full_run"  # ID последнего запрошенного полного прогона
+FULL_SYNC_DONE_KEY = "sync_full_run_done:{run_id}"  # hash: шард -> воркер, который его прошел
+FULL_SYNC_TTL_SECONDS = 24 * 3600
+
+# Продлеваем и освобождаем аренду только если она все еще наша
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# Шард отмечается пройденным, только если его аренда все еще у этого воркера: иначе
+# шард уже подхватил другой воркер, и он пройдет его сам
+_MARK_DONE_LUA = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('hset', KEYS[2], ARGV[2], ARGV[1])
+redis.call('expire', KEYS[2], ARGV[3])
+return 1
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def shard_of(group_id: int, shard_count: int) -> int:
+    return group_id % shard_count
+
+
+class ShardLeaseManager:
+    """
+    Делит группы на SYNC_SHARD_COUNT шардов и распределяет их между процессами
+    воркера через аренды в Redis (SET NX PX). Каждый воркер раз в треть TTL
+    продлевает свои аренды, регистрирует себя в SYNC_WORKERS_KEY и добирает
+    свободные шарды до своей доли ceil(шардов / живых воркеров), отдавая лишние,
+    когда воркеров становится больше. Шарды упавшего воркера освобождаются по TTL
+    и подхватываются остальными на ближайшем heartbeat.
+
+    Без SYNC_SHARDING_ENABLED процесс считается владельцем всех шардов, и
+    синхронизация работает как раньше, в одном воркере.
+    """
+
+    def __init__(self):
+        self.enabled = settings.SYNC_SHARDING_ENABLED
+        self.shard_count = max(1, settings.SYNC_SHARD_COUNT)
+        self.lease_ttl = settings.SYNC_SHARD_LEASE_TTL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.owned: Set[int] = set() if self.enabled else set(range(self.shard_count))
+        # Вызывается с ID прогона, когда кто-то запросил полную синхронизацию всех шардов
+        self.on_full_sync_requested: Optional[Callable[[str], None]] = None
+
+        self._renew = redis_client.register_script(_RENEW_LUA)
+        self._release = redis_client.register_script(_RELEASE_LUA)
+        self._mark_done = redis_client.register_script(_MARK_DONE_LUA)
+        self._last_heartbeat_ok = time.monotonic()
+        self._seen_full_sync_run: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def owns(self, group_id: int) -> bool:
+        return shard_of(group_id, self.shard_count) in self.owned
+
+    def owned_group_ids(self, group_ids: List[int]) -> List[int]:
+        return [group_id for group_id in group_ids if self.owns(group_id)]
+
+    def shard_group_ids(self, shard: int, group_ids: List[int]) -> List[int]:
+        return [group_id for group_id in group_ids if shard_of(group_id, self.shard_count) == shard]
+
+    @staticmethod
+    def _lease_key(shard: int) -> str:
+        return SHARD_LEASE_KEY.format(shard=shard)
+
+    async def heartbeat(self):
+        now = time.time()
+        ttl_ms = int(self.lease_ttl * 1000)
+
+        async with redis_client.pipeline() as pipe:
+            pipe.zadd(SYNC_WORKERS_KEY, {self.worker_id: now})
+            pipe.zremrangebyscore(SYNC_WORKERS_KEY, "-inf", now - self.lease_ttl)
+            pipe.zcard(SYNC_WORKERS_KEY)
+            pipe.get(FULL_SYNC_REQUEST_KEY)
+            _, _, live_workers, full_sync_run = await pipe.execute()
+
+        for shard in list(self.owned):
+            if not await self._renew(keys=[self._lease_key(shard)], args=[self.worker_id, ttl_ms]):
+                self.owned.discard(shard)
+                logger.warning(f"Lost lease on sync shard {shard}.")
+
+        target = math.ceil(self.shard_count / max(1, live_workers))
+        # Отдаем лишние шарды, чтобы новый воркер получил свою долю
+        while len(self.owned) > target:
+            shard = max(self.owned)
+            await self._release(keys=[self._lease_key(shard)], args=[self.worker_id])
+            self.owned.discard(shard)
+
+        if len(self.owned) < target:
+            candidates = [shard for shard in range(self.shard_count) if shard not in self.owned]
+            # Случайный порядок, чтобы воркеры не бились за одни и те же шарды
+            random.shuffle(candidates)
+            for shard in candidates:
+                if await redis_client.set(self._lease_key(shard), self.worker_id, nx=True, px=ttl_ms):
+                    self.owned.add(shard)
+                    if len(self.owned) >= target:
+                        break
+
+        self._last_heartbeat_ok = time.monotonic()
+
+        if full_sync_run and full_sync_run != self._seen_full_sync_run:
+            self._seen_full_sync_run = full_sync_run
+            if self.on_full_sync_requested is not None:
+                self.on_full_sync_requested(full_sync_run)
+
+    async def _run(self):
+        interval = self.lease_ttl / 3
+        while True:
+            try:
+                await self.heartbeat()
+            except redis.RedisError as e:
+                logger.error(f"Shard heartbeat failed: {e}")
+                # Без продления аренды дольше TTL шарды уже могут принадлежать другим воркерам
+                if self.owned and time.monotonic() - self._last_heartbeat_ok > self.lease_ttl:
+                    logger.warning(f"Dropping {len(self.owned)} sync shards: leases have expired.")
+                    self.owned.clear()
+            await asyncio.sleep(interval)
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        # Запоминаем уже идущий прогон, чтобы перезапуск воркера не запускал его повторно
+        try:
+            self._seen_full_sync_run = await redis_client.get(FULL_SYNC_REQUEST_KEY)
+        except redis.RedisError:
+            pass
+        self._task = asyncio.create_task(self._run(), name="ShardHeartbeat")
+        logger.info(f"Sync sharding enabled: worker {self.worker_id}, {self.shard_count} shards.")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Отпускаем аренды сразу, не дожидаясь TTL
+        try:
+            async with redis_client.pipeline() as pipe:
+                for shard in self.owned:
+                    self._release(keys=[self._lease_key(shard)], args=[self.worker_id], client=pipe)
+                pipe.zrem(SYNC_WORKERS_KEY, self.worker_id)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release sync shards: {e}")
+        self.owned.clear()
+
+    async def request_full_sync(self, run_id: Optional[str] = None) -> str:
+        """
+        Запрашивает полную синхронизацию всех групп. Без шардирования прогон запускается
+        сразу в этом процессе, иначе его увидят все воркеры на ближайшем heartbeat.
+        """
+        run_id = run_id or f"manual:{int(time.time())}"
+        if not self.enabled:
+            if self.on_full_sync_requested is not None:
+                self.on_full_sync_requested(run_id)
+            return run_id
+        await redis_client.set(FULL_SYNC_REQUEST_KEY, run_id, ex=FULL_SYNC_TTL_SECONDS)
+        return run_id
+
+    async def next_pending_shard(
+        self, run_id: str, stop: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Optional[int]:
+        """
+        Следующий шард прогона run_id для этого воркера: сначала свои, затем шарды без
+        аренды (их воркер упал). Пока другие воркеры проходят свои шарды, ждет: их аренда
+        может истечь, и тогда шард нужно пройти здесь. None - все шарды прогона пройдены,
+        прогон заменен новым или, пока ждали, stop() вернул истину.
+        """
+        done_key = FULL_SYNC_DONE_KEY.format(run_id=run_id)
+        ttl_ms = int(self.lease_ttl * 1000)
+        while True:
+            done = await redis_client.hgetall(done_key)
+            pending = [shard for shard in range(self.shard_count) if str(shard) not in done]
+            if not pending:
+                return None
+            for shard in pending:
+                if shard in self.owned:
+                    return shard
+            for shard in pending:
+                if await redis_client.set(self._lease_key(shard), self.worker_id, nx=True, px=ttl_ms):
+                    logger.info(f"Full sync run {run_id}: took over orphaned shard {shard}.")
+                    self.owned.add(shard)
+                    return shard
+            if await redis_client.get(FULL_SYNC_REQUEST_KEY) != run_id:
+                return None
+            if stop is not None and await stop():
+                return None
+            await asyncio.sleep(self.lease_ttl / 3)
+
+    async def mark_shard_done(self, run_id: str, shard: int) -> bool:
+        """Отмечает шард пройденным. False - аренду шарда за время прохода забрал другой воркер."""
+        done = await self._mark_done(
+            keys=[self._lease_key(shard), FULL_SYNC_DONE_KEY.format(run_id=run_id)],
+            args=[self.worker_id, str(shard), FULL_SYNC_TTL_SECONDS],
+        )
+        if not done:
+            self.owned.discard(shard)
+            logger.warning(f"Full sync run {run_id}: lost lease on shard {shard} before it was marked done.")
+        return bool(done)
+
+shard_manager = ShardLeaseManager()
@@ -0,0 +1,143 @@
+# app/services/user_activity.py
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.queue import redis_client
+from app.crud.crud_schedule import get_group_last_activity
+from app.crud.crud_user import touch_users_last_active
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Sorted set: member - ID группы, score - unix-время последнего захода кого-то из ее пользователей
+HOT_GROUPS_KEY = "hot_groups"
+# Отметка о том, что HOT_GROUPS_KEY восстановлен из БД: служебный член того же sorted set
+# со score +inf (его не вычищает окно). flush() создает ключ заново после рестарта Redis
+# или вытеснения, но отметки в нем уже нет - значит, нужно восстановление.
+HOT_GROUPS_REBUILT_MEMBER = "rebuilt"
+
+
+class UserActivityTracker:
+    """
+    Копит обращения пользователей в памяти и раз в USER_ACTIVITY_FLUSH_SECONDS
+    пишет их одной пачкой: один UPDATE users.last_active_at и один ZADD в
+    HOT_GROUPS_KEY. Повторные обращения одного пользователя чаще
+    USER_ACTIVITY_TOUCH_INTERVAL_SECONDS не записываются вовсе, поэтому
+    touch() можно вызывать на каждый запрос и каждое сообщение боту.
+    """
+
+    def __init__(self):
+        self.flush_interval = settings.USER_ACTIVITY_FLUSH_SECONDS
+        self.touch_interval = settings.USER_ACTIVITY_TOUCH_INTERVAL_SECONDS
+        self._pending: Set[int] = set()
+        # telegram_id -> monotonic-время последней записи, для троттлинга
+        self._recorded_at: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, telegram_id: int):
+        """Отмечает обращение пользователя. Синхронный и без ввода-вывода."""
+        now = time.monotonic()
+        recorded_at = self._recorded_at.get(telegram_id)
+        if recorded_at is not None and now - recorded_at < self.touch_interval:
+            return
+        self._recorded_at[telegram_id] = now
+        self._pending.add(telegram_id)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        telegram_ids, self._pending = list(self._pending), set()
+
+        # Записи старше интервала троттлинга больше не нужны: память не растет с числом пользователей
+        cutoff = time.monotonic() - self.touch_interval
+        self._recorded_at = {uid: ts for uid, ts in self._recorded_at.items() if ts >= cutoff}
+
+        active_at = datetime.now(timezone.utc)
+        try:
+            async with AsyncSessionLocal() as session:
+                group_ids = await touch_users_last_active(
+                    session, telegram_ids=telegram_ids, active_at=active_at
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to flush activity of {len(telegram_ids)} users: {e}", exc_info=True)
+            # Вернем пользователей в очередь: обновление будет в следующей пачке
+            self._pending.update(telegram_ids)
+            return
+
+        if group_ids:
+            try:
+                # GT: score только растет, даже если пачки разных процессов придут не по порядку
+                await redis_client.zadd(
+                    HOT_GROUPS_KEY, {group_id: active_at.timestamp() for group_id in group_ids}, gt=True
+                )
+            except redis.RedisError as e:
+                logger.warning(f"Failed to update hot groups in Redis: {e}")
+        logger.debug(f"Flushed activity of {len(telegram_ids)} users ({len(set(group_ids))} groups).")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="UserActivityFlusher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+async def _rebuild_hot_groups(db: AsyncSession, active_since: datetime) -> List[int]:
+    """Восстанавливает HOT_GROUPS_KEY из users.last_active_at (пустой или сброшенный Redis)."""
+    last_activity = await get_group_last_activity(db, active_since=active_since)
+    async with redis_client.pipeline() as pipe:
+        if last_activity:
+            pipe.zadd(
+                HOT_GROUPS_KEY, {group_id: ts.timestamp() for group_id, ts in last_activity.items()}, gt=True
+            )
+        pipe.zadd(HOT_GROUPS_KEY, {HOT_GROUPS_REBUILT_MEMBER: "+inf"})
+        pipe.zrange(HOT_GROUPS_KEY, 0, -1)
+        *_, members = await pipe.execute()
+    # Вместе с группами, отмеченными flush() между запросом к БД и записью
+    return [int(member) for member in members if member != HOT_GROUPS_REBUILT_MEMBER]
+
+
+async def get_hot_group_ids(db: AsyncSession) -> List[int]:
+    """
+    Группы, в которых кто-то заходил за последние HOT_GROUP_WINDOW_DAYS дней.
+    Читается из sorted set в Redis; если он не восстанавливался из БД после потери
+    (нет HOT_GROUPS_REBUILT_MEMBER), сначала восстанавливается. При недоступности Redis - из БД.
+    """
+    active_since = datetime.now(timezone.utc) - timedelta(days=settings.HOT_GROUP_WINDOW_DAYS)
+    try:
+        async with redis_client.pipeline() as pipe:
+            pipe.zscore(HOT_GROUPS_KEY, HOT_GROUPS_REBUILT_MEMBER)
+            # Заодно вычищаем группы, выпавшие из окна
+            pipe.zremrangebyscore(HOT_GROUPS_KEY, "-inf", f"({active_since.timestamp()}")
+            pipe.zrange(HOT_GROUPS_KEY, 0, -1)
+            rebuilt, _, members = await pipe.execute()
+        if rebuilt is None:
+            return await _rebuild_hot_groups(db, active_since)
+        return [int(member) for member in members if member != HOT_GROUPS_REBUILT_MEMBER]
+    except redis.RedisError as e:
+        logger.warning(f"Hot groups are unavailable in Redis ({e}), reading them from the database.")
+        return list(await get_group_last_activity(db, active_since=active_since))
+
+
+user_activity = UserActivityTracker()
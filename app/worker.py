@@ -1,23 +1,88 @@
 # app/worker.py
 
+import asyncio
+import functools
 import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import redis.asyncio as redis
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.db.session import AsyncSessionLocal
-from app.services.sync_service import sync_service
-from app.crud.crud_schedule import get_all_groups_ids, get_active_user_group_ids
+from app.services.sync_service import SyncStats, get_sync_window, sync_service
+from app.services.sync_scheduler import sync_scheduler
+from app.services.user_activity import get_hot_group_ids
+from app.services.sync_shards import shard_manager
+from app.core.config import settings
+from app.core.metrics import publish_metrics
+from app.core.job_lock import WORKER_ID, JobLock, running_jobs, single_flight
+from app.core.sync_jobs import update_sync_job
+from app.crud.crud_schedule import get_all_groups_ids, get_existing_group_ids, get_group_ids_for_tutors
 from app.crud.crud_schedule import get_lessons_starting_soon
 from app.core.queue import push_reminders_to_queue
 # Настраиваем логгер
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Создаем асинхронный планировщик с временной зоной Омска
-scheduler = AsyncIOScheduler(timezone="Asia/Omsk")
+# Создаем асинхронный планировщик с временной зоной Омска.
+# Пропущенные срабатывания одной задачи сливаются в одно, и внутри процесса она не идет дважды;
+# между процессами и с ручными запусками задачи разводит single_flight (Redis).
+scheduler = AsyncIOScheduler(
+    timezone="Asia/Omsk",
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 60},
+)
+
+# Все виды синхронизации расписания (адаптивная, горячая, полная, холодная) идут под одной
+# блокировкой: ручной запуск во время планового не синхронизирует те же группы второй раз.
+# В режиме шардирования каждый воркер синхронизирует свои шарды, поэтому блокировка своя у воркера.
+SCHEDULE_SYNC_LOCK = "schedule_sync" + (f":{shard_manager.worker_id}" if shard_manager.enabled else "")
+# Разовая синхронизация из админки трогает группы любых шардов. В режиме шардирования она
+# берет общую блокировку и ждет, пока воркеры закончат свои синхронизации, а они, пока она
+# держится, пропускают свои (см. _yield_to_targeted_sync). Без шардирования это та же блокировка.
+TARGETED_SYNC_LOCK = "schedule_sync"
+TARGETED_SYNC_WAIT_SECONDS = 15 * 60
+
+
+async def _targeted_sync_worker() -> Optional[str]:
+    """Воркер, на котором идет разовая синхронизация (только в режиме шардирования), или None."""
+    if not shard_manager.enabled:
+        return None
+    try:
+        holder = await JobLock(TARGETED_SYNC_LOCK).holder()
+    except redis.RedisError:
+        return None
+    return holder.split("|", 1)[0] if holder else None
+
+
+def _yield_to_targeted_sync(func):
+    """
+    Для синхронизаций шардов (под SCHEDULE_SYNC_LOCK воркера): пропускает запуск, пока
+    идет разовая синхронизация, иначе оба сравнили бы одни группы с одним состоянием БД
+    и записали бы в outbox одни и те же изменения дважды.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if targeted_worker := await _targeted_sync_worker():
+            logger.info(f"Skipping {func.__name__}: targeted schedule sync is running on {targeted_worker}.")
+            return None
+        return await func(*args, **kwargs)
+    return wrapper
+
+
+async def _wait_for_shard_syncs(timeout: float) -> bool:
+    """Ждет, пока воркеры закончат уже начатые синхронизации шардов. False - не дождались."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while running := await running_jobs("schedule_sync:"):
+        if asyncio.get_running_loop().time() >= deadline:
+            logger.warning(f"Shard syncs are still running: {running}.")
+            return False
+        await asyncio.sleep(1)
+    return True
 
 
 # --- Определения задач (Jobs) ---
 
+@single_flight("dict_sync", hold_for=60)
 async def run_dict_sync():
     """Асинхронная задача для синхронизации справочников."""
     logger.info("--- [JOB START] Dictionaries Sync ---")
@@ -29,12 +94,15 @@ async def run_dict_sync():
         logger.error(f"--- [JOB FAILED] Dictionaries Sync: {e} ---", exc_info=True)
 
 
+@single_flight(SCHEDULE_SYNC_LOCK)
+@_yield_to_targeted_sync
 async def run_hot_schedule_sync():
-    """Синхронизирует расписание для 'горячих' групп (с активными пользователями)."""
+    """Синхронизирует расписание для 'горячих' групп (где кто-то заходил за HOT_GROUP_WINDOW_DAYS)."""
     logger.info("--- [JOB START] HOT Schedule Sync (for active user groups) ---")
     try:
         async with AsyncSessionLocal() as session:
-            hot_group_ids = await get_active_user_group_ids(session)
+            # В режиме шардирования каждый воркер берет только группы своих шардов
+            hot_group_ids = shard_manager.owned_group_ids(await get_hot_group_ids(session))
             if not hot_group_ids:
                 logger.info("No active user groups to sync. Skipping HOT sync.")
                 return
@@ -46,16 +114,162 @@ async def run_hot_schedule_sync():
         logger.error(f"--- [JOB FAILED] HOT Schedule Sync: {e} ---", exc_info=True)
 
 
+@single_flight(SCHEDULE_SYNC_LOCK)
+@_yield_to_targeted_sync
+async def run_adaptive_schedule_sync():
+    """
+    Тик адаптивного планировщика: синхронизирует группы, которым подошла очередь.
+    Интервал каждой группы зависит от частоты изменений, числа пользователей и близости занятий.
+    """
+    stats = None
+    group_ids = []
+    try:
+        async with AsyncSessionLocal() as session:
+            if sync_scheduler.needs_refresh():
+                await sync_scheduler.refresh(session)
+            # В режиме шардирования каждый воркер берет только группы своих шардов
+            group_ids = sync_scheduler.pop_due(owns=shard_manager.owns if shard_manager.enabled else None)
+            if not group_ids:
+                return
+            logger.info(f"--- [JOB START] Adaptive Schedule Sync ({len(group_ids)} due groups) ---")
+            stats = await sync_service.sync_schedules_for_groups(session, group_ids=group_ids)
+        logger.info("--- [JOB SUCCESS] Adaptive Schedule Sync ---")
+    except Exception as e:
+        logger.error(f"--- [JOB FAILED] Adaptive Schedule Sync: {e} ---", exc_info=True)
+    finally:
+        # Группы возвращаются в очередь даже при падении, иначе они выпали бы из планировщика
+        if group_ids:
+            sync_scheduler.record_results(group_ids, stats)
+            await publish_metrics("adaptive_sync", sync_scheduler.get_stats())
+
+
+# Разовый запуск: если идет тик адаптивной синхронизации, дожидаемся его, а не пропускаем прогон
+@single_flight(SCHEDULE_SYNC_LOCK, wait=15 * 60)
+async def run_full_schedule_sync(run_id: str):
+    """
+    Полная синхронизация всех групп. В режиме шардирования каждый воркер проходит
+    свои шарды, отмечая их в Redis, и не завершается, пока в прогоне есть непройденные
+    шарды: шарды упавшего воркера он подхватит, когда истечет их аренда.
+    """
+    if await _targeted_sync_worker():
+        # Шарды прогона нельзя просто пропустить: повторим, когда разовая синхронизация закончится
+        logger.info(f"Full sync run {run_id} postponed: targeted schedule sync is running.")
+        _start_full_schedule_sync(run_id, delay=60)
+        return
+    logger.info(f"--- [JOB START] Full Schedule Sync (run {run_id}) ---")
+    try:
+        async with AsyncSessionLocal() as session:
+            all_ids = await get_all_groups_ids(session)
+            if not shard_manager.enabled:
+                await sync_service.sync_schedules_for_groups(session, group_ids=all_ids)
+            else:
+                shards_done = 0
+                # Ожидая чужие шарды, уступаем разовой синхронизации: она ждет, пока мы отпустим блокировку
+                while (shard := await shard_manager.next_pending_shard(run_id, stop=_targeted_sync_worker)) is not None:
+                    group_ids = shard_manager.shard_group_ids(shard, all_ids)
+                    if group_ids:
+                        await sync_service.sync_schedules_for_groups(session, group_ids=group_ids)
+                    if await shard_manager.mark_shard_done(run_id, shard):
+                        shards_done += 1
+                if await _targeted_sync_worker():
+                    logger.info(f"Full sync run {run_id} postponed: targeted schedule sync is running.")
+                    _start_full_schedule_sync(run_id, delay=60)
+                logger.info(f"Full sync run {run_id}: {shards_done} shards processed by this worker.")
+        logger.info("--- [JOB SUCCESS] Full Schedule Sync ---")
+    except Exception as e:
+        logger.error(f"--- [JOB FAILED] Full Schedule Sync: {e} ---", exc_info=True)
+
+
+def _start_full_schedule_sync(run_id: str, delay: float = 0):
+    run_date = datetime.now(timezone.utc) + timedelta(seconds=delay) if delay else None
+    scheduler.add_job(
+        run_full_schedule_sync, 'date', run_date=run_date, args=[run_id], id='full_schedule_sync', replace_existing=True
+    )
+
+
+shard_manager.on_full_sync_requested = _start_full_schedule_sync
+
+
+@single_flight("schedule_sync_full_cron", hold_for=300)
+async def run_full_schedule_sync_cron():
+    """Ежедневный полный прогон: ID один на всех воркеров, поэтому каждый шард проходится один раз."""
+    await shard_manager.request_full_sync(run_id=f"cron:{date.today().isoformat()}")
+
+
+# Разовые синхронизации из админки (см. app/core/sync_jobs.py)
+TARGETED_SYNC_COMMANDS = ("sync_groups", "sync_tutor_groups", "sync_date_window")
+
+
+def _sync_job_progress(stats: SyncStats) -> Dict[str, Any]:
+    return {
+        "total_groups": stats.total_groups, "groups_done": stats.groups_done,
+        "groups_failed": stats.groups_failed, "groups_unchanged": stats.groups_unchanged,
+        "changes": stats.changes, "failed_group_ids": stats.failed_group_ids,
+    }
+
+
+@single_flight(TARGETED_SYNC_LOCK, wait=TARGETED_SYNC_WAIT_SECONDS)
+async def _run_targeted_schedule_sync_locked(job_id: str, command: str, params: Dict[str, Any]) -> Optional[bool]:
+    if shard_manager.enabled and not await _wait_for_shard_syncs(TARGETED_SYNC_WAIT_SECONDS):
+        return None
+    await update_sync_job(job_id, status="running", started_at=datetime.now(timezone.utc).isoformat(), worker=WORKER_ID)
+    try:
+        window = None
+        async with AsyncSessionLocal() as session:
+            if command == "sync_groups":
+                group_ids = await get_existing_group_ids(session, group_ids=params["group_ids"])
+            elif command == "sync_tutor_groups":
+                window_start = get_sync_window(date.today())[0]
+                group_ids = await get_group_ids_for_tutors(session, tutor_ids=params["tutor_ids"], from_date=window_start)
+            else:
+                window = (date.fromisoformat(params["date_from"]), date.fromisoformat(params["date_to"]))
+                if params.get("group_ids"):
+                    group_ids = await get_existing_group_ids(session, group_ids=params["group_ids"])
+                else:
+                    group_ids = await get_all_groups_ids(session)
+            await update_sync_job(job_id, total_groups=len(group_ids))
+
+            async def report(stats: SyncStats):
+                await update_sync_job(job_id, **_sync_job_progress(stats))
+
+            # Администратор просит обновить группы, значит, совпадение отпечатка ответа не повод пропускать
+            stats = await sync_service.sync_schedules_for_groups(
+                session, group_ids=group_ids, force=True, window=window, on_progress=report
+            )
+        await update_sync_job(
+            job_id, status="done", finished_at=datetime.now(timezone.utc).isoformat(), **_sync_job_progress(stats)
+        )
+    except Exception as e:
+        logger.error(f"--- [JOB FAILED] Targeted Schedule Sync {job_id}: {e} ---", exc_info=True)
+        await update_sync_job(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc).isoformat())
+    return True
+
+
+async def run_targeted_schedule_sync(job_id: str, command: str, params: Dict[str, Any]):
+    """
+    Синхронизация выбранных групп по команде из админки: списка групп (sync_groups),
+    групп преподавателей (sync_tutor_groups) или всех/выбранных групп в окне дат
+    (sync_date_window). Прогресс пишется в Redis под job_id.
+    """
+    logger.info(f"--- [JOB START] Targeted Schedule Sync {job_id} ({command}) ---")
+    ran = await _run_targeted_schedule_sync_locked(job_id, command, params)
+    if ran is None:
+        # Синхронизация расписания так и не освободилась за время ожидания
+        await update_sync_job(job_id, status="skipped", finished_at=datetime.now(timezone.utc).isoformat())
+
+
+@single_flight(SCHEDULE_SYNC_LOCK)
+@_yield_to_targeted_sync
 async def run_cold_schedule_sync():
     """Синхронизирует расписание для всех остальных ('холодных') групп."""
     logger.info("--- [JOB START] COLD Schedule Sync (for all other groups) ---")
     try:
         async with AsyncSessionLocal() as session:
             all_ids = set(await get_all_groups_ids(session))
-            hot_ids = set(await get_active_user_group_ids(session))
+            hot_ids = set(await get_hot_group_ids(session))
             
             # Вычисляем разницу множеств, чтобы получить "холодные" группы
-            cold_group_ids = list(all_ids - hot_ids)
+            cold_group_ids = shard_manager.owned_group_ids(list(all_ids - hot_ids))
             
             if not cold_group_ids:
                 logger.info("No cold groups to sync. Skipping COLD sync.")
@@ -67,17 +281,20 @@ async def run_cold_schedule_sync():
         logger.error(f"--- [JOB FAILED] COLD Schedule Sync: {e} ---", exc_info=True)
 
 
+@single_flight("cleanup", hold_for=300)
 async def run_cleanup():
     """Асинхронная задача для очистки устаревших данных."""
     logger.info("--- [JOB START] Cleanup Old Lessons ---")
     try:
         async with AsyncSessionLocal() as session:
             await sync_service.cleanup_old_lessons(session)
+            await sync_service.cleanup_change_log(session)
         logger.info("--- [JOB SUCCESS] Cleanup Old Lessons ---")
     except Exception as e:
         logger.error(f"--- [JOB FAILED] Cleanup Old Lessons: {e} ---", exc_info=True)
 
 
+@single_flight("lesson_reminders_check", hold_for=45)
 async def run_lesson_reminders_check():
     """Проверяет, не пора ли отправлять напоминания."""
     # Мы будем проверять каждые 5 минут, но напоминать за 30, 15, 10, 5 минут
@@ -100,17 +317,18 @@ scheduler.add_job(
     name='Синхронизация справочников'
 )
 
-# 2. Оптимизированная синхронизация расписания
-# Часто проверяем "горячие" группы (каждые 20 минут)
+# 2. Адаптивная синхронизация расписания: небольшими порциями каждый тик,
+# у каждой группы свой интервал. run_hot_schedule_sync остается для ручного запуска.
+scheduler.add_job(
+    run_adaptive_schedule_sync, 'interval', seconds=settings.SYNC_ADAPTIVE_TICK_SECONDS,
+    id='adaptive_schedule_sync', name='Синхронизация расписания (адаптивная)',
+    max_instances=1, coalesce=True
+)
+# Полная синхронизация всех групп (ежедневно в 4:30), делится между воркерами по шардам
 scheduler.add_job(
-    run_hot_schedule_sync, 'interval', minutes=20, id='hot_schedule_sync',
-    name='Синхронизация расписания (горячие группы)'
+    run_full_schedule_sync_cron, 'cron', hour=4, minute=30, id='full_schedule_sync_cron',
+    name='Полная синхронизация расписания'
 )
-# # Редко проверяем все остальные "холодные" группы (ежедневно в 4:30)
-# scheduler.add_job(
-#     run_cold_schedule_sync, 'cron', hour=4, minute=30, id='cold_schedule_sync',
-#     name='Синхронизация расписания (холодные группы)'
-# )
 
 # 3. Очистка старых записей (ежедневно в 4:00)
 scheduler.add_job(
@@ -128,4 +346,4 @@ scheduler.add_job(
 # scheduler.add_job(run_hot_schedule_sync, id='initial_hot_sync')
 # scheduler.add_job(run_cold_schedule_sync, id='initial_cold_sync')
 
-logger.info("Scheduler configured for optimized production mode (hot/cold sync).")
\ No newline at end of file
+logger.info("Scheduler configured for optimized production mode (adaptive sync).")
\ No newline at end of file
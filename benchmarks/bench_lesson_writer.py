@@ -0,0 +1,93 @@
+# benchmarks/bench_lesson_writer.py
+"""
+Сравнение способов записи занятий в lessons: INSERT ... VALUES против COPY
+во временную таблицу с последующим INSERT ... SELECT ... ON CONFLICT.
+
+Запуск (нужна БД из DATABASE_URL со всеми миграциями):
+    python benchmarks/bench_lesson_writer.py --rows 5000 --repeat 5
+
+Все изменения выполняются в транзакциях, которые откатываются, так что данные в БД не меняются.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+
+from app.db.session import AsyncSessionLocal, engine
+from app.services.lesson_writer import write_lessons
+
+# Идентификаторы вне диапазона реальных данных ОмГУ
+BENCH_GROUP_ID = 2_000_000_001
+BENCH_TUTOR_ID = 2_000_000_001
+BENCH_AUDITORY_ID = 2_000_000_001
+BENCH_SOURCE_ID_BASE = 9_000_000_000_000
+
+
+def make_rows(count: int, variant: int) -> list[dict]:
+    """Синтетические занятия; `variant` меняет контент, чтобы повторная запись шла через ON CONFLICT UPDATE."""
+    now = datetime.now(timezone.utc)
+    start = date.today()
+    return [
+        {
+            "source_id": BENCH_SOURCE_ID_BASE + i, "lesson_id": i,
+            "date": start + timedelta(days=i % 120), "time_slot": i % 8 + 1,
+            "subgroup_name": None, "subject_name": f"Предмет {i % 40} v{variant}",
+            "lesson_type": "Лек", "content_hash": f"{variant:08x}{i:056x}"[:64],
+            "last_seen_at": now, "group_id": BENCH_GROUP_ID,
+            "tutor_id": BENCH_TUTOR_ID, "auditory_id": BENCH_AUDITORY_ID,
+        }
+        for i in range(count)
+    ]
+
+
+async def run_once(method: str, rows_count: int) -> float:
+    async with AsyncSessionLocal() as session:
+        try:
+            await session.execute(text(
+                "INSERT INTO groups (id, name) VALUES (:id, 'bench-group') ON CONFLICT DO NOTHING"
+            ), {"id": BENCH_GROUP_ID})
+            await session.execute(text(
+                "INSERT INTO tutors (id, name) VALUES (:id, 'bench-tutor') ON CONFLICT DO NOTHING"
+            ), {"id": BENCH_TUTOR_ID})
+            await session.execute(text(
+                "INSERT INTO auditories (id, name) VALUES (:id, 'bench-auditory') ON CONFLICT DO NOTHING"
+            ), {"id": BENCH_AUDITORY_ID})
+
+            # Первая запись - вставка, вторая - обновление тех же строк с удалением каждой десятой
+            first, second = make_rows(rows_count, 1), make_rows(rows_count, 2)
+            delete_ids = [row["source_id"] for row in second[::10]]
+
+            started = time.perf_counter()
+            await write_lessons(session, first, [], method=method)
+            await write_lessons(session, second, delete_ids, method=method)
+            return time.perf_counter() - started
+        finally:
+            await session.rollback()
+
+
+async def main(rows_count: int, repeat: int):
+    print(f"Writing {rows_count} lessons twice (insert + update/delete), {repeat} runs per method")
+    results = {}
+    for method in ("values", "copy"):
+        await run_once(method, rows_count)  # прогрев соединения и кэша подготовленных запросов
+        timings = [await run_once(method, rows_count) for _ in range(repeat)]
+        results[method] = statistics.median(timings)
+        print(f"{method:>6}: median {results[method] * 1000:.1f} ms, min {min(timings) * 1000:.1f} ms")
+    print(f"speedup copy vs values: x{results['values'] / results['copy']:.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,127 @@
+# benchmarks/bench_sync_memory.py
+"""
+Пиковая память (RSS) процесса синхронизации расписания в зависимости от числа групп.
+Каждый размер прогоняется в отдельном процессе, чтобы пик одного прогона не влиял на другой.
+
+Запуск (нужна БД из DATABASE_URL со всеми миграциями; ответы ОмГУ синтетические):
+    python benchmarks/bench_sync_memory.py --groups 50 200 1000 3000 --lessons 600
+
+Прогон пишет занятия синтетических групп с ID вне диапазона реальных данных ОмГУ
+и удаляет их (вместе с группами и записями outbox) после измерения.
+При пачечных сессиях (_sync_batch) прирост пика не должен зависеть от числа групп.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.services import sync_service as sync_module
+
+BENCH_GROUP_ID_BASE = 2_000_100_000
+BENCH_TUTOR_ID = 2_000_000_001
+BENCH_AUDITORY_ID = 2_000_000_001
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux - килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_schedule(group_id: int, lessons: int, variant: int) -> list:
+    """Синтетический ответ /schedule/group/{id} (поле data); `variant` меняет часть занятий."""
+    start = date.today() - timedelta(days=60)
+    days = {}
+    for i in range(lessons):
+        day = (start + timedelta(days=i % 150)).strftime("%d.%m.%Y")
+        days.setdefault(day, []).append({
+            "id": group_id * 10_000 + i, "lesson_id": i, "day": day, "time": i % 8 + 1,
+            "lesson": f"Предмет {i % 40}" + (f" v{variant}" if i % 10 == 0 else ""),
+            "type_work": "Лек", "subgroupName": None,
+            "teacher_id": BENCH_TUTOR_ID, "auditory_id": BENCH_AUDITORY_ID,
+        })
+    return [{"day": day, "lessons": day_lessons} for day, day_lessons in days.items()]
+
+
+async def prepare_dictionaries(group_ids: list[int]):
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(
+            "INSERT INTO tutors (id, name) VALUES (:id, 'bench-tutor') ON CONFLICT DO NOTHING"
+        ), {"id": BENCH_TUTOR_ID})
+        await session.execute(text(
+            "INSERT INTO auditories (id, name) VALUES (:id, 'bench-auditory') ON CONFLICT DO NOTHING"
+        ), {"id": BENCH_AUDITORY_ID})
+        await session.execute(
+            text("INSERT INTO groups (id, name) VALUES (:id, :name) ON CONFLICT DO NOTHING"),
+            [{"id": group_id, "name": f"bench-{group_id}"} for group_id in group_ids],
+        )
+        await session.commit()
+
+
+async def cleanup(group_ids: list[int]):
+    async with AsyncSessionLocal() as session:
+        params = {"ids": group_ids}
+        await session.execute(text("DELETE FROM lessons WHERE group_id = ANY(:ids)"), params)
+        await session.execute(text("DELETE FROM schedule_change_outbox WHERE group_id = ANY(:ids)"), params)
+        await session.execute(text("DELETE FROM groups WHERE id = ANY(:ids)"), params)
+        await session.commit()
+
+
+async def child(groups: int, lessons: int):
+    """Один размер: вставка расписаний всех групп, затем прогон с изменениями."""
+    group_ids = [BENCH_GROUP_ID_BASE + i for i in range(groups)]
+    variant = {"value": 1}
+
+    async def fake_fetch(group_id: int):
+        return make_schedule(group_id, lessons, variant["value"]), f"bench:{group_id}:{variant['value']}"
+
+    sync_module.api_client.get_schedule_for_group_with_fingerprint = fake_fetch
+    sync_module.sync_process_pool.enabled = False
+
+    await prepare_dictionaries(group_ids)
+    try:
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        for variant["value"] in (1, 2):
+            async with AsyncSessionLocal() as session:
+                await sync_module.sync_service.sync_schedules_for_groups(session, group_ids=group_ids)
+        elapsed = time.perf_counter() - started
+        print(f"{groups} {baseline:.1f} {peak_rss_mb():.1f} {elapsed:.2f}")
+    finally:
+        await cleanup(group_ids)
+        await engine.dispose()
+
+
+def main(sizes: list[int], lessons: int):
+    print(f"{lessons} lessons per group, batch size {settings.SYNC_BATCH_SIZE}")
+    print(f"{'groups':>7} {'baseline MB':>12} {'peak MB':>8} {'growth MB':>10} {'time':>8}")
+    for groups in sizes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", str(groups), "--lessons", str(lessons)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        _, baseline, peak, elapsed = output.split()
+        growth = float(peak) - float(baseline)
+        print(f"{groups:>7} {float(baseline):>12.1f} {float(peak):>8.1f} {growth:>10.1f} {float(elapsed):>7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, nargs="+", default=[50, 200, 1000, 3000])
+    parser.add_argument("--lessons", type=int, default=600)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args.child, args.lessons))
+    else:
+        main(args.groups, args.lessons)
@@ -0,0 +1,87 @@
+# benchmarks/bench_sync_offload.py
+"""
+Задержка цикла событий при разборе ответов ОмГУ: в самом цикле (как раньше)
+против пула процессов (SYNC_PARSE_IN_PROCESS_POOL).
+
+Запуск (БД и Redis не нужны, ответы синтетические):
+    python benchmarks/bench_sync_offload.py --groups 200 --lessons 600 --workers 2
+
+Пока идет разбор, EventLoopLagMonitor меряет, насколько опаздывает цикл событий -
+ровно на столько же в воркере опаздывали бы ответы бота.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.getcwd())
+
+from app.core.loop_monitor import EventLoopLagMonitor
+from app.services.schedule_diff import prepare_groups_from_bodies
+from app.services.sync_offload import SyncProcessPool
+
+
+def make_body(group_id: int, lessons: int) -> bytes:
+    """Синтетический ответ /schedule/group/{id}: занятия разложены по дням."""
+    start = date.today()
+    days = {}
+    for i in range(lessons):
+        day = (start + timedelta(days=i % 120)).strftime("%d.%m.%Y")
+        days.setdefault(day, []).append({
+            "id": group_id * 100_000 + i, "lesson_id": i, "day": day, "time": i % 8 + 1,
+            "lesson": f"Предмет {i % 40}", "type_work": "Лек", "subgroupName": None,
+            "teacher_id": i % 50 + 1, "auditory_id": i % 30 + 1,
+            "teacher": "Иванов И.И.", "auditCorps": "1-101", "publishDate": "01.09.2025 10:00",
+        })
+    data = [{"day": day, "lessons": day_lessons} for day, day_lessons in days.items()]
+    return json.dumps({"success": True, "message": "", "data": data}, ensure_ascii=False).encode("utf-8")
+
+
+async def run(mode: str, items: list, batch_size: int, pool: SyncProcessPool) -> dict:
+    monitor = EventLoopLagMonitor(f"bench-{mode}", interval=0.01, window=100_000, publish_every=float("inf"))
+    args = (date.today(), set(range(1, 51)), set(range(1, 31)), datetime.now(timezone.utc))
+    monitor.start()
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    for i in range(0, len(items), batch_size):
+        batch = items[i:i + batch_size]
+        if mode == "inline":
+            prepare_groups_from_bodies(batch, *args)
+            await asyncio.sleep(0)  # как между пачками в синхронизации: цикл получает управление
+        else:
+            await pool.prepare_groups(batch, *args)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    return {"seconds": round(elapsed, 2), **monitor.snapshot()}
+
+
+async def main(groups: int, lessons: int, workers: int, batch_size: int):
+    print(f"Preparing {groups} groups x {lessons} lessons, batch size {batch_size}")
+    items = [(group_id, make_body(group_id, lessons), None, {}) for group_id in range(1, groups + 1)]
+    pool = SyncProcessPool()
+    pool.max_workers = workers
+    await pool.prepare_groups(items[:workers], date.today(), set(), set(), datetime.now(timezone.utc))  # запуск процессов
+    try:
+        for mode in ("inline", "pool"):
+            result = await run(mode, items, batch_size, pool)
+            print(
+                f"{mode:>6}: {result['seconds']:.2f}s total, loop lag p50 {result['p50_ms']} ms, "
+                f"p99 {result['p99_ms']} ms, max {result['max_ms']} ms"
+            )
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--lessons", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.groups, args.lessons, args.workers, args.batch_size))
@@ -10,10 +10,17 @@ import redis.asyncio as redis
 from app.bot.bot import bot, dp, setup_bot_commands
 from app.core.config import settings
 # Импортируем компоненты нашей системы
-from app.worker import scheduler, run_hot_schedule_sync, run_dict_sync
+from app.worker import (
+    scheduler, run_hot_schedule_sync, run_dict_sync, run_targeted_schedule_sync, TARGETED_SYNC_COMMANDS
+)
 from app.bot.bot import bot
 from app.bot.notifier import process_queues
 from app.core.queue import CONTROL_QUEUE
+from app.services.user_activity import user_activity
+from app.services.sync_shards import shard_manager
+from app.services.sync_offload import sync_process_pool
+from app.services.outbox_relay import outbox_relay
+from app.core.loop_monitor import EventLoopLagMonitor
 
 # Настраиваем логирование
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -21,6 +28,8 @@ logger = logging.getLogger("WorkerProcess")
 
 # --- Глобальные переменные для управления graceful shutdown ---
 shutdown_event = asyncio.Event()
+# Задержка цикла событий воркера (бот, notifier и синхронизация делят один цикл)
+loop_lag_monitor = EventLoopLagMonitor("worker")
 
 def _handle_shutdown_signal(*args):
     """Обработчик сигналов SIGINT/SIGTERM для корректного завершения."""
@@ -46,8 +55,17 @@ async def listen_control_queue():
 
             if command == "run_hot_schedule_sync":
                 scheduler.add_job(run_hot_schedule_sync, id='manual_hot_sync', replace_existing=True)
+            elif command == "run_full_schedule_sync":
+                # Прогон увидят все воркеры, каждый пройдет свои шарды
+                await shard_manager.request_full_sync()
             elif command == "run_dict_sync":
                 scheduler.add_job(run_dict_sync, id='manual_dict_sync', replace_existing=True)
+            elif command in TARGETED_SYNC_COMMANDS:
+                params = command_data.get("params", {})
+                job_id = params.pop("job_id")
+                scheduler.add_job(
+                    run_targeted_schedule_sync, args=[job_id, command, params], id=f"targeted_sync:{job_id}"
+                )
             else:
                 logger.warning(f"Unknown control command received: {command}")
 
@@ -70,17 +88,30 @@ async def main():
     logger.info("Worker process starting...")
     
     # 1. Устанавливаем команды бота (теперь это делает воркер)
-    await bot.delete_webhook(drop_pending_updates=True)
-    await setup_bot_commands(bot)
+    if settings.WORKER_RUN_BOT:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await setup_bot_commands(bot)
+
+    # Аренда шардов синхронизации (только при SYNC_SHARDING_ENABLED)
+    await shard_manager.start()
 
     # 2. Запускаем APScheduler
     scheduler.start()
     logger.info("APScheduler has been started.")
     
+    # Пачечная запись активности пользователей бота
+    user_activity.start()
+    loop_lag_monitor.start()
+
     # 3. Создаем задачи для notifier, listener'а команд и ПОЛЛИНГА
     notifier_task = asyncio.create_task(process_queues(bot), name="NotifierTask")
     control_task = asyncio.create_task(listen_control_queue(), name="ControlTask")
-    polling_task = asyncio.create_task(dp.start_polling(bot), name="PollingTask") # <-- ЗАПУСКАЕМ ПОЛЛИНГ ЗДЕСЬ
+    # Изменения расписания из outbox в Redis (безопасно запускать в нескольких воркерах)
+    relay_task = asyncio.create_task(outbox_relay.run(), name="OutboxRelayTask")
+    # Telegram допускает только один поллинг на токен, дополнительные воркеры только синхронизируют
+    polling_task = None
+    if settings.WORKER_RUN_BOT:
+        polling_task = asyncio.create_task(dp.start_polling(bot), name="PollingTask") # <-- ЗАПУСКАЕМ ПОЛЛИНГ ЗДЕСЬ
     
     logger.info("Notifier, Control Listener, and Bot Polling have been started.")
 
@@ -92,14 +123,22 @@ async def main():
     scheduler.shutdown(wait=False)
     
     # Сначала останавливаем поллинг
-    await dp.stop_polling()
-    polling_task.cancel()
+    if polling_task:
+        await dp.stop_polling()
+        polling_task.cancel()
     
     # Затем остальные задачи
     notifier_task.cancel()
     control_task.cancel()
+    relay_task.cancel()
     
-    await asyncio.gather(polling_task, notifier_task, control_task, return_exceptions=True)
+    await asyncio.gather(
+        *(task for task in (polling_task, notifier_task, control_task, relay_task) if task), return_exceptions=True
+    )
+    await shard_manager.stop()
+    await loop_lag_monitor.stop()
+    sync_process_pool.shutdown()
+    await user_activity.stop()
     
     await bot.session.close()
     logger.info("Worker process shut down gracefully.")